@@ -72,8 +72,19 @@ setup(name='zope.app.file',
       namespace_packages=['zope', 'zope.app'],
       python_requires='>=3.8',
       extras_require={
+          'blob': [
+              'ZODB',
+          ],
+          'brotli': [
+              'Brotli',
+          ],
+          'scales': [
+              'Pillow',
+          ],
           'test': [
               'webtest',
+              'ZEO',
+              'ZODB',
               'zope.app.appsetup >= 4.0.0',
               'zope.app.basicskin >= 4.0.0',
               'zope.app.exception >= 4.0.1',
@@ -94,10 +105,13 @@ setup(name='zope.app.file',
           'setuptools',
           'transaction',
           'persistent',
+          'BTrees',
           'zope.app.content >= 4.0.0',
           'zope.app.form >= 5.0.0',
           'zope.app.publication',
+          'zope.component',
           'zope.contenttype >= 4.0.0',
+          'zope.copy',
           'zope.datetime',
           'zope.dublincore >= 4.0.0',
           'zope.event',
@@ -105,6 +119,7 @@ setup(name='zope.app.file',
           'zope.filerepresentation',
           'zope.i18nmessageid >= 4.1.0',
           'zope.interface',
+          'zope.lifecycleevent',
           'zope.schema',
           'zope.site',
           'zope.size',
@@ -15,24 +15,43 @@
 
 """
 
+import base64
+import os
+import re
+import uuid
 from datetime import datetime
 
+import zope.component
 import zope.contenttype.parse
 import zope.datetime
 import zope.event
+from zope.component import adapter
 from zope.contenttype import guess_content_type
 from zope.dublincore.interfaces import IDCTimes
 from zope.exceptions.interfaces import UserError
+from zope.filerepresentation.interfaces import IWriteFile
+from zope.interface import implementer
+from zope.publisher.interfaces.http import IHTTPRequest
+from zope.publisher.interfaces.http import IResult
 from zope.schema import Text
+from zope.security.proxy import removeSecurityProxy
 
 from zope import lifecycleevent
+from zope.app.file.file import MAXCHUNKSIZE
 from zope.app.file.file import File
+from zope.app.file.file import FileStreamIterator
 from zope.app.file.i18n import ZopeMessageFactory as _
+from zope.app.file.interfaces import IDownloadOffload
+from zope.app.file.interfaces import IEditableFile
 from zope.app.file.interfaces import IFile
+from zope.app.file.interfaces import IStreamableFile
 
 
 __docformat__ = 'restructuredtext'
 
+# the number of ranges a "Range" header may ask for before it is ignored
+MAXRANGES = 16
+
 
 class FileView:
 
@@ -104,37 +123,477 @@ class FileView:
         >>> view.show() == MyFile.data
         True
 
+        The data of files that are larger than a chunk is not joined into
+        a single string, but streamed to the publisher chunk by chunk:
+
+        >>> from zope.app.file.file import FileChunk
+        >>> bigFile = File(b'', 'application/octet-stream')
+        >>> bigFile.data = FileChunk(b'x' * MAXCHUNKSIZE)
+        >>> bigFile._data.next = FileChunk(b'y' * MAXCHUNKSIZE)
+        >>> bigFile._size = 2 * MAXCHUNKSIZE
+        >>> request = TestRequest()
+        >>> view = FileTestView(bigFile, request)
+        >>> result = view.show()
+        >>> IResult.providedBy(result)
+        True
+        >>> [len(chunk) for chunk in result] == [MAXCHUNKSIZE, MAXCHUNKSIZE]
+        True
+        >>> request.response.getHeader('Content-Length') == str(
+        ...     2 * MAXCHUNKSIZE)
+        True
+
+        Files whose data is stored compressed are sent compressed to
+        clients accepting gzip, without compressing them again:
+
+        >>> import gzip
+        >>> from zope.app.file.file import CompressedChunk
+        >>> textFile = File(CompressedChunk(b'Foo' * 100), 'text/plain')
+        >>> request = TestRequest(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        >>> view = FileTestView(textFile, request)
+        >>> result = view.show()
+        >>> gzip.decompress(b''.join(result)) == b'Foo' * 100
+        True
+        >>> request.response.getHeader('Content-Encoding')
+        'gzip'
+        >>> request.response.getHeader('Vary')
+        'Accept-Encoding'
+        >>> request.response.getHeader('Content-Length') is None
+        True
+
+        Other clients get the data decompressed:
+
+        >>> request = TestRequest()
+        >>> view = FileTestView(textFile, request)
+        >>> view.show() == b'Foo' * 100
+        True
+        >>> request.response.getHeader('Content-Encoding') is None
+        True
+
+        Files can also keep variants of their data that are encoded when
+        the data is stored.  The smallest variant the client accepts is
+        sent:
+
+        >>> textFile = File(b'Foo' * 100, 'text/plain')
+        >>> textFile._encodings = {'gzip': File(gzip.compress(textFile.data)),
+        ...                        'br': File(b'tiny')}
+        >>> request = TestRequest(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        >>> view = FileTestView(textFile, request)
+        >>> gzip.decompress(b''.join(view.show())) == b'Foo' * 100
+        True
+        >>> request.response.getHeader('Content-Encoding')
+        'gzip'
+        >>> request = TestRequest(HTTP_ACCEPT_ENCODING='gzip, br')
+        >>> view = FileTestView(textFile, request)
+        >>> b''.join(view.show())
+        b'tiny'
+        >>> request.response.getHeader('Content-Encoding')
+        'br'
+        >>> request.response.getHeader('Content-Length')
+        '4'
+
+        Since the response depends on the encodings the client accepts,
+        the "Vary" header is also set for clients accepting none:
+
+        >>> request = TestRequest()
+        >>> view = FileTestView(textFile, request)
+        >>> view.show() == b'Foo' * 100
+        True
+        >>> request.response.getHeader('Vary')
+        'Accept-Encoding'
+
         """
 
+        encoded = None
         if self.request is not None:
-            self.request.response.setHeader('Content-Type',
-                                            self.context.contentType)
-            self.request.response.setHeader('Content-Length',
-                                            self.context.getSize())
-        try:
-            modified = IDCTimes(self.context).modified
-        except TypeError:
-            modified = None
-        if modified is None or not isinstance(modified, datetime):
-            return self.context.data
-
-        header = self.request.getHeader('If-Modified-Since', None)
-        lmt = zope.datetime.time(modified.isoformat())
+            response = self.request.response
+            response.setHeader('Content-Type', self.context.contentType)
+            encoded = self._getEncoding()
+            if encoded is None:
+                response.setHeader('Content-Length', self.context.getSize())
+                self._setDigestHeaders(self._getDigest())
+        lmt = self._getLastModified()
+        if self.request is None:
+            return self._getBody(lmt, encoded)
+
+        status = self._getConditionalStatus(lmt)
+        if status is not None:
+            response.setStatus(status)
+            if status == 412:
+                response.setHeader('Content-Length', 0)
+            return b''
+        if lmt is not None:
+            response.setHeader('Last-Modified',
+                               zope.datetime.rfc1123_date(lmt))
+        if self.request.method == 'HEAD':
+            # The headers are set from the metadata of the file, the data
+            # isn't read.  An empty result keeps the "Content-Length".
+            response.setHeader('Accept-Ranges', 'bytes')
+            return FileResult(())
+
+        return self._getBody(lmt, encoded)
+
+    def _getLastModified(self):
+        """Return the modification time of the file in seconds since the
+        epoch, or `None` if it is not known."""
+        return getLastModified(self.context)
+
+    def _getConditionalStatus(self, lmt):
+        """Return the status of the response to a conditional request.
+
+        The "If-Match" and "If-None-Match" headers are checked against the
+        entity tag of the data sent, which is made from the digest stored
+        with the file, so no data is read.  The "If-Modified-Since" header
+        is only checked against the modification time `lmt` if there is
+        no "If-None-Match" header.  `None` is returned if the data should
+        be sent.
+        """
+        request = self.request
+        etag = request.response.getHeader('ETag')
+        header = request.getHeader('If-Match', None)
+        if header is not None and not matchesETag(header, etag, weak=False):
+            return 412
+        header = request.getHeader('If-None-Match', None)
         if header is not None:
-            header = header.split(';')[0]
-            try:
-                mod_since = int(zope.datetime.time(header))
-            except zope.datetime.SyntaxError:
-                mod_since = None
-            if mod_since is not None:
-                if lmt <= mod_since:
-                    self.request.response.setStatus(304)
-                    return b''
-        self.request.response.setHeader('Last-Modified',
-                                        zope.datetime.rfc1123_date(lmt))
+            return 304 if matchesETag(header, etag) else None
 
+        header = request.getHeader('If-Modified-Since', None)
+        if header is None or lmt is None:
+            return None
+        header = header.split(';')[0]
+        try:
+            mod_since = int(zope.datetime.time(header))
+        except zope.datetime.SyntaxError:
+            return None
+        if lmt <= mod_since:
+            return 304
+        return None
+
+    def _getDigest(self):
+        """Return the digest of the data of the file, if it is known."""
+        getDigest = getattr(self.context, 'getDigest', None)
+        if getDigest is None:
+            return None
+        return getDigest()
+
+    def _setDigestHeaders(self, digest, etag=None):
+        """Set the "ETag" and "Repr-Digest" headers of the response.
+
+        `digest` is the SHA-256 digest of the data sent, as hex string.
+        The entity tag is made from it, unless `etag` is given.
+        """
+        response = self.request.response
+        if etag is None and digest is not None:
+            etag = '"%s"' % digest
+        if etag is not None:
+            response.setHeader('ETag', etag)
+        if digest is not None:
+            digest = base64.b64encode(bytes.fromhex(digest)).decode('ascii')
+            response.setHeader('Repr-Digest', 'sha-256=:%s:' % digest)
+
+    def _getBody(self, lmt=None, encoded=None):
+        """Return the data of the file as result of the request.
+
+        Large files are streamed, so that only one chunk at a time needs
+        to be kept in memory.  If the request asks for byte ranges of the
+        file, only those ranges are returned.  Files stored in a blob are
+        sent by the front-end web server if an `IDownloadOffload` utility
+        is registered.  `encoded` returns the encoded data to send instead
+        of the data, see `_getEncoding`.
+        """
+        if encoded is not None:
+            return FileResult(encoded())
+        if self.request is not None:
+            self.request.response.setHeader('Accept-Ranges', 'bytes')
+            ranges = self._getRanges(lmt)
+            if ranges is not None:
+                return self._getRangesBody(ranges)
+            if self._offload():
+                return b''
+            if (IStreamableFile.providedBy(self.context)
+                    and self._getFilename() is not None):
+                return FileDownload(self.context.open())
+
+        if (IStreamableFile.providedBy(self.context)
+                and self.context.getSize() > MAXCHUNKSIZE):
+            return FileResult(self.context.iterData())
         return self.context.data
 
+    def _getEncoding(self):
+        """Choose the encoding of the data of the file for the client.
+
+        The smallest of the encoded variants of the file (see
+        `IStreamableFile.getEncodings`) that the client accepts is sent.
+        Otherwise, if the client accepts gzip and the data is stored
+        compressed, it is sent compressed, so that it needn't be
+        compressed for the request.  The headers of the encoding are set
+        and a function returning the encoded data is returned, or `None`
+        if neither is possible.  Requests for byte ranges get the ranges
+        of the data itself.
+        """
+        request = self.request
+        if request.getHeader('Range', None) is not None:
+            return None
+        response = request.response
+        codings = parseAcceptEncoding(request.getHeader('Accept-Encoding', ''))
+        getEncodings = getattr(self.context, 'getEncodings', None)
+        encodings = getEncodings() if getEncodings is not None else {}
+        if encodings:
+            response.setHeader('Vary', 'Accept-Encoding')
+        accepted = [(variant.getSize(), coding)
+                    for coding, variant in encodings.items()
+                    if codings.get(coding, codings.get('*', 0)) > 0]
+        if accepted:
+            size, coding = min(accepted)
+            variant = encodings[coding]
+            response.setHeader('Content-Encoding', coding)
+            response.setHeader('Content-Length', size)
+            self._setDigestHeaders(variant.getDigest())
+            return variant.iterData
+
+        if codings.get('gzip', codings.get('*', 0)) <= 0:
+            return None
+        hasGzipData = getattr(self.context, 'hasGzipData', None)
+        if hasGzipData is None or not hasGzipData():
+            return None
+        response.setHeader('Content-Encoding', 'gzip')
+        response.setHeader('Vary', 'Accept-Encoding')
+        digest = self._getDigest()
+        if digest is not None:
+            self._setDigestHeaders(None, '"%s-gzip"' % digest)
+        return self.context.iterGzipData
+
+    def _offload(self):
+        """Let the front-end web server send the data of the file.
+
+        Returns whether the download has been offloaded.
+        """
+        offload = zope.component.queryUtility(IDownloadOffload)
+        if offload is None or not IStreamableFile.providedBy(self.context):
+            return False
+        filename = self._getFilename()
+        if filename is None:
+            return False
+        location = offload.getLocation(filename)
+        if location is None:
+            return False
+        response = self.request.response
+        response.setHeader(offload.header, location)
+        response.setHeader('Content-Length', 0)
+        return True
+
+    def _getFilename(self):
+        """Return the name of the blob file holding the data of the file.
+
+        The name is protected from users of the file, who have no use for
+        a path on the server, so it is read without the security proxy.
+        """
+        return removeSecurityProxy(self.context).getFilename()
+
+    def _getRanges(self, lmt):
+        """Return the byte ranges requested by the "Range" header.
+
+        `None` is returned if the whole file should be sent, either
+        because there is no (valid) "Range" header or because the
+        "If-Range" header does not match the file.
+        """
+        request = self.request
+        header = request.getHeader('Range', None)
+        if header is None or request.method != 'GET':
+            return None
+
+        if_range = request.getHeader('If-Range', None)
+        if if_range is not None and not self._matchesIfRange(if_range, lmt):
+            return None
+
+        return parseRange(header, self.context.getSize())
+
+    def _matchesIfRange(self, header, lmt):
+        """Check the "If-Range" header.
+
+        It is compared to the entity tag of the data or to the
+        modification time.  Weak entity tags never match.
+        """
+        if header.startswith('"'):
+            return header == self.request.response.getHeader('ETag')
+        if lmt is None or header.startswith('W/'):
+            return False
+        try:
+            date = zope.datetime.time(header.split(';')[0])
+        except zope.datetime.SyntaxError:
+            return False
+        return int(date) == int(lmt)
+
+    def _getRangesBody(self, ranges):
+        """Return the body of a "206 Partial Content" response."""
+        response = self.request.response
+        size = self.context.getSize()
+        if not ranges:
+            response.setStatus(416)
+            response.setHeader('Content-Range', 'bytes */%d' % size)
+            response.setHeader('Content-Length', 0)
+            return b''
+
+        response.setStatus(206)
+        if len(ranges) == 1:
+            [(start, stop)] = ranges
+            response.setHeader('Content-Range',
+                               'bytes %d-%d/%d' % (start, stop - 1, size))
+            response.setHeader('Content-Length', stop - start)
+            return FileResult(self._iterData(start, stop))
+
+        boundary = uuid.uuid4().hex
+        content_type = self.context.contentType
+        parts = []
+        length = 0
+        for start, stop in ranges:
+            headers = []
+            if content_type:
+                headers.append('Content-Type: %s' % content_type)
+            headers.append('Content-Range: bytes %d-%d/%d' % (
+                start, stop - 1, size))
+            header = '\r\n--{}\r\n{}\r\n\r\n'.format(
+                boundary, '\r\n'.join(headers)).encode('latin-1')
+            parts.append((header, start, stop))
+            length += len(header) + stop - start
+        trailer = ('\r\n--%s--\r\n' % boundary).encode('latin-1')
+        length += len(trailer)
+
+        response.setHeader('Content-Type',
+                           'multipart/byteranges; boundary=%s' % boundary)
+        response.setHeader('Content-Length', length)
+        return FileResult(self._iterParts(parts, trailer))
+
+    def _iterParts(self, parts, trailer):
+        for header, start, stop in parts:
+            yield header
+            data = self._iterData(start, stop)
+            try:
+                yield from data
+            finally:
+                data.close()
+        yield trailer
+
+    def _iterData(self, start, stop):
+        if IStreamableFile.providedBy(self.context):
+            return self.context.iterData(start, stop)
+        return iter((self.context.data[start:stop],))
+
+
+@implementer(IResult)
+class FileResult:
+    """Result that streams the data of a file to the client.
+
+    The publisher calls `close()` when it is done with the result, which
+    releases the resources held by the underlying iterator.
+    """
+
+    def __init__(self, body):
+        self.body = body
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        close = getattr(self.body, 'close', None)
+        if close is not None:
+            close()
+
+
+class FileDownload:
+    """An open file to be sent to the client.
+
+    It is turned into the result of the request by `FileDownloadResult`.
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+
+@adapter(FileDownload, IHTTPRequest)
+@implementer(IResult)
+def FileDownloadResult(download, request):
+    """Return the result for sending a file to the client.
+
+    If the WSGI server provides a "wsgi.file_wrapper", the file is handed
+    to it, so that the server can send it without copying it through
+    Python, e.g. using `sendfile`:
+
+        >>> from io import BytesIO
+        >>> from zope.publisher.browser import TestRequest
+        >>> class Wrapper(object):
+        ...     def __init__(self, file, block_size):
+        ...         self.file = file
+        ...         self.block_size = block_size
+        >>> request = TestRequest(environ={'wsgi.file_wrapper': Wrapper})
+        >>> result = FileDownloadResult(
+        ...     FileDownload(BytesIO(b'data')), request)
+        >>> result.__class__ is Wrapper
+        True
+        >>> result.file.read() == b'data'
+        True
+
+    Otherwise, the file is streamed chunk by chunk:
+
+        >>> result = FileDownloadResult(
+        ...     FileDownload(BytesIO(b'data')), TestRequest())
+        >>> list(result) == [b'data']
+        True
+
+    """
+    file = removeSecurityProxy(removeSecurityProxy(download).file)
+    wrapper = request.environment.get('wsgi.file_wrapper')
+    if wrapper is not None:
+        return wrapper(file, MAXCHUNKSIZE)
+    return FileResult(FileStreamIterator(file))
+
+
+@implementer(IDownloadOffload)
+class DownloadOffload:
+    """Settings for sending file data through the front-end web server.
+
+    With "X-Sendfile" (Apache, lighttpd), the header contains the name of
+    the file:
+
+        >>> DownloadOffload().getLocation('/var/blobs/0x01/0x02.blob')
+        '/var/blobs/0x01/0x02.blob'
+
+    With "X-Accel-Redirect" (nginx), the header contains the path of an
+    internal location, which replaces the directory of the blobs:
+
+        >>> offload = DownloadOffload('X-Accel-Redirect', root='/var/blobs',
+        ...                           location='/blobs')
+        >>> offload.getLocation('/var/blobs/0x01/0x02.blob')
+        '/blobs/0x01/0x02.blob'
+
+    Files outside of the directory are not offloaded:
+
+        >>> offload.getLocation('/tmp/0x02.blob') is None
+        True
+
+    To enable offloading, register an instance as utility::
+
+        <utility
+            component="mypackage.offload"
+            provides="zope.app.file.interfaces.IDownloadOffload"
+            />
+
+    """
+
+    def __init__(self, header='X-Sendfile', root=None, location=None):
+        self.header = header
+        self.root = root
+        self.location = location
+
+    def getLocation(self, filename):
+        if self.root:
+            root = os.path.join(self.root, '')
+            if not filename.startswith(root):
+                return None
+            if self.location is not None:
+                path = filename[len(root):].replace(os.sep, '/')
+                filename = '{}/{}'.format(self.location.rstrip('/'), path)
+        return filename
+
 
 def cleanupFileName(filename):
     return filename.split('\\')[-1].split('/')[-1]
@@ -473,7 +932,7 @@ class FileEdit:
 
         modified = []
         if encodeddata != self.context.data:
-            self.context.data = encodeddata
+            self._writeData(encodeddata)
             modified.append('data')
 
         if self.context.contentType != data['contentType']:
@@ -490,6 +949,22 @@ class FileEdit:
         return _("Updated on ${date_time}",
                  mapping={'date_time': formatter.format(datetime.utcnow())})
 
+    def _writeData(self, data):
+        """Store the edited data, writing only the part that changed.
+
+        Data that got shorter is replaced as a whole.
+        """
+        old = self.context.data
+        if (len(data) < len(old)
+                or not IEditableFile.providedBy(self.context)):
+            self.context.data = data
+            return
+        start = len(os.path.commonprefix([old, data]))
+        stop = len(data)
+        if stop == len(old):
+            stop -= len(os.path.commonprefix([old[::-1], data[::-1]]))
+        self.context.write(start, data[start:stop])
+
     def update(self):
         try:
             return super().update()
@@ -505,6 +980,322 @@ class FileEdit:
             return self.update_status
 
 
+class FilePUT:
+    """PUT handler for files.
+
+    Without a "Content-Range" header the data of the file is replaced by
+    the body of the request.  With one, only that range of the data is
+    replaced, so that large or growing files can be uploaded in pieces
+    and changed without uploading them again.  The range may not start
+    beyond the end of the data, and files which can't be edited in place
+    answer with "501 Not Implemented".
+    """
+
+    def __init__(self, context, request):
+        self.context = context
+        self.request = request
+
+    def PUT(self):
+        request = self.request
+        response = request.response
+        body = request.bodyStream
+        length = int(request.get('CONTENT_LENGTH', -1))
+
+        # Don't overwrite changes made since the client read the data
+        etag = self._getETag()
+        header = request.getHeader('If-Match', None)
+        if header is not None and not matchesETag(header, etag, weak=False):
+            response.setStatus(412)
+            return b''
+        header = request.getHeader('If-None-Match', None)
+        if header is not None and matchesETag(header, etag):
+            response.setStatus(412)
+            return b''
+
+        header = request.getHeader('Content-Range', None)
+        if header is None:
+            IWriteFile(self.context).write(BodyReader(body, length))
+        else:
+            editable = IEditableFile(self.context, None)
+            if editable is None:
+                response.setStatus(501)
+                return b''
+            content_range = parseContentRange(header)
+            if content_range is None:
+                response.setStatus(400)
+                return b''
+            start, stop = content_range
+            size = self.context.getSize()
+            if start > size:
+                response.setStatus(416)
+                response.setHeader('Content-Range', 'bytes */%d' % size)
+                return b''
+            if 0 <= length < stop - start:
+                response.setStatus(400)
+                return b''
+            editable.write(start, BodyReader(body, stop - start))
+
+        zope.event.notify(lifecycleevent.ObjectModifiedEvent(
+            self.context, lifecycleevent.Attributes(IFile, 'data')))
+        etag = self._getETag()
+        if etag is not None:
+            response.setHeader('ETag', etag)
+        return b''
+
+    def _getETag(self):
+        getDigest = getattr(self.context, 'getDigest', None)
+        digest = getDigest() if getDigest is not None else None
+        if digest is None:
+            return None
+        return '"%s"' % digest
+
+
+class BodyReader:
+    """Read at most `size` bytes of the body of a request.
+
+    The body is handed to the file as a stream, so that it is read a chunk
+    at a time instead of all at once.  A negative `size` reads the body to
+    its end.
+
+        >>> from io import BytesIO
+        >>> reader = BodyReader(BytesIO(b'0123456789'), 6)
+        >>> reader.read(4)
+        b'0123'
+        >>> reader.read()
+        b'45'
+        >>> reader.read()
+        b''
+    """
+
+    def __init__(self, body, size=-1):
+        self.body = body
+        self.remaining = size
+
+    def read(self, size=-1):
+        remaining = self.remaining
+        if remaining >= 0 and (size < 0 or size > remaining):
+            size = remaining
+        if size == 0:
+            return b''
+        data = self.body.read(size)
+        if remaining >= 0:
+            self.remaining -= len(data)
+        return data
+
+
+def getLastModified(ob):
+    """Return the modification time of `ob` in seconds since the epoch.
+
+    `None` is returned if `ob` can't be adapted to `IDCTimes` or has no
+    modification time.
+    """
+    try:
+        modified = IDCTimes(ob).modified
+    except TypeError:
+        modified = None
+    if modified is not None and isinstance(modified, datetime):
+        return zope.datetime.time(modified.isoformat())
+    return None
+
+
+def matchesETag(header, etag, weak=True):
+    """Tell whether an "If-Match" or "If-None-Match" header matches `etag`.
+
+    `etag` is the entity tag of the data, or `None` if it has none:
+
+        >>> matchesETag('"abc"', '"abc"')
+        True
+        >>> matchesETag('"def", W/"abc"', '"abc"')
+        True
+        >>> matchesETag('"def"', '"abc"')
+        False
+        >>> matchesETag('"abc"', None)
+        False
+
+    A star matches any data:
+
+        >>> matchesETag('*', None)
+        True
+
+    Weak tags only match if `weak` is true, as for "If-None-Match":
+
+        >>> matchesETag('W/"abc"', '"abc"', weak=False)
+        False
+    """
+    if header.strip() == '*':
+        return True
+    if etag is None:
+        return False
+    for match in _etag.finditer(header):
+        if match.group(2) == etag and (weak or not match.group(1)):
+            return True
+    return False
+
+
+_etag = re.compile(r'(W/)?("[^"]*")')
+
+
+def parseRange(header, size):
+    """Parse the value of a "Range" header for a file of `size` bytes.
+
+    Returns a list of ``(start, stop)`` tuples, where `stop` is exclusive,
+    for the ranges that can be satisfied:
+
+        >>> parseRange('bytes=0-99', 1000)
+        [(0, 100)]
+        >>> parseRange('bytes=500-', 1000)
+        [(500, 1000)]
+        >>> parseRange('bytes=-100', 1000)
+        [(900, 1000)]
+        >>> parseRange('bytes=0-0, 990-2000', 1000)
+        [(0, 1), (990, 1000)]
+
+    Ranges that overlap or are adjacent are merged, so that no data is
+    sent more than once:
+
+        >>> parseRange('bytes=500-599, 0-99, 50-149, 150-199', 1000)
+        [(0, 200), (500, 600)]
+        >>> parseRange('bytes=0-,0-,0-', 1000)
+        [(0, 1000)]
+
+    An empty list means that none of the ranges can be satisfied:
+
+        >>> parseRange('bytes=1000-', 1000)
+        []
+        >>> parseRange('bytes=-0', 1000)
+        []
+
+    `None` is returned for headers that cannot be parsed, these are
+    ignored:
+
+        >>> parseRange('bytes=10-5', 1000) is None
+        True
+        >>> parseRange('lines=1-2', 1000) is None
+        True
+        >>> parseRange('bytes=a-b', 1000) is None
+        True
+
+    So are headers asking for more than `MAXRANGES` ranges, which would
+    let a small request make the server send the data many times:
+
+        >>> parseRange('bytes=' + ','.join(['0-'] * 17), 1000) is None
+        True
+
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    items = spec.split(',')
+    if len(items) > MAXRANGES:
+        return None
+
+    ranges = []
+    for item in items:
+        first, sep, last = item.strip().partition('-')
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                stop = size
+                if last:
+                    stop = int(last) + 1
+                    if stop <= start:
+                        return None
+            else:
+                start = size - int(last)
+                stop = size
+        except ValueError:
+            return None
+        if start < 0:
+            start = 0
+        if start < size and start < stop:
+            ranges.append((start, min(stop, size)))
+
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            if stop > merged[-1][1]:
+                merged[-1] = (merged[-1][0], stop)
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def parseAcceptEncoding(header):
+    """Parse the value of an "Accept-Encoding" header.
+
+    Returns a dictionary mapping the content codings to their quality:
+
+        >>> codings = parseAcceptEncoding('gzip, deflate;q=0.5, br;q=0')
+        >>> sorted(codings.items())
+        [('br', 0.0), ('deflate', 0.5), ('gzip', 1.0)]
+        >>> parseAcceptEncoding('GZip;q=x, *')
+        {'gzip': 0.0, '*': 1.0}
+        >>> parseAcceptEncoding('')
+        {}
+
+    """
+    codings = {}
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[name] = quality
+    return codings
+
+
+def parseContentRange(header):
+    """Parse the value of a "Content-Range" header of a request.
+
+    Returns a ``(start, stop)`` tuple, where `stop` is exclusive:
+
+        >>> parseContentRange('bytes 0-99/1000')
+        (0, 100)
+        >>> parseContentRange('bytes 100-199/*')
+        (100, 200)
+
+    `None` is returned for headers that cannot be parsed or don't
+    describe a range of data:
+
+        >>> parseContentRange('bytes */1000') is None
+        True
+        >>> parseContentRange('bytes 100-99/1000') is None
+        True
+        >>> parseContentRange('bytes 0-99/50') is None
+        True
+        >>> parseContentRange('lines 0-1/2') is None
+        True
+        >>> parseContentRange('bytes a-b/c') is None
+        True
+
+    """
+    unit, _, spec = header.strip().partition(' ')
+    if unit.lower() != 'bytes':
+        return None
+    spec, _, total = spec.strip().partition('/')
+    first, sep, last = spec.partition('-')
+    try:
+        start = int(first)
+        stop = int(last) + 1
+        if total != '*' and stop > int(total):
+            return None
+    except ValueError:
+        return None
+    if not sep or start < 0 or stop <= start:
+        return None
+    return start, stop
+
+
 def extractCharset(content_type):
     """Extract charset information from a MIME type.
 
@@ -16,11 +16,19 @@
 """
 __docformat__ = 'restructuredtext'
 
+from zope.interface import implementer
+from zope.interface.interfaces import ComponentLookupError
+from zope.publisher.browser import BrowserView
+from zope.publisher.interfaces import NotFound
+from zope.publisher.interfaces.browser import IBrowserPublisher
+from zope.security.proxy import removeSecurityProxy
 from zope.size.interfaces import ISized
 from zope.traversing.browser.absoluteurl import absoluteURL
 
 from zope.app.file.browser.file import FileView
 from zope.app.file.browser.file import cleanupFileName
+from zope.app.file.browser.file import getLastModified
+from zope.app.file.scale import getScaledImage
 
 
 class ImageData(FileView):
@@ -85,6 +93,58 @@ class ImageData(FileView):
         return '%s />' % result
 
 
+@implementer(IBrowserPublisher)
+class ImageScales(BrowserView):
+    """The scaled versions of an image.
+
+    ``@@images/thumbnail`` is the image scaled to the `IImageScale`
+    named "thumbnail".  It is made when it is asked for the first time.
+    """
+
+    def publishTraverse(self, request, name):
+        # Scaling the image stores the scaled version in an annotation of
+        # the image, which viewers of the image may do.
+        image = removeSecurityProxy(self.context)
+        try:
+            scaled = getScaledImage(image, name)
+        except ComponentLookupError:
+            raise NotFound(self.context, name, request)
+        return ScaledImageData(scaled, request, self.context)
+
+    def browserDefault(self, request):
+        return self, ()
+
+    def __call__(self):
+        raise NotFound(self.context, 'images', self.request)
+
+
+@implementer(IBrowserPublisher)
+class ScaledImageData(FileView):
+    """Sends a scaled version of an image.
+
+    The headers are those of the image itself, except that the entity tag
+    and the size are the ones of the scaled data.
+    """
+
+    def __init__(self, context, request, image):
+        self.context = context
+        self.request = request
+        self.image = image
+
+    def __call__(self):
+        return self.show()
+
+    def publishTraverse(self, request, name):
+        raise NotFound(self, name, request)
+
+    def browserDefault(self, request):
+        return self, ()
+
+    def _getLastModified(self):
+        # The scaled image is as old as the image it was made from.
+        return getLastModified(self.image)
+
+
 class ImageUpload:
     """Image edit view mix-in that provides access to image size info"""
 
@@ -14,16 +14,664 @@
 """Tests for zope.app.file.browser.file.
 
 """
+import base64
 import doctest
+import hashlib
+import unittest
+from datetime import datetime
+from io import BytesIO
+
+import pytz
 
 from zope.component.testing import setUp
 from zope.component.testing import tearDown
+from zope.dublincore.interfaces import IZopeDublinCore
+from zope.interface import alsoProvides
+from zope.publisher.browser import BrowserView
+from zope.publisher.browser import TestRequest
+
+from zope.app.file.browser.file import FileView
+from zope.app.file.file import File
+from zope.app.file.file import FileChunk
+
+
+class FileTestView(FileView, BrowserView):
+    pass
+
+
+class TestFileViewRanges(unittest.TestCase):
+
+    content = b'0123456789' * 10
+
+    def _makeFile(self):
+        file = File(b'', 'text/plain')
+        # Build a chain of chunks of 30 bytes each
+        chunk = None
+        for pos in range(90, -1, -30):
+            new = FileChunk(self.content[pos:pos + 30])
+            new.next = chunk
+            chunk = new
+        file.data = chunk
+        file._size = len(self.content)
+        return file
+
+    def _show(self, file=None, **env):
+        if file is None:
+            file = self._makeFile()
+        request = TestRequest(**env)
+        response = request.response
+        response.setResult(FileTestView(file, request).show())
+        return response, response.consumeBody()
+
+    def test_no_range(self):
+        response, body = self._show()
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(response.getHeader('Accept-Ranges'), 'bytes')
+        self.assertEqual(body, self.content)
+
+    def test_single_range(self):
+        response, body = self._show(HTTP_RANGE='bytes=25-64')
+        self.assertEqual(response.getStatus(), 206)
+        self.assertEqual(response.getHeader('Content-Range'),
+                         'bytes 25-64/100')
+        self.assertEqual(response.getHeader('Content-Length'), '40')
+        self.assertEqual(body, self.content[25:65])
+
+    def test_suffix_range(self):
+        response, body = self._show(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.getStatus(), 206)
+        self.assertEqual(response.getHeader('Content-Range'),
+                         'bytes 95-99/100')
+        self.assertEqual(body, b'56789')
+
+    def test_range_loads_only_overlapping_chunks(self):
+        file = self._makeFile()
+        _offsets, chunks = file._getChunkIndex()
+        self.assertEqual(_offsets, [0, 30, 60, 90])
+        read = []
+
+        class Chunk(FileChunk):
+            @property
+            def _data(self):
+                read.append(self)
+                return self.__dict__['data']
+
+        for chunk in chunks:
+            chunk.__class__ = Chunk
+            chunk.__dict__['data'] = chunk.__dict__.pop('_data')
+        response, body = self._show(file, HTTP_RANGE='bytes=65-70')
+        self.assertEqual(body, self.content[65:71])
+        self.assertEqual(read, [chunks[2]])
+
+    def test_multiple_ranges(self):
+        response, body = self._show(HTTP_RANGE='bytes=0-1,98-')
+        self.assertEqual(response.getStatus(), 206)
+        content_type = response.getHeader('Content-Type')
+        self.assertTrue(
+            content_type.startswith('multipart/byteranges; boundary='))
+        boundary = content_type.split('=')[1].encode('ascii')
+        self.assertEqual(response.getHeader('Content-Length'),
+                         str(len(body)))
+        self.assertEqual(
+            body,
+            b'\r\n--' + boundary + b'\r\n'
+            b'Content-Type: text/plain\r\n'
+            b'Content-Range: bytes 0-1/100\r\n\r\n'
+            b'01'
+            b'\r\n--' + boundary + b'\r\n'
+            b'Content-Type: text/plain\r\n'
+            b'Content-Range: bytes 98-99/100\r\n\r\n'
+            b'89'
+            b'\r\n--' + boundary + b'--\r\n')
+
+    def test_overlapping_ranges(self):
+        response, body = self._show(HTTP_RANGE='bytes=50-59,0-,10-19')
+        self.assertEqual(response.getStatus(), 206)
+        self.assertEqual(response.getHeader('Content-Range'),
+                         'bytes 0-99/100')
+        self.assertEqual(body, self.content)
+
+    def test_too_many_ranges(self):
+        response, body = self._show(
+            HTTP_RANGE='bytes=' + ','.join('%d-%d' % (i, i)
+                                           for i in range(0, 100, 5)))
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(response.getHeader('Content-Length'), '100')
+        self.assertEqual(body, self.content)
+
+    def test_unsatisfiable_range(self):
+        response, body = self._show(HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.getStatus(), 416)
+        self.assertEqual(response.getHeader('Content-Range'), 'bytes */100')
+        self.assertEqual(body, b'')
+
+    def test_invalid_range_ignored(self):
+        response, body = self._show(HTTP_RANGE='bytes=9-1')
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(body, self.content)
+
+    def test_range_ignored_for_post(self):
+        response, body = self._show(HTTP_RANGE='bytes=0-1',
+                                    REQUEST_METHOD='POST')
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(body, self.content)
+
+    def _makeDatedFile(self):
+        file = self._makeFile()
+        file.modified = datetime(2006, 1, 1, tzinfo=pytz.utc)
+        alsoProvides(file, IZopeDublinCore)
+        return file
+
+    def test_if_range_date(self):
+        response, body = self._show(
+            self._makeDatedFile(),
+            HTTP_RANGE='bytes=0-1',
+            HTTP_IF_RANGE='Sun, 01 Jan 2006 00:00:00 GMT')
+        self.assertEqual(response.getStatus(), 206)
+        self.assertEqual(body, b'01')
+
+    def test_if_range_date_mismatch(self):
+        response, body = self._show(
+            self._makeDatedFile(),
+            HTTP_RANGE='bytes=0-1',
+            HTTP_IF_RANGE='Mon, 02 Jan 2006 00:00:00 GMT')
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(body, self.content)
+
+    def test_if_range_without_modification_date(self):
+        response, body = self._show(
+            HTTP_RANGE='bytes=0-1',
+            HTTP_IF_RANGE='Sun, 01 Jan 2006 00:00:00 GMT')
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(body, self.content)
+
+
+class TestFileViewGzip(unittest.TestCase):
+
+    content = b'0123456789' * 100
+
+    def _makeFile(self):
+        from zope.app.file.file import CompressedChunk
+        file = File(b'', 'text/plain')
+        chunk = None
+        for pos in range(900, -1, -100):
+            new = CompressedChunk(self.content[pos:pos + 100])
+            new.next = chunk
+            chunk = new
+        file.data = chunk
+        file._size = len(self.content)
+        return file
+
+    def _show(self, file=None, **env):
+        if file is None:
+            file = self._makeFile()
+        request = TestRequest(**env)
+        response = request.response
+        response.setResult(FileTestView(file, request).show())
+        return response, response.consumeBody()
+
+    def test_gzip(self):
+        import gzip
+        response, body = self._show(HTTP_ACCEPT_ENCODING='deflate, gzip')
+        self.assertEqual(response.getHeader('Content-Encoding'), 'gzip')
+        self.assertEqual(gzip.decompress(body), self.content)
+        self.assertLess(len(body), len(self.content))
+
+    def test_gzip_not_accepted(self):
+        for accept in ('deflate', 'gzip;q=0', '*;q=0', ''):
+            response, body = self._show(HTTP_ACCEPT_ENCODING=accept)
+            self.assertIsNone(response.getHeader('Content-Encoding'))
+            self.assertEqual(response.getHeader('Content-Length'), '1000')
+            self.assertEqual(body, self.content)
+
+    def test_gzip_wildcard(self):
+        response, body = self._show(HTTP_ACCEPT_ENCODING='*')
+        self.assertEqual(response.getHeader('Content-Encoding'), 'gzip')
+
+    def test_range(self):
+        response, body = self._show(HTTP_ACCEPT_ENCODING='gzip',
+                                    HTTP_RANGE='bytes=150-159')
+        self.assertEqual(response.getStatus(), 206)
+        self.assertIsNone(response.getHeader('Content-Encoding'))
+        self.assertEqual(body, b'0123456789')
+
+    def test_not_modified(self):
+        file = self._makeFile()
+        file.modified = datetime(2006, 1, 1, tzinfo=pytz.utc)
+        alsoProvides(file, IZopeDublinCore)
+        response, body = self._show(
+            file, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_MODIFIED_SINCE='Sun, 01 Jan 2006 00:00:00 GMT')
+        self.assertEqual(response.getStatus(), 304)
+        self.assertEqual(body, b'')
+
+
+class TestFileViewETag(unittest.TestCase):
+
+    content = b'0123456789' * 10
+    digest = hashlib.sha256(content).hexdigest()
+    etag = '"%s"' % digest
+
+    def _makeFile(self):
+        file = File(self.content, 'text/plain')
+        file.modified = datetime(2006, 1, 1, tzinfo=pytz.utc)
+        alsoProvides(file, IZopeDublinCore)
+        return file
+
+    def _show(self, file=None, **env):
+        if file is None:
+            file = self._makeFile()
+        request = TestRequest(**env)
+        response = request.response
+        response.setResult(FileTestView(file, request).show())
+        return response, response.consumeBody()
+
+    def test_etag(self):
+        response, body = self._show()
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(response.getHeader('ETag'), self.etag)
+        self.assertEqual(
+            response.getHeader('Repr-Digest'),
+            'sha-256=:%s:' % base64.b64encode(
+                hashlib.sha256(self.content).digest()).decode())
+
+    def test_no_digest(self):
+        file = self._makeFile()
+        file._digest = None
+        response, body = self._show(file, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.getStatus(), 200)
+        self.assertIsNone(response.getHeader('ETag'))
+        self.assertEqual(body, self.content)
+
+    def test_if_none_match(self):
+        file = self._makeFile()
+        # The data is not read
+        file._data = None
+        for header in (self.etag, '"other", W/%s' % self.etag, '*'):
+            response, body = self._show(file, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.getStatus(), 304)
+            self.assertEqual(response.getHeader('ETag'), self.etag)
+            self.assertEqual(body, b'')
+
+    def test_if_none_match_mismatch(self):
+        # If-Modified-Since is ignored
+        response, body = self._show(
+            HTTP_IF_NONE_MATCH='"other"',
+            HTTP_IF_MODIFIED_SINCE='Sun, 01 Jan 2006 00:00:00 GMT')
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(body, self.content)
+
+    def test_if_match(self):
+        response, body = self._show(HTTP_IF_MATCH=self.etag)
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(body, self.content)
+        response, body = self._show(HTTP_IF_MATCH='*')
+        self.assertEqual(response.getStatus(), 200)
+
+    def test_if_match_mismatch(self):
+        for header in ('"other"', 'W/' + self.etag):
+            response, body = self._show(HTTP_IF_MATCH=header)
+            self.assertEqual(response.getStatus(), 412)
+            self.assertEqual(body, b'')
+
+    def test_if_range_etag(self):
+        response, body = self._show(HTTP_RANGE='bytes=0-1',
+                                    HTTP_IF_RANGE=self.etag)
+        self.assertEqual(response.getStatus(), 206)
+        self.assertEqual(body, b'01')
+        for header in ('"other"', 'W/' + self.etag):
+            response, body = self._show(HTTP_RANGE='bytes=0-1',
+                                        HTTP_IF_RANGE=header)
+            self.assertEqual(response.getStatus(), 200)
+            self.assertEqual(body, self.content)
+
+    def test_encoded(self):
+        import gzip
+        file = self._makeFile()
+        variant = File(gzip.compress(self.content))
+        file._encodings = {'gzip': variant}
+        response, body = self._show(file, HTTP_ACCEPT_ENCODING='gzip')
+        etag = '"%s"' % variant.getDigest()
+        self.assertEqual(response.getHeader('ETag'), etag)
+        self.assertNotEqual(etag, self.etag)
+        response, body = self._show(file, HTTP_ACCEPT_ENCODING='gzip',
+                                    HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.getStatus(), 304)
+        response, body = self._show(file, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.getStatus(), 200)
+
+    def test_put_if_match(self):
+        from zope.app.file.browser.file import FilePUT
+        file = self._makeFile()
+        request = TestRequest(BytesIO(b'new'), HTTP_IF_MATCH='"other"',
+                              CONTENT_LENGTH='3')
+        FilePUT(file, request).PUT()
+        self.assertEqual(request.response.getStatus(), 412)
+        self.assertEqual(file.data, self.content)
+
+    def test_put_reads_chunks(self):
+        from zope.component import provideAdapter
+        from zope.filerepresentation.interfaces import IWriteFile
+
+        from zope.app.file.browser.file import FilePUT
+        from zope.app.file.file import FileWriteFile
+        from zope.app.file.interfaces import IFile
+        setUp()
+        self.addCleanup(tearDown)
+        provideAdapter(FileWriteFile, (IFile,), IWriteFile)
+
+        class Body(BytesIO):
+            def read(self, size=-1):
+                reads.append(size)
+                return super().read(size)
+
+        content = b'0123456789' * 30000
+        for headers, size in [
+                ({}, 300000),
+                ({'HTTP_CONTENT_RANGE': 'bytes 0-299999/*'}, 300000),
+                ({'HTTP_CONTENT_RANGE': 'bytes 100-300099/*'}, 300100)]:
+            reads = []
+            file = self._makeFile()
+            request = TestRequest(Body(content), CONTENT_LENGTH='300000',
+                                  **headers)
+            FilePUT(file, request).PUT()
+            self.assertEqual(file.getSize(), size)
+            # The body is never read at once
+            self.assertNotIn(-1, reads, headers)
+            self.assertLess(max(reads), len(content), headers)
+
+    def test_put_range_short_body(self):
+        from zope.app.file.browser.file import FilePUT
+        file = self._makeFile()
+        request = TestRequest(BytesIO(b'new'), CONTENT_LENGTH='3',
+                              HTTP_CONTENT_RANGE='bytes 0-9/*')
+        FilePUT(file, request).PUT()
+        self.assertEqual(request.response.getStatus(), 400)
+        self.assertEqual(file.data, self.content)
+
+    def test_put_range_not_editable(self):
+        from zope.interface import implementer
+
+        from zope.app.file.browser.file import FilePUT
+        from zope.app.file.interfaces import IFile
+
+        @implementer(IFile)
+        class ReadOnlyFile:
+            data = self.content
+
+            def getSize(self):
+                return len(self.data)
+
+        file = ReadOnlyFile()
+        request = TestRequest(BytesIO(b'new'), CONTENT_LENGTH='3',
+                              HTTP_CONTENT_RANGE='bytes 0-2/*')
+        FilePUT(file, request).PUT()
+        self.assertEqual(request.response.getStatus(), 501)
+        self.assertEqual(file.data, self.content)
+
+
+class TestFileViewHead(unittest.TestCase):
+
+    content = b'0123456789' * 10
+
+    def setUp(self):
+        import transaction
+        from ZODB.DB import DB
+        from ZODB.DemoStorage import DemoStorage
+        setUp()
+        self.addCleanup(tearDown)
+        db = DB(DemoStorage())
+        self.addCleanup(db.close)
+        self.conn = db.open()
+        self.addCleanup(self.conn.close)
+        self.addCleanup(transaction.abort)
+        self.root = self.conn.root()
+
+    def _storeFile(self, data, **kw):
+        import transaction
+        self.root['file'] = file = File(contentType='text/plain', **kw)
+        file.data = data
+        file.modified = datetime(2006, 1, 1, tzinfo=pytz.utc)
+        alsoProvides(file, IZopeDublinCore)
+        transaction.commit()
+        self.conn.cacheMinimize()
+        return file
+
+    def _head(self, file, **env):
+        request = TestRequest(REQUEST_METHOD='HEAD', **env)
+        response = request.response
+        response.setResult(FileTestView(file, request).show())
+        return response, response.consumeBody()
+
+    def _chunks(self, file):
+        if isinstance(file._data, FileChunk):
+            return [file._data]
+        return list(file._data.values())
+
+    def test_head(self):
+        for data, storage in [(BytesIO(self.content), 'chunks'),
+                              (self.content, 'chunks'),
+                              (BytesIO(self.content), 'tree')]:
+            file = self._storeFile(data, storage=storage, chunkSize=10)
+            response, body = self._head(file)
+            self.assertEqual(response.getStatus(), 200)
+            self.assertEqual(body, b'')
+            self.assertEqual(response.getHeader('Content-Length'), '100')
+            self.assertEqual(response.getHeader('Content-Type'),
+                             'text/plain')
+            self.assertEqual(response.getHeader('Last-Modified'),
+                             'Sun, 01 Jan 2006 00:00:00 GMT')
+            self.assertEqual(
+                response.getHeader('ETag'),
+                '"%s"' % hashlib.sha256(self.content).hexdigest())
+            for chunk in self._chunks(file):
+                self.assertIsNone(chunk._p_changed, storage)
+
+    def test_head_blob(self):
+        file = self._storeFile(self.content, storage='blob')
+        response, body = self._head(file)
+        self.assertEqual(response.getHeader('Content-Length'), '100')
+        self.assertEqual(body, b'')
+
+    def test_head_range(self):
+        file = self._storeFile(BytesIO(self.content), chunkSize=10)
+        response, body = self._head(file, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(response.getHeader('Content-Length'), '100')
+
+    def test_head_gzip(self):
+        from zope.app.file.file import CompressedChunk
+        file = self._storeFile(CompressedChunk(self.content))
+        response, body = self._head(file, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.getHeader('Content-Encoding'), 'gzip')
+        self.assertIsNone(response.getHeader('Content-Length'))
+        self.assertIsNone(file._data._p_changed)
+
+    def test_head_not_modified(self):
+        file = self._storeFile(BytesIO(self.content), chunkSize=10)
+        response, body = self._head(
+            file, HTTP_IF_NONE_MATCH='"%s"' % file.getDigest())
+        self.assertEqual(response.getStatus(), 304)
+
+
+class BlobFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        import transaction
+        from ZODB.DB import DB
+        from ZODB.DemoStorage import DemoStorage
+        from zope.component import provideAdapter
+
+        from zope.app.file.browser.file import FileDownloadResult
+        setUp()
+        self.addCleanup(tearDown)
+        provideAdapter(FileDownloadResult)
+        db = DB(DemoStorage())
+        self.addCleanup(db.close)
+        tm = transaction.TransactionManager()
+        conn = db.open(transaction_manager=tm)
+        self.addCleanup(conn.close)
+        self.addCleanup(tm.abort)
+        self.file = File(b'x' * 100, 'text/plain', storage='blob')
+        conn.root()['file'] = self.file
+        tm.commit()
+
+    def _show(self, file, **env):
+        request = TestRequest(**env)
+        response = request.response
+        response.setResult(FileTestView(file, request).show())
+        return response, response.consumeBody()
+
+
+class TestFileViewOffload(BlobFileTestCase):
+
+    def _provideOffload(self, *args, **kw):
+        from zope.component import provideUtility
+
+        from zope.app.file.browser.file import DownloadOffload
+        from zope.app.file.interfaces import IDownloadOffload
+        provideUtility(DownloadOffload(*args, **kw), IDownloadOffload)
+
+    def test_not_configured(self):
+        response, body = self._show(self.file)
+        self.assertIsNone(response.getHeader('X-Sendfile'))
+        self.assertEqual(body, b'x' * 100)
+
+    def test_sendfile(self):
+        self._provideOffload()
+        response, body = self._show(self.file)
+        filename = response.getHeader('X-Sendfile')
+        self.assertEqual(filename, self.file.getFilename())
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'x' * 100)
+        self.assertEqual(response.getHeader('Content-Type'), 'text/plain')
+        self.assertEqual(response.getHeader('Content-Length'), '0')
+        self.assertEqual(body, b'')
+
+    def test_accel_redirect(self):
+        import os
+        root = os.path.dirname(os.path.dirname(self.file.getFilename()))
+        self._provideOffload('X-Accel-Redirect', root=root,
+                             location='/blobs/')
+        response, body = self._show(self.file)
+        location = response.getHeader('X-Accel-Redirect')
+        self.assertTrue(location.startswith('/blobs/'))
+        self.assertTrue(self.file.getFilename().endswith(location[6:]))
+        self.assertEqual(body, b'')
+
+    def test_outside_of_root(self):
+        self._provideOffload('X-Accel-Redirect', root='/nonexisting',
+                             location='/blobs')
+        response, body = self._show(self.file)
+        self.assertIsNone(response.getHeader('X-Accel-Redirect'))
+        self.assertEqual(body, b'x' * 100)
+
+    def test_uncommitted_blob(self):
+        self._provideOffload()
+        self.file.data = b'y' * 100
+        response, body = self._show(self.file)
+        self.assertIsNone(response.getHeader('X-Sendfile'))
+        self.assertEqual(body, b'y' * 100)
+
+    def test_chunks(self):
+        self._provideOffload()
+        response, body = self._show(File(b'z' * 100, storage='chunks'))
+        self.assertIsNone(response.getHeader('X-Sendfile'))
+        self.assertEqual(body, b'z' * 100)
+
+    def test_range_not_offloaded(self):
+        self._provideOffload()
+        response, body = self._show(self.file, HTTP_RANGE='bytes=0-9')
+        self.assertIsNone(response.getHeader('X-Sendfile'))
+        self.assertEqual(response.getStatus(), 206)
+        self.assertEqual(body, b'x' * 10)
+
+
+class TestFileViewFileWrapper(BlobFileTestCase):
+
+    def _show(self, file, **env):
+        class Wrapper:
+            def __init__(self, file, block_size):
+                self.file = file
+
+            def __iter__(self):
+                return iter(lambda: self.file.read(10), b'')
+
+            def close(self):
+                self.file.close()
+
+        request = TestRequest(environ={'wsgi.file_wrapper': Wrapper}, **env)
+        response = request.response
+        response.setResult(FileTestView(file, request).show())
+        return response, response.consumeBodyIter()
+
+    def test_committed_blob(self):
+        response, result = self._show(self.file)
+        self.assertEqual(result.file.name, self.file.getFilename())
+        self.assertEqual(response.getHeader('Content-Length'), '100')
+        self.assertEqual(b''.join(result), b'x' * 100)
+        result.close()
+        self.assertTrue(result.file.closed)
+
+    def test_uncommitted_blob(self):
+        self.file.data = b'y' * 100
+        response, result = self._show(self.file)
+        self.assertFalse(hasattr(result, 'file'))
+        self.assertEqual(b''.join(result), b'y' * 100)
+
+    def test_range(self):
+        response, result = self._show(self.file, HTTP_RANGE='bytes=0-9')
+        self.assertFalse(hasattr(result, 'file'))
+        self.assertEqual(b''.join(result), b'x' * 10)
+
+
+class TestFileEditWrite(unittest.TestCase):
+
+    def setUp(self):
+        setUp()
+        self.addCleanup(tearDown)
+
+    def _edit(self, file, text):
+        from zope.app.file.browser.file import FileEdit
+
+        class FileEditView(FileEdit, BrowserView):
+            pass
+
+        view = FileEditView(file, TestRequest())
+        view.setData({'contentType': 'text/plain', 'data': text})
+
+    def test_only_changed_chunks(self):
+        file = File(storage='tree', chunkSize=10)
+        file.data = b'0123456789' * 10
+        chunks = list(file._data.values())
+        text = '0123456789' * 4 + 'abc3456789' + '0123456789' * 5
+        self._edit(file, text)
+        self.assertEqual(text.encode(), file.data)
+        changed = [i for i, chunk in enumerate(file._data.values())
+                   if chunk is not chunks[i]]
+        self.assertEqual([4], changed)
+
+    def test_longer(self):
+        file = File(storage='tree', chunkSize=10)
+        file.data = b'0123456789' * 10
+        chunks = list(file._data.values())
+        self._edit(file, '0123456789' * 10 + 'abc')
+        self.assertEqual(b'0123456789' * 10 + b'abc', file.data)
+        self.assertEqual(chunks, list(file._data.values())[:10])
+
+    def test_shorter(self):
+        file = File(b'0123456789' * 10, 'text/plain')
+        self._edit(file, '0123456789')
+        self.assertEqual(b'0123456789', file.data)
 
 
 def test_suite():
-    return doctest.DocTestSuite(
-        "zope.app.file.browser.file",
-        setUp=setUp,
-        tearDown=tearDown,
-        optionflags=(doctest.ELLIPSIS
-                     | doctest.NORMALIZE_WHITESPACE))
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromName(__name__),
+        doctest.DocTestSuite(
+            "zope.app.file.browser.file",
+            setUp=setUp,
+            tearDown=tearDown,
+            optionflags=(doctest.ELLIPSIS
+                         | doctest.NORMALIZE_WHITESPACE)),
+    ))
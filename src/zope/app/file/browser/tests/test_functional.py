@@ -234,6 +234,107 @@ class FileTest(BrowserTestCase):
         self.assertEqual(body, self.content)
         self.checkForBrokenLinks(response, '/file/@@index.html', 'mgr:mgrpw')
 
+    def testIndexStreamed(self):
+        import transaction
+
+        from zope.app.file.file import MAXCHUNKSIZE
+        content = b'0123456789' * (MAXCHUNKSIZE // 2)
+        root = self.getRootFolder()
+        root['file'] = File()
+        transaction.commit()
+        root['file'].data = BytesIO(content)
+        transaction.commit()
+        response = self.publish(
+            '/file/@@index.html',
+            basic='mgr:mgrpw')
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(response.getHeader('Content-Length'),
+                         str(len(content)))
+        self.assertEqual(response.body, content)
+
+    def testIndexBlob(self):
+        from zope.app.file.file import MAXCHUNKSIZE
+        content = b'0123456789' * MAXCHUNKSIZE
+        root = self.getRootFolder()
+        root['file'] = File(content, 'text/plain', storage='blob')
+        response = self.publish(
+            '/file/@@index.html',
+            basic='mgr:mgrpw')
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(response.body, content)
+        response = self.publish(
+            '/file/@@index.html',
+            basic='mgr:mgrpw',
+            headers={'Range': 'bytes=-10'})
+        self.assertEqual(response.getStatus(), 206)
+        self.assertEqual(response.body, b'0123456789')
+
+    def testFilenameProtected(self):
+        from zope.security.checker import getCheckerForInstancesOf
+        for factory in (File, Image):
+            checker = getCheckerForInstancesOf(factory)
+            self.assertEqual('zope.View', checker.permission_id('iterData'))
+            self.assertEqual('zope.ManageServices',
+                             checker.permission_id('getFilename'))
+        # Users who may only view the file can still download its blob
+        content = b'0123456789' * 100
+        self.getRootFolder()['file'] = File(content, 'text/plain',
+                                            storage='blob')
+        response = self._testapp.get(
+            '/file/@@index.html', extra_environ={'wsgi.handleErrors': False})
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.body, content)
+
+    def testIndexRange(self):
+        import transaction
+
+        from zope.app.file.file import MAXCHUNKSIZE
+        content = bytes(range(256)) * (MAXCHUNKSIZE // 64)
+        root = self.getRootFolder()
+        root['file'] = File()
+        transaction.commit()
+        root['file'].data = BytesIO(content)
+        transaction.commit()
+        start = 3 * MAXCHUNKSIZE - 10
+        response = self.publish(
+            '/file/@@index.html',
+            basic='mgr:mgrpw',
+            headers={'Range': 'bytes=%d-%d' % (start, start + 19)})
+        self.assertEqual(response.getStatus(), 206)
+        self.assertEqual(response.getHeader('Content-Range'),
+                         'bytes %d-%d/%d' % (start, start + 19, len(content)))
+        self.assertEqual(response.body, content[start:start + 20])
+
+    def testIndexEncoded(self):
+        import zope.component
+
+        from zope.app.file.file import FileStoragePolicy
+        from zope.app.file.interfaces import IFileStoragePolicy
+        policy = FileStoragePolicy(encodedTypes=('text/*',))
+        gsm = zope.component.getGlobalSiteManager()
+        gsm.registerUtility(policy, IFileStoragePolicy)
+        self.addCleanup(gsm.unregisterUtility, policy, IFileStoragePolicy)
+        content = b'0123456789' * 100
+        response = self.publish(
+            '/+/zope.app.file.File=',
+            form={'type_name': 'zope.app.file.File',
+                  'field.data': StringIO(content),
+                  'field.data.used': '',
+                  'field.contentType': 'text/plain',
+                  'add_input_name': 'file',
+                  'UPDATE_SUBMIT': 'Add'},
+            basic='mgr:mgrpw')
+        self.assertEqual(response.getStatus(), 302)
+        file = self.getRootFolder()['file']
+        self.assertEqual(['gzip'], list(file.getEncodings()))
+        response = self.publish(
+            '/file/@@index.html',
+            basic='mgr:mgrpw',
+            headers={'Accept-Encoding': 'gzip'})
+        # The test application decodes the body already
+        self.assertEqual(response.getHeader('Vary'), 'Accept-Encoding')
+        self.assertEqual(response.body, content)
+
     def testPreview(self):
         self.addFile()
         response = self.publish(
@@ -364,6 +465,57 @@ class ImageTest(BrowserTestCase):
         self.assertEqual(body, self.content)
         self.checkForBrokenLinks(response, '/image/@@index.html', 'mgr:mgrpw')
 
+    def testImages(self):
+        from datetime import datetime
+        from datetime import timezone
+
+        import zope.component
+        from zope.dublincore.interfaces import IZopeDublinCore
+        from zope.publisher.interfaces import NotFound
+
+        from zope.app.file.interfaces import IImageScaler
+        from zope.app.file.tests.test_scale import FakeScaler
+        from zope.app.file.tests.test_scale import gif
+        scaler = FakeScaler()
+        gsm = zope.component.getGlobalSiteManager()
+        gsm.registerUtility(scaler, IImageScaler)
+        self.addCleanup(gsm.unregisterUtility, scaler, IImageScaler)
+        self.content = gif(1600, 1200)
+        self.addImage()
+        IZopeDublinCore(self.getRootFolder()['image']).modified = datetime(
+            2026, 1, 1, tzinfo=timezone.utc)
+        response = self.publish('/image/@@images/preview', basic='mgr:mgrpw')
+        self.assertEqual(response.getStatus(), 200)
+        self.assertEqual(response.body, gif(400, 300))
+        self.assertEqual(response.getHeader('Content-Type'), 'image/gif')
+        self.assertEqual(response.getHeader('Content-Length'), '30')
+        # The scaled image is as old as the image
+        self.assertEqual(response.getHeader('Last-Modified'),
+                         'Thu, 01 Jan 2026 00:00:00 GMT')
+        etag = response.getHeader('ETag')
+        self.assertNotEqual(
+            etag, self.publish('/image', basic='mgr:mgrpw').headers['ETag'])
+        response = self._testapp.get(
+            '/image/@@images/preview', headers={'If-None-Match': etag},
+            status=304)
+        self.assertEqual([(400, 300)], scaler.scaled)
+
+        with self.assertRaises(NotFound):
+            self.publish('/image/@@images/huge', basic='mgr:mgrpw')
+        with self.assertRaises(NotFound):
+            self.publish('/image/@@images', basic='mgr:mgrpw')
+
+        # A new upload drops the scaled versions.
+        response = self.publish(
+            '/image/@@upload.html',
+            form={'field.data': StringIO(gif(800, 1600)),
+                  'field.data.used': '',
+                  'UPDATE_SUBMIT': 'Change'},
+            basic='mgr:mgrpw')
+        response = self.publish('/image/@@images/thumbnail',
+                                basic='mgr:mgrpw')
+        self.assertEqual(response.body, gif(64, 128))
+
     def testPreview(self):
         self.addImage()
         response = self.publish(
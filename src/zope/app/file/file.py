@@ -15,17 +15,63 @@
 """
 __docformat__ = 'restructuredtext'
 
+import bisect
+import fnmatch
+import functools
+import hashlib
+import io
+import itertools
+import struct
+import zlib
+
 import transaction
 import zope.app.publication.interfaces
+import zope.component
+from BTrees.LOBTree import LOBTree
+from BTrees.OIBTree import OIBTree
+from BTrees.OOBTree import OOBTree
 from persistent import Persistent
+from zope.copy.interfaces import ICopyHook
+from zope.copy.interfaces import ResumeCopy
 from zope.interface import implementer
+from zope.lifecycleevent.interfaces import IObjectModifiedEvent
+from zope.lifecycleevent.interfaces import IObjectRemovedEvent
 
 from zope.app.file import interfaces
 
 
+try:
+    from ZODB.blob import Blob
+    from ZODB.interfaces import BlobError
+except ImportError:  # pragma: no cover
+    Blob = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # set the size of the chunks
 MAXCHUNKSIZE = 1 << 16
 
+# the number of chunks to read ahead when their oids are known
+PREFETCHCHUNKS = 16
+
+# the serial of objects that have not been committed yet
+_z64 = b'\x00' * 8
+
+# the compression level of compressed chunks and of gzip encoded variants
+COMPRESSLEVEL = 6
+
+# the quality of brotli encoded variants; the highest ones compress only
+# about a MB per second, which would hold up the request storing a file
+BROTLIQUALITY = 5
+
+# gzip header without a file name or time; the trailer follows the empty
+# final block of the deflate stream
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+_DEFLATE_END = b'\x03\x00'
+
 try:
     text_type = unicode
 except NameError:
@@ -33,7 +79,8 @@ except NameError:
 
 
 @implementer(zope.app.publication.interfaces.IFileContent,
-             interfaces.IFile)
+             interfaces.IStreamableFile,
+             interfaces.IEditableFile)
 class File(Persistent):
     """A persistent content component storing binary file data
 
@@ -122,38 +169,117 @@ class File(Persistent):
     True
     >>> verifyClass(interfaces.IFile, File)
     True
+    >>> verifyClass(interfaces.IStreamableFile, File)
+    True
     """
 
     _data = None
     _size = 0
 
-    def __init__(self, data=b'', contentType=''):
-        self.data = data
+    # How the data is stored, `None` means to ask the `IFileStoragePolicy`
+    _storage = None
+
+    # Size of the chunks, `None` means to ask the `IFileStoragePolicy`
+    _chunkSize = None
+
+    # Whether new chunks store their data compressed, see
+    # `IFileStoragePolicy.compressedTypes`
+    _compressed = False
+
+    # SHA-256 digest of the data as hex string, see `getDigest`; `None`
+    # for data stored before digests were computed or changed in place
+    _digest = None
+
+    # The number of changes of the data in place with `IEditableFile`,
+    # which drop the digest.  Data derived from the data, like scaled
+    # images, is kept for it instead of the digest.
+    _edits = 0
+
+    # Variants of the data by content-coding, see `getEncodings`; `None`
+    # until the data has been encoded
+    _encodings = None
+
+    # Offsets of the chunks of the data, see `_getChunkIndex`
+    _v_chunkIndex = None
+
+    def __init__(self, data=b'', contentType='', storage=None,
+                 chunkSize=None):
+        if storage is not None:
+            self._storage = storage
+        if chunkSize is not None:
+            self._chunkSize = chunkSize
+        # The content type decides whether the data is compressed.
         self.contentType = contentType
+        self.data = data
 
     def _getData(self):
         if isinstance(self._data, FileChunk):
             return bytes(self._data)
+        if isinstance(self._data, LOBTree):
+            return b''.join(chunk._data for chunk in self._data.values())
+        if _isBlob(self._data):
+            with self._data.open('r') as f:
+                return f.read()
         return self._data
 
     def _setData(self, data):
+        old = self._data
+        self._dropEncodings()
+        if isinstance(data, text_type):
+            data = data.encode('UTF-8')
+        # The digest is computed while the data is stored.  Data that can
+        # be read again is read once more instead of changing how it is
+        # stored.
+        digest = hashlib.sha256()
+        if isinstance(data, bytes):
+            digest.update(data)
+        elif isinstance(data, FileChunk) or _isSeekable(data):
+            for piece in _iterSource(data):
+                digest.update(piece)
+        elif data is not None:
+            data = _iterDigested(data, digest)
+        self._storeData(data)
+        self._digest = digest.hexdigest()
+        if old is not self._data:
+            _releaseChunks(old)
+
+    def _storeData(self, data):
+        self._v_chunkIndex = None
 
         # Handle case when data is a string
         if isinstance(data, text_type):
             data = data.encode('UTF-8')
 
-        if isinstance(data, bytes):
-            self._data, self._size = FileChunk(data), len(data)
-            return
-
         # Handle case when data is None
         if data is None:
             raise TypeError('Cannot set None data on a file.')
 
+        storage = self._getStorage()
+        self._compressed = (
+            storage != 'blob'
+            and getStoragePolicy().compresses(
+                getattr(self, 'contentType', '') or ''))
+        if storage == 'blob':
+            self._setBlobData(data)
+            return
+        if storage == 'tree':
+            self._setTreeData(data)
+            return
+
+        if isinstance(data, bytes):
+            self._data, self._size = self._newChunk(data), len(data)
+            return
+
         # Handle case when data is already a FileChunk
         if isinstance(data, FileChunk):
             size = len(data)
             self._data, self._size = data, size
+            self._compressed = isinstance(data, CompressedChunk)
+            return
+
+        # Handle case when data is an iterable or a stream we can't seek
+        if not _isSeekable(data):
+            self._setStreamData(data)
             return
 
         # Handle case when data is a file object
@@ -162,38 +288,42 @@ class File(Persistent):
 
         seek(0, 2)
         size = end = data.tell()
+        chunkSize = self._getChunkSize(size)
 
-        if size <= 2 * MAXCHUNKSIZE:
+        if size <= 2 * chunkSize:
             seek(0)
-            if size < MAXCHUNKSIZE:
+            if size < chunkSize and getStoragePolicy().inline:
                 self._data, self._size = read(size), size
                 return
-            self._data, self._size = FileChunk(read(size)), size
+            self._data, self._size = self._newChunk(read(size)), size
             return
 
         # Make sure we have an _p_jar, even if we are a new object, by
         # doing a sub-transaction commit.
-        transaction.savepoint(optimistic=True)
+        _savepoint(self._p_jar)
 
         jar = self._p_jar
 
         if jar is None:
             # Ugh
             seek(0)
-            self._data, self._size = FileChunk(read(size)), size
+            self._data, self._size = self._newChunk(read(size)), size
             return
 
         # Now we're going to build a linked list from back
         # to front to minimize the number of database updates
         # and to allow us to get things out of memory as soon as
         # possible.
+        policy = getStoragePolicy()
+        pending = []
+        pendingSize = 0
         next = None
         while end > 0:
-            pos = end - MAXCHUNKSIZE
-            if pos < MAXCHUNKSIZE:
-                pos = 0  # we always want at least MAXCHUNKSIZE bytes
+            pos = end - chunkSize
+            if pos < chunkSize:
+                pos = 0  # we always want at least chunkSize bytes
             seek(pos)
-            data = FileChunk(read(end - pos))
+            data = self._newChunk(read(end - pos))
 
             # Woooop Woooop Woooop! This is a trick.
             # We stuff the data directly into our jar to reduce the
@@ -204,12 +334,18 @@ class File(Persistent):
             # the thing registered:
             data.next = next
 
-            # Now make it get saved in a sub-transaction!
-            transaction.savepoint(optimistic=True)
+            pending.append(data)
+            pendingSize += end - pos
+            if pos == 0 or policy.needsSavepoint(len(pending), pendingSize):
+                # Now make them get saved in a sub-transaction!
+                _savepoint(jar)
 
-            # Now make it a ghost to free the memory.  We
-            # don't need it anymore!
-            data._p_changed = None
+                # Now make them ghosts to free the memory.  We
+                # don't need them anymore!
+                for chunk in pending:
+                    chunk._p_changed = None
+                pending = []
+                pendingSize = 0
 
             next = data
             end = pos
@@ -217,14 +353,922 @@ class File(Persistent):
         self._data, self._size = next, size
         return
 
+    def _setStreamData(self, data):
+        """Store the data of an iterable or of a stream that can't seek.
+
+        The data is read only once, front to back, so the linked list of
+        chunks is built in that order as well.  The chunks are saved in
+        sub-transactions as the `IFileStoragePolicy` asks for it and
+        turned into ghosts once the next chunk is linked to them, so
+        that only the chunks since the last savepoint are kept in memory.
+        """
+        pieces = _iterChunks(_iterSource(data), self._getChunkSize)
+        first = next(pieces, b'')
+        second = next(pieces, None)
+        if second is None:
+            if (len(first) < self._getChunkSize(len(first))
+                    and getStoragePolicy().inline):
+                self._data, self._size = first, len(first)
+            else:
+                self._data, self._size = self._newChunk(first), len(first)
+            return
+
+        # Make sure we have an _p_jar, even if we are a new object, by
+        # doing a sub-transaction commit.
+        _savepoint(self._p_jar)
+
+        jar = self._p_jar
+
+        policy = getStoragePolicy()
+        pending = []
+        pendingSize = 0
+        head = previous = None
+        size = 0
+        for piece in itertools.chain((first, second), pieces):
+            chunk = self._newChunk(piece)
+            size += len(piece)
+            if previous is None:
+                head = chunk
+            else:
+                previous.next = chunk
+
+            if jar is not None:
+                jar.add(chunk)
+                pending.append(chunk)
+                pendingSize += len(piece)
+                if policy.needsSavepoint(len(pending), pendingSize):
+                    _savepoint(jar)
+                    # All but the last chunk are complete now, free the
+                    # memory.  The last one is changed again when the
+                    # next chunk is linked to it.
+                    for complete in pending[:-1]:
+                        complete._p_changed = None
+                    pending = pending[-1:]
+                    pendingSize = len(piece)
+
+            previous = chunk
+
+        self._data, self._size = head, size
+
+    def _newChunk(self, data):
+        if self._compressed:
+            return CompressedChunk(data)
+        return FileChunk(data)
+
+    def _getStorage(self):
+        storage = self._storage
+        if storage is None:
+            storage = getStoragePolicy().storage
+        return storage
+
+    def _getChunkSize(self, size=None):
+        """Return the size of the chunks for data of `size` bytes."""
+        chunkSize = self._chunkSize
+        if chunkSize is None:
+            chunkSize = getStoragePolicy().getChunkSize(size)
+        return chunkSize
+
+    def _setBlobData(self, data):
+        if Blob is None:  # pragma: no cover
+            raise ValueError('Storing files in blobs requires the ZODB.')
+
+        blob = Blob()
+        size = 0
+        with blob.open('w') as f:
+            for piece in _iterSource(data):
+                f.write(piece)
+                size += len(piece)
+        self._data, self._size = blob, size
+
+    def _setTreeData(self, data):
+        """Store the data in chunks in a tree keyed by their offsets.
+
+        Unlike in a chain of chunks, any chunk can be found without
+        loading the chunks before it.  Chunks don't refer to each other,
+        so they can be shared with other files through an `IChunkStore`.
+        """
+        pieces = _iterChunks(_iterSource(data), self._getChunkSize)
+        first = next(pieces, None)
+        second = next(pieces, None)
+        self._data = tree = LOBTree()
+        if second is not None:
+            # Make sure we have an _p_jar, even if we are a new object, by
+            # doing a sub-transaction commit.
+            _savepoint(self._p_jar)
+            pieces = itertools.chain((first, second), pieces)
+        elif first is not None:
+            pieces = (first,)
+        else:
+            pieces = ()
+        self._size = self._addTreeChunks(tree, pieces, 0)
+
+    def _addTreeChunks(self, tree, pieces, offset):
+        """Add chunks with the `pieces` of data to `tree` from `offset` on.
+
+        Returns the offset after the last chunk.
+        """
+        store = zope.component.queryUtility(interfaces.IChunkStore)
+        if store is None:
+            makeChunk = self._newChunk
+        else:
+            makeChunk = functools.partial(store.add,
+                                          compress=self._compressed)
+        jar = self._p_jar
+        policy = getStoragePolicy()
+        pending = []
+        pendingSize = 0
+        for piece in pieces:
+            chunk = makeChunk(piece)
+            tree[offset] = chunk
+            offset += len(piece)
+
+            if jar is not None and chunk._p_jar is None:
+                jar.add(chunk)
+                pending.append(chunk)
+                pendingSize += len(piece)
+                if policy.needsSavepoint(len(pending), pendingSize):
+                    _savepoint(jar)
+                    for saved in pending:
+                        saved._p_changed = None
+                    pending = []
+                    pendingSize = 0
+        return offset
+
+    def append(self, data):
+        '''See `IEditableFile`'''
+        if isinstance(data, text_type):
+            data = data.encode('UTF-8')
+        if data is None:
+            raise TypeError('Cannot append None data to a file.')
+        if data == b'':
+            return
+
+        self._dropEncodings()
+        if _isBlob(self._data):
+            self._writeBlobData(self._size, data)
+            return
+        tree = self._getChunkTree()
+        if tree is None:
+            # Data smaller than a chunk is simply stored again.
+            self._setData(
+                itertools.chain(_iterSource(self._data), _iterSource(data)))
+            return
+
+        size = self._size
+        pieces = _iterSource(data)
+        if size:
+            # Complete the last chunk instead of leaving a small one.  It
+            # may be shared with copies of the file, so it is replaced.
+            last = tree.maxKey()
+            chunk = tree[last]
+            if _dataLength(chunk) < self._getChunkSize(last):
+                pieces = itertools.chain((chunk._data,), pieces)
+                size = last
+                del tree[last]
+                _releaseChunk(chunk)
+        pieces = _iterChunks(
+            pieces, lambda offset: self._getChunkSize(size + offset))
+        self._size = self._addTreeChunks(tree, pieces, size)
+        self._data = tree
+        self._v_chunkIndex = None
+        # Computing the digest again would mean reading all the data.
+        self._digest = None
+        self._edits += 1
+
+    def write(self, offset, data):
+        '''See `IEditableFile`'''
+        if isinstance(data, text_type):
+            data = data.encode('UTF-8')
+        if not isinstance(data, bytes) and not hasattr(data, 'read'):
+            raise TypeError('Can only write bytes or streams to a file.')
+        size = self._size
+        if not 0 <= offset <= size:
+            raise ValueError('Cannot write at offset %d of data of %d bytes.'
+                             % (offset, size))
+        if isinstance(data, bytes):
+            if not data:
+                return
+            data = io.BytesIO(data)
+
+        self._dropEncodings()
+        if _isBlob(self._data):
+            self._writeBlobData(offset, _iterRest(data))
+            return
+        tree = self._getChunkTree()
+        if tree is None:
+            # Data smaller than a chunk is simply stored again.
+            old = self._getData()
+            new = data.read(size - offset)
+            self._setData(itertools.chain(
+                (old[:offset] + new + old[offset + len(new):],),
+                _iterRest(data)))
+            return
+
+        if offset < size:
+            # Only the chunks overlapping the data are loaded.  They may
+            # be shared with copies of the file, so they are replaced.
+            # The data is read chunk by chunk.
+            for key, chunk in tree.items(tree.maxKey(offset), size - 1):
+                old = chunk._data
+                start = max(offset, key) - key
+                new = data.read(len(old) - start)
+                end = start + len(new)
+                if new != old[start:end]:
+                    self._addTreeChunks(
+                        tree, (old[:start] + new + old[end:],), key)
+                    _releaseChunk(chunk)
+                if end < len(old):
+                    # The data ends in this chunk.
+                    break
+        self._data = tree
+        self._v_chunkIndex = None
+        self._digest = None
+        self._edits += 1
+        rest = data.read(MAXCHUNKSIZE)
+        if rest:
+            self.append(itertools.chain((rest,), _iterRest(data)))
+
+    def _getChunkTree(self):
+        """Return the tree of chunks to change the data in place.
+
+        A chain of chunks can't be changed without changing the chunks
+        before the change, which the copies of the file may share, so the
+        data of the chain is stored again in a tree.  The chunks of the
+        chain refer to the chunks after them and can't be moved into the
+        tree, the tree would keep the whole old chain alive.  `None` is
+        returned for data smaller than a chunk.
+        """
+        data = self._data
+        if isinstance(data, LOBTree):
+            return data
+        if (isinstance(data, FileChunk)
+                and self._size >= self._getChunkSize(self._size)):
+            tree = LOBTree()
+            self._addTreeChunks(tree, _iterSource(data), 0)
+            return tree
+        return None
+
+    def _writeBlobData(self, offset, data):
+        # The blob may be shared with copies of the file, so the data is
+        # written to a new blob.  Writing to the old one would copy its
+        # file as well.  As all the data is copied, the digest is
+        # computed on the way.
+        blob = Blob()
+        digest = hashlib.sha256()
+        pieces = itertools.chain(
+            FileStreamIterator(_openBlob(self._data), 0, offset),
+            _iterSource(data))
+        with blob.open('w') as f:
+            for piece in _iterDigested(pieces, digest):
+                f.write(piece)
+            end = f.tell()
+            if end < self._size:
+                rest = FileStreamIterator(_openBlob(self._data), end)
+                for piece in _iterDigested(rest, digest):
+                    f.write(piece)
+            size = f.tell()
+        self._data, self._size = blob, size
+        self._digest = digest.hexdigest()
+
     def getSize(self):
         '''See `IFile`'''
         return self._size
 
+    def iterData(self, start=0, stop=None):
+        '''See `IStreamableFile`'''
+        data = self._data
+        if stop is None or stop > self._size:
+            stop = self._size
+        if start >= stop:
+            return FileChunkIterator(b'')
+
+        if _isBlob(data):
+            return FileStreamIterator(_openBlob(data), start, stop - start)
+
+        if isinstance(data, LOBTree):
+            # Only the buckets of the tree are loaded, not the chunks.
+            first = data.maxKey(start)
+            chunks = list(data.values(first, stop, excludemax=True))
+            return FileChunkIterator(chunks, start - first, stop - start)
+
+        if not isinstance(data, FileChunk):
+            return FileChunkIterator(data[start:stop])
+
+        if start or self._v_chunkIndex is not None:
+            # The index tells which chunks are needed, so they can be
+            # prefetched instead of being loaded one by one.
+            offsets, chunks = self._getChunkIndex()
+            i = bisect.bisect_right(offsets, start) - 1
+            j = bisect.bisect_left(offsets, stop)
+            return FileChunkIterator(chunks[i:j], start - offsets[i],
+                                     stop - start)
+
+        return FileChunkIterator(data, 0, stop)
+
+    def hasGzipData(self):
+        '''See `IStreamableFile`'''
+        return self._compressed and isinstance(self._data,
+                                               (FileChunk, LOBTree))
+
+    def iterGzipData(self):
+        '''See `IStreamableFile`'''
+        if not self.hasGzipData():
+            return None
+        data = self._data
+        if isinstance(data, LOBTree):
+            data = list(data.values())
+        elif self._v_chunkIndex is not None:
+            data = self._getChunkIndex()[1]
+        return GzipChunkIterator(data)
+
+    def open(self):
+        '''See `IStreamableFile`'''
+        data = self._data
+        if _isBlob(data):
+            return _openBlob(data)
+        return FileReader(self)
+
+    def getDigest(self):
+        '''See `IStreamableFile`'''
+        return self._digest
+
+    def getEncodings(self):
+        '''See `IStreamableFile`'''
+        return dict(self._encodings or {})
+
+    def _encode(self):
+        """Store the variants of the data encoded with the `ENCODERS`.
+
+        The data is encoded while it is read, chunk by chunk, and each
+        variant is stored in a file of its own, like the data itself.
+        Variants that are not smaller than the data are dropped.
+        """
+        self._dropEncodings()
+        if not getStoragePolicy().encodes(self.contentType or ''):
+            # Files that are never encoded aren't changed.
+            return
+        encodings = {}
+        for coding, encoder in sorted(ENCODERS.items()):
+            variant = File(storage=self._storage, chunkSize=self._chunkSize)
+            if self._p_jar is not None:
+                self._p_jar.add(variant)
+            variant.data = _iterEncoded(self.iterData(), encoder())
+            if variant.getSize() < self._size:
+                encodings[coding] = variant
+            else:
+                _releaseChunks(variant._data)
+        self._encodings = encodings
+
+    def _dropEncodings(self):
+        encodings = self._encodings
+        if encodings is not None:
+            for variant in encodings.values():
+                _releaseChunks(variant._data)
+            self._encodings = None
+
+    def getFilename(self):
+        '''See `IStreamableFile`'''
+        data = self._data
+        if not _isBlob(data):
+            return None
+        data._p_activate()
+        try:
+            return data.committed()
+        except BlobError:
+            return None
+
+    def _getChunkIndex(self):
+        """Return the offsets of the chunks of the data and the chunks.
+
+        The index is built the first time it is needed by walking the
+        chain of chunks once, turning each chunk back into a ghost.  It is
+        kept as long as the file stays in the object cache, so further
+        lookups only need a binary search and don't load any chunks.
+        """
+        index = self._v_chunkIndex
+        if index is None:
+            offsets = []
+            chunks = []
+            offset = 0
+            chunk = self._data
+            while chunk is not None:
+                offsets.append(offset)
+                chunks.append(chunk)
+                offset += _dataLength(chunk)
+                next = chunk.next
+                _deactivate(chunk)
+                chunk = next
+            self._v_chunkIndex = index = (offsets, chunks)
+        return index
+
     # See IFile.
     data = property(_getData, _setData)
 
 
+@implementer(interfaces.IFileStoragePolicy)
+class FileStoragePolicy(Persistent):
+    """Policy deciding how the data of files is stored.
+
+    Register an instance as a (local) utility to change how the files
+    of a site store their data.  The policy used when none is registered
+    keeps the data in chunks in the object database:
+
+    >>> getStoragePolicy().storage
+    'chunks'
+    >>> File(b'Foobar')._data
+    <zope.app.file.file.FileChunk object at ...>
+
+    >>> from zope.component import provideUtility
+    >>> provideUtility(FileStoragePolicy('blob'),
+    ...                interfaces.IFileStoragePolicy)
+    >>> getStoragePolicy().storage
+    'blob'
+    >>> file = File(b'Foobar')
+    >>> file._data
+    <ZODB.blob.Blob object at ...>
+    >>> file.data == b'Foobar'
+    True
+    >>> file.getSize()
+    6
+
+    The storage can also be chosen when a file is created, which
+    takes precedence over the policy:
+
+    >>> File(b'Foobar', storage='chunks')._data
+    <zope.app.file.file.FileChunk object at ...>
+
+    The policy also decides how large the chunks are.  By default, all
+    chunks have the same size:
+
+    >>> policy = FileStoragePolicy()
+    >>> policy.getChunkSize() == MAXCHUNKSIZE
+    True
+    >>> policy.getChunkSize(1 << 31) == MAXCHUNKSIZE
+    True
+    >>> FileStoragePolicy(chunkSize=1 << 20).getChunkSize(1 << 31)
+    1048576
+
+    If a maximum chunk size is set, the chunk size is doubled for larger
+    files, so that a file needs about `chunkCount` chunks at most:
+
+    >>> policy = FileStoragePolicy(chunkSize=1 << 16, maxChunkSize=1 << 20)
+    >>> policy.chunkCount
+    256
+    >>> policy.getChunkSize(256 << 16)
+    65536
+    >>> policy.getChunkSize((256 << 16) + 1)
+    131072
+    >>> policy.getChunkSize(1 << 31)
+    1048576
+
+    While large files are split into chunks, the chunks are saved in
+    sub-transactions to keep them out of memory.  A savepoint is made
+    once a number of chunks or of bytes has been collected, 1 MiB by
+    default:
+
+    >>> policy = FileStoragePolicy()
+    >>> policy.needsSavepoint(15, 15 << 16)
+    False
+    >>> policy.needsSavepoint(16, 16 << 16)
+    True
+    >>> policy = FileStoragePolicy(savepointChunks=4, savepointSize=0)
+    >>> policy.needsSavepoint(3, 3 << 20)
+    False
+    >>> policy.needsSavepoint(4, 4)
+    True
+
+    Without a limit, every chunk is saved at once:
+
+    >>> FileStoragePolicy(savepointSize=0).needsSavepoint(1, 1)
+    True
+
+    Data smaller than a chunk that is read from a file is kept in the
+    record of the file itself.  To keep the records of all files small,
+    so that looking at their metadata doesn't load any data, the policy
+    can ask for the data to be stored separately:
+
+    >>> from io import BytesIO
+    >>> provideUtility(FileStoragePolicy(), interfaces.IFileStoragePolicy)
+    >>> File(BytesIO(b'Foobar'))._data
+    b'Foobar'
+    >>> provideUtility(FileStoragePolicy(inline=False),
+    ...                interfaces.IFileStoragePolicy)
+    >>> File(BytesIO(b'Foobar'))._data
+    <zope.app.file.file.FileChunk object at ...>
+    >>> File(iter([b'Foo', b'bar']))._data
+    <zope.app.file.file.FileChunk object at ...>
+
+    The data of files with some content types can be stored compressed.
+    Nothing is compressed by default:
+
+    >>> policy = FileStoragePolicy(
+    ...     compressedTypes=('text/*', 'application/json', '*+xml'))
+    >>> policy.compresses('text/plain; charset=utf-8')
+    True
+    >>> policy.compresses('image/svg+xml')
+    True
+    >>> policy.compresses('image/png')
+    False
+    >>> FileStoragePolicy().compresses('text/plain')
+    False
+    >>> provideUtility(policy, interfaces.IFileStoragePolicy)
+    >>> File(b'Foobar', 'text/plain')._data
+    <zope.app.file.file.CompressedChunk object at ...>
+    >>> File(b'Foobar', 'image/png')._data
+    <zope.app.file.file.FileChunk object at ...>
+
+    Files with some content types can also keep variants of their data
+    encoded for sending, see `updateEncodings`:
+
+    >>> policy = FileStoragePolicy(encodedTypes=('text/*',))
+    >>> policy.encodes('text/css')
+    True
+    >>> policy.encodes('image/png')
+    False
+    """
+
+    chunkSize = None
+    maxChunkSize = None
+    chunkCount = 256
+    inline = True
+    savepointChunks = None
+    savepointSize = 1 << 20
+    compressedTypes = ()
+    encodedTypes = ()
+
+    def __init__(self, storage='chunks', chunkSize=None, maxChunkSize=None,
+                 chunkCount=None, savepointChunks=None, savepointSize=None,
+                 inline=None, compressedTypes=None, encodedTypes=None):
+        self.storage = storage
+        if chunkSize is not None:
+            self.chunkSize = chunkSize
+        if maxChunkSize is not None:
+            self.maxChunkSize = maxChunkSize
+        if chunkCount is not None:
+            self.chunkCount = chunkCount
+        if savepointChunks is not None:
+            self.savepointChunks = savepointChunks
+        if savepointSize is not None:
+            self.savepointSize = savepointSize
+        if inline is not None:
+            self.inline = inline
+        if compressedTypes is not None:
+            self.compressedTypes = tuple(compressedTypes)
+        if encodedTypes is not None:
+            self.encodedTypes = tuple(encodedTypes)
+
+    def getChunkSize(self, size=None):
+        '''See `IFileStoragePolicy`'''
+        chunkSize = self.chunkSize or MAXCHUNKSIZE
+        maxChunkSize = self.maxChunkSize
+        if maxChunkSize and size:
+            while (size > chunkSize * self.chunkCount
+                   and chunkSize * 2 <= maxChunkSize):
+                chunkSize *= 2
+        return chunkSize
+
+    def needsSavepoint(self, chunks, size):
+        '''See `IFileStoragePolicy`'''
+        savepointChunks = self.savepointChunks
+        savepointSize = self.savepointSize
+        if not savepointChunks and not savepointSize:
+            return True
+        return bool(savepointChunks and chunks >= savepointChunks
+                    or savepointSize and size >= savepointSize)
+
+    def compresses(self, contentType):
+        '''See `IFileStoragePolicy`'''
+        return _matchesType(contentType, self.compressedTypes)
+
+    def encodes(self, contentType):
+        '''See `IFileStoragePolicy`'''
+        return _matchesType(contentType, self.encodedTypes)
+
+
+def _matchesType(contentType, patterns):
+    contentType = contentType.split(';')[0].strip().lower()
+    return any(fnmatch.fnmatchcase(contentType, pattern.lower())
+               for pattern in patterns)
+
+
+_defaultStoragePolicy = FileStoragePolicy()
+
+
+def getStoragePolicy():
+    """Return the `IFileStoragePolicy` of the current site."""
+    return zope.component.queryUtility(interfaces.IFileStoragePolicy,
+                                       default=_defaultStoragePolicy)
+
+
+@implementer(interfaces.IChunkStore)
+class ChunkStore(Persistent):
+    """Store sharing the chunks of files with the same data.
+
+    Register an instance as a (local) utility to let the files of a site
+    that use the ``tree`` layout share their chunks.  Chunks are found by
+    the SHA-256 digest of their data:
+
+    >>> store = ChunkStore()
+    >>> chunk = store.add(b'Foobar')
+    >>> bytes(chunk)
+    b'Foobar'
+    >>> store.add(b'Foobar') is chunk
+    True
+    >>> len(store)
+    1
+
+    A chunk is removed from the store once all its references are
+    released:
+
+    >>> store.release(chunk)
+    >>> len(store)
+    1
+    >>> store.release(chunk)
+    >>> len(store)
+    0
+
+    Chunks that don't belong to the store are ignored:
+
+    >>> store.release(FileChunk(b'Foobar'))
+
+    Compressed chunks are kept apart from uncompressed ones:
+
+    >>> compressed = store.add(b'Foobar', compress=True)
+    >>> compressed is chunk, isinstance(compressed, CompressedChunk)
+    (False, True)
+    >>> store.release(compressed)
+
+    Files that are copied retain the chunks they share with the original:
+
+    >>> chunk = store.add(b'Foobar')
+    >>> store.retain(chunk)
+    >>> store.release(chunk)
+    >>> len(store)
+    1
+
+    Once the store is saved in a database, the chunks it adds are saved
+    too, and references are counted by the oids of the chunks.  Retaining
+    and releasing a chunk then doesn't load it.
+    """
+
+    def __init__(self):
+        self._chunks = OOBTree()
+        self._refs = OIBTree()
+        # The keys of the chunks in `_chunks` by their oids
+        self._keys = OOBTree()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def add(self, data, compress=False):
+        '''See `IChunkStore`'''
+        digest = _chunkKey(data, compress)
+        chunk = self._chunks.get(digest)
+        if chunk is None:
+            chunk = CompressedChunk(data) if compress else FileChunk(data)
+            self._chunks[digest] = chunk
+            if self._p_jar is not None:
+                self._p_jar.add(chunk)
+                self._keys[chunk._p_oid] = digest
+        self._refs[digest] = self._refs.get(digest, 0) + 1
+        return chunk
+
+    def retain(self, chunk):
+        '''See `IChunkStore`'''
+        digest = self._getKey(chunk)
+        if digest is not None:
+            self._refs[digest] += 1
+
+    def release(self, chunk):
+        '''See `IChunkStore`'''
+        digest = self._getKey(chunk)
+        if digest is None:
+            return
+        refs = self._refs[digest] - 1
+        if refs > 0:
+            self._refs[digest] = refs
+        else:
+            del self._chunks[digest]
+            del self._refs[digest]
+            if chunk._p_oid is not None:
+                self._keys.pop(chunk._p_oid, None)
+
+    def _getKey(self, chunk):
+        # Return the key of `chunk`, or None if it doesn't belong to the
+        # store.
+        oid = chunk._p_oid
+        if oid is not None:
+            digest = self._keys.get(oid)
+            if digest is not None:
+                return digest
+        # The chunk was added before the store was saved, or it isn't one
+        # of ours.
+        digest = _chunkKey(chunk._data, isinstance(chunk, CompressedChunk))
+        if self._chunks.get(digest) is not chunk:
+            return None
+        if oid is not None:
+            self._keys[oid] = digest
+        return digest
+
+
+def _chunkKey(data, compressed):
+    # Compressed and uncompressed chunks with the same data are kept apart,
+    # so that all chunks of a compressed file are compressed.
+    digest = hashlib.sha256(data).digest()
+    if compressed:
+        digest += b'z'
+    return digest
+
+
+def _releaseChunks(data):
+    # Drop the references of a tree of chunks to shared chunks.
+    if not isinstance(data, LOBTree) or not len(data):
+        return
+    store = zope.component.queryUtility(interfaces.IChunkStore)
+    if store is not None:
+        for chunk in data.values():
+            store.release(chunk)
+
+
+def _releaseChunk(chunk):
+    # Drop the reference of a tree of chunks to a chunk it doesn't keep.
+    store = zope.component.queryUtility(interfaces.IChunkStore)
+    if store is not None:
+        store.release(chunk)
+
+
+@zope.component.adapter(interfaces.IFile, IObjectRemovedEvent)
+def releaseChunks(file, event):
+    """Release the shared chunks of a file that is removed."""
+    _releaseChunks(getattr(file, '_data', None))
+    for variant in (getattr(file, '_encodings', None) or {}).values():
+        _releaseChunks(variant._data)
+
+
+@zope.component.adapter(interfaces.IFile, IObjectModifiedEvent)
+def updateEncodings(file, event):
+    """Encode the data of a file that is created or modified again.
+
+    Modifications which are described as not touching the data or the
+    content type of the file keep the variants it has.
+    """
+    if not isinstance(file, File):
+        return
+    if file._encodings is not None and not _modifiesData(event):
+        return
+    file._encode()
+
+
+def _modifiesData(event):
+    descriptions = getattr(event, 'descriptions', None)
+    if not descriptions:
+        return True
+    for description in descriptions:
+        if {'data', 'contentType'} & set(
+                getattr(description, 'attributes', ())):
+            return True
+    return False
+
+
+def _gzipEncoder():
+    return zlib.compressobj(COMPRESSLEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+class _BrotliEncoder:
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLIQUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+# The encoders of the variants of files by content-coding; they have the
+# `compress` and `flush` methods of the compressors of `zlib`.
+ENCODERS = {'gzip': _gzipEncoder}
+if brotli is not None:  # pragma: no cover
+    ENCODERS['br'] = _BrotliEncoder
+
+
+def _iterEncoded(data, encoder):
+    try:
+        for piece in data:
+            piece = encoder.compress(piece)
+            if piece:
+                yield piece
+    finally:
+        data.close()
+    yield encoder.flush()
+
+
+def _isBlob(data):
+    return Blob is not None and isinstance(data, Blob)
+
+
+def _openBlob(blob):
+    """Open a blob for reading.
+
+    Committed data is opened independently of the database connection,
+    so that it can still be read after the connection has been closed.
+    """
+    blob._p_activate()
+    try:
+        return blob.open('c')
+    except BlobError:
+        return blob.open('r')
+
+
+def _isSeekable(data):
+    seekable = getattr(data, 'seekable', None)
+    if seekable is not None:
+        return seekable()
+    return hasattr(data, 'seek') and hasattr(data, 'tell')
+
+
+def _savepoint(jar):
+    # Make a savepoint in the transaction of the connection the chunks
+    # are added to, which need not be the one of the current thread.
+    manager = getattr(jar, 'transaction_manager', None) or transaction.manager
+    manager.savepoint(optimistic=True)
+
+
+def _deactivate(chunk):
+    # Turn a chunk into a ghost, unless it can't be loaded again because
+    # it hasn't been committed yet.
+    if (chunk._p_jar is not None and not chunk._p_changed
+            and chunk._p_serial != _z64):
+        chunk._p_deactivate()
+
+
+def _iterSource(data):
+    """Iterate over the data to be stored in a file in pieces.
+
+    Besides the data types a file accepts directly, any readable stream
+    and any iterable of byte strings is accepted.
+    """
+    if isinstance(data, bytes):
+        yield data
+    elif isinstance(data, FileChunk):
+        while data is not None:
+            yield data._data
+            next = data.next
+            _deactivate(data)
+            data = next
+    elif isinstance(data, LOBTree):
+        for chunk in data.values():
+            yield chunk._data
+            _deactivate(chunk)
+    elif _isBlob(data):
+        with _openBlob(data) as f:
+            yield from iter(lambda: f.read(MAXCHUNKSIZE), b'')
+    elif hasattr(data, 'read'):
+        if _isSeekable(data):
+            data.seek(0)
+        yield from iter(lambda: data.read(MAXCHUNKSIZE), b'')
+    else:
+        for piece in data:
+            if isinstance(piece, text_type):
+                piece = piece.encode('UTF-8')
+            yield piece
+
+
+def _iterRest(stream):
+    # Read the rest of a stream from where it is.  Unlike `_iterSource`,
+    # a stream that can seek isn't read from its start again.
+    return iter(lambda: stream.read(MAXCHUNKSIZE), b'')
+
+
+def _iterDigested(data, digest):
+    # Add the pieces of data that can be read only once to `digest` while
+    # they are stored.
+    for piece in _iterSource(data):
+        digest.update(piece)
+        yield piece
+
+
+def _iterChunks(pieces, getChunkSize):
+    """Regroup pieces of data into chunks.
+
+    The size of each chunk is computed by `getChunkSize` from the number
+    of bytes before the chunk.  Only the last chunk may be smaller.
+    """
+    buffer = bytearray()
+    offset = 0
+    chunkSize = getChunkSize(offset)
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= chunkSize:
+            yield bytes(buffer[:chunkSize])
+            del buffer[:chunkSize]
+            offset += chunkSize
+            chunkSize = getChunkSize(offset)
+    if buffer:
+        yield bytes(buffer)
+
+
 class FileChunk(Persistent):
     """Wrapper for possibly large data"""
 
@@ -260,6 +1304,473 @@ class FileChunk(Persistent):
             return self.__bytes__().decode("iso-8859-1", errors='ignore')
 
 
+class CompressedChunk(FileChunk):
+    """Chunk storing its data compressed.
+
+    The data is read and written like that of any chunk:
+
+    >>> chunk = CompressedChunk(b'Foobar' * 100)
+    >>> chunk._data == b'Foobar' * 100
+    True
+    >>> len(chunk._deflate) < 600
+    True
+
+    It is kept as a raw deflate segment ending on a byte boundary, so
+    that the segments of the chunks of a file joined are a valid deflate
+    stream, which can be sent to clients accepting gzip as it is (see
+    `GzipChunkIterator`).
+    """
+
+    def _getData(self):
+        return zlib.decompressobj(-zlib.MAX_WBITS).decompress(self._deflate)
+
+    def _setData(self, data):
+        self._deflate = _deflate(data)
+        self._crc = zlib.crc32(data)
+        self._length = len(data)
+
+    _data = property(_getData, _setData)
+
+
+def _dataLength(chunk):
+    # The size of the data of a chunk, without decompressing it.
+    if isinstance(chunk, CompressedChunk):
+        return chunk._length
+    return len(chunk._data)
+
+
+def _deflate(data):
+    # Compress `data` into a deflate segment that other segments can follow.
+    compressor = zlib.compressobj(COMPRESSLEVEL, zlib.DEFLATED,
+                                  -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+@zope.component.adapter(FileChunk)
+@implementer(ICopyHook)
+def chunkCopyHook(chunk):
+    """Share chunks between a file and its copies instead of copying them.
+
+    Chunks are never changed once they are stored, new data is always
+    stored in new chunks.
+    """
+    return lambda toplevel, register: chunk
+
+
+@zope.component.adapter(LOBTree)
+@implementer(ICopyHook)
+def chunkTreeCopyHook(tree):
+    """Copy a tree of chunks without pickling it.
+
+    The copy is a new tree referring to the same chunks, so neither the
+    chunks are loaded nor a copy hook is looked up for each of them.
+    Other trees are copied as usual.
+    """
+    if not isinstance(next(iter(tree.values()), None), FileChunk):
+        return None
+    return lambda toplevel, register: LOBTree(tree.items())
+
+
+@zope.component.adapter(interfaces.IFile)
+@implementer(ICopyHook)
+class FileCopyHook:
+    """Copy a file, sharing its data with the original.
+
+    The file itself is copied as usual, the chunks of its data are
+    shared by `chunkCopyHook` and `chunkTreeCopyHook`.  A blob can't be
+    copied by pickling it, so the copy refers to the blob of the
+    original.
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def __call__(self, toplevel, register):
+        register(self._shareData)
+        raise ResumeCopy
+
+    def _shareData(self, translate):
+        data = self.context._data
+        copy = translate(self.context)
+        if _isBlob(data):
+            copy._data = data
+        elif isinstance(data, LOBTree):
+            store = zope.component.queryUtility(interfaces.IChunkStore)
+            if store is not None:
+                for chunk in copy._data.values():
+                    store.retain(chunk)
+
+
+class FileChunkIterator:
+    """Iterator over the data of a file, one chunk at a time.
+
+    Only the chunk currently handed out is kept in memory; every chunk is
+    turned back into a ghost once its data has been returned:
+
+    >>> file = File()
+    >>> file.data = FileChunk(b'Foo')
+    >>> file._data.next = FileChunk(b'bar')
+    >>> file._size = 6
+    >>> list(file.iterData()) == [b'Foo', b'bar']
+    True
+
+    Data that is not chunked is returned in one piece:
+
+    >>> list(File(b'Foobar').iterData()) == [b'Foobar']
+    True
+
+    A range of the data can be read as well.  Only the chunks that
+    overlap the range are read:
+
+    >>> list(file.iterData(2, 4)) == [b'o', b'b']
+    True
+    >>> list(file.iterData(4)) == [b'ar']
+    True
+    >>> list(File(b'Foobar').iterData(1, 3)) == [b'oo']
+    True
+
+    The publisher only iterates over the result of a request after the
+    database connection of that request has been closed.  Chains that are
+    already committed are therefore loaded through a connection of the
+    iterator's own, which is closed again when the iterator is exhausted
+    or closed.
+
+    Instead of the first chunk of a chain, a list of chunks can be given,
+    e.g. from an index of the chunks or from a tree of chunks.  The
+    storage is then asked to prefetch the next `PREFETCHCHUNKS` chunks in
+    one go, so that a client-server storage doesn't need a round-trip for
+    every chunk:
+
+    >>> list(FileChunkIterator([FileChunk(b'Foo'), FileChunk(b'bar')],
+    ...                        2)) == [b'o', b'bar']
+    True
+    """
+
+    _connection = None
+
+    # the oids of the chunks loaded through our own connection
+    _oids = None
+
+    def __init__(self, data, offset=0, size=None):
+        chunks = None
+        if isinstance(data, list):
+            chunks = data
+            data = chunks[0] if chunks else None
+        if isinstance(data, FileChunk) and data._p_jar is not None:
+            # A ghost doesn't know whether it has been committed yet.
+            data._p_activate()
+            if (data._p_serial != _z64 and not data._p_changed
+                    and not any(chunk._p_changed for chunk in chunks or ())):
+                self._db = data._p_jar.db()
+                self._oids = [chunk._p_oid for chunk in chunks or [data]]
+                data._p_deactivate()
+                data = None
+        self._next = data
+        self._chunks = chunks
+        self._offset = offset
+        self._size = size
+        # the number of chunks handed out and of those prefetched
+        self._count = 0
+        self._ahead = 1
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = self._nextChunk()
+        if chunk is None or self._size == 0:
+            self.close()
+            raise StopIteration
+        self._count += 1
+
+        if isinstance(chunk, FileChunk):
+            data = self._read(chunk)
+            self._next = chunk.next
+            # Free the memory, we don't need the chunk anymore.
+            _deactivate(chunk)
+        else:
+            data = chunk
+            self._next = None
+
+        if self._offset:
+            data = data[self._offset:]
+            self._offset = 0
+        if self._size is not None:
+            data = data[:self._size]
+            self._size -= len(data)
+        return data
+
+    def _read(self, chunk):
+        return chunk._data
+
+    def _nextChunk(self):
+        count = self._count
+        oids = self._oids
+        if oids is not None and count < len(oids):
+            if self._connection is None:
+                self._connection = self._db.open(
+                    transaction_manager=transaction.TransactionManager())
+            if self._ahead < len(oids):
+                self._prefetch()
+            try:
+                return self._connection.get(oids[count])
+            except KeyError:
+                # The chunk has been added to the list since the last
+                # commit, e.g. by appending to the file.
+                if self._chunks is None:
+                    raise
+                return self._chunks[count]
+        if self._chunks is not None:
+            # Only the chunks in the list are read.
+            if count < len(self._chunks) and oids is None:
+                return self._chunks[count]
+            return None
+        return self._next
+
+    def _prefetch(self):
+        # Keep at least PREFETCHCHUNKS chunks requested ahead of the
+        # current one.
+        oids = self._oids
+        while (self._ahead <= self._count + PREFETCHCHUNKS
+               and self._ahead < len(oids)):
+            batch = oids[self._ahead:self._ahead + PREFETCHCHUNKS]
+            self._connection.prefetch(batch)
+            self._ahead += len(batch)
+
+    def close(self):
+        self._next = self._oids = self._chunks = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class GzipChunkIterator(FileChunkIterator):
+    """Iterator over the data of a file as a gzip stream.
+
+    The deflate segments of compressed chunks are handed out as they are,
+    only the gzip header and trailer are added.  The CRC-32 of the data
+    in the trailer is combined from those of the chunks, so the data
+    doesn't have to be decompressed either:
+
+    >>> import gzip
+    >>> chunks = [CompressedChunk(b'Foo' * 100), CompressedChunk(b'bar')]
+    >>> gzip.decompress(b''.join(GzipChunkIterator(chunks))) == (
+    ...     b'Foo' * 100 + b'bar')
+    True
+
+    Chunks that aren't compressed are compressed on the fly:
+
+    >>> chunks = [CompressedChunk(b'Foo'), FileChunk(b'bar')]
+    >>> gzip.decompress(b''.join(GzipChunkIterator(chunks))) == b'Foobar'
+    True
+    """
+
+    def __init__(self, data):
+        super().__init__(data)
+        self._crc = self._length = 0
+        self._state = 'header'
+
+    def __next__(self):
+        state = self._state
+        if state == 'header':
+            self._state = 'data'
+            return _GZIP_HEADER
+        if state == 'data':
+            try:
+                return super().__next__()
+            except StopIteration:
+                self._state = 'done'
+                return _DEFLATE_END + struct.pack(
+                    '<II', self._crc, self._length & 0xffffffff)
+        raise StopIteration
+
+    def _read(self, chunk):
+        if isinstance(chunk, CompressedChunk):
+            segment, crc, length = chunk._deflate, chunk._crc, chunk._length
+        else:
+            data = chunk._data
+            segment, crc, length = _deflate(data), zlib.crc32(data), len(data)
+        self._crc = _crc32Combine(self._crc, crc, length)
+        self._length += length
+        return segment
+
+
+# Combining CRC-32s as in zlib's crc32_combine, which Python doesn't offer.
+# Polynomials over GF(2) are kept with the lowest power in the highest bit.
+
+_CRC32_POLYNOMIAL = 0xedb88320
+
+
+def _multModP(a, b):
+    # Return a * b modulo the CRC-32 polynomial.
+    m = 1 << 31
+    p = 0
+    while True:
+        if a & m:
+            p ^= b
+            if not a & (m - 1):
+                return p
+        m >>= 1
+        b = (b >> 1) ^ _CRC32_POLYNOMIAL if b & 1 else b >> 1
+
+
+def _powers():
+    p = 1 << 30  # x^1
+    yield p
+    for _ in range(31):
+        p = _multModP(p, p)
+        yield p
+
+
+_X2N = tuple(_powers())  # x^(2^n)
+
+
+@functools.lru_cache(maxsize=64)
+def _shiftOperator(length):
+    # Return x^(8 * length) modulo the CRC-32 polynomial.
+    p = 1 << 31  # x^0
+    k = 3
+    while length:
+        if length & 1:
+            p = _multModP(_X2N[k & 31], p)
+        length >>= 1
+        k += 1
+    return p
+
+
+def _crc32Combine(crc1, crc2, length2):
+    """Return the CRC-32 of two pieces of data from their CRC-32s.
+
+    >>> _crc32Combine(zlib.crc32(b'Foo'), zlib.crc32(b'bar'), 3) == (
+    ...     zlib.crc32(b'Foobar'))
+    True
+    """
+    return _multModP(_shiftOperator(length2), crc1) ^ crc2
+
+
+class FileStreamIterator:
+    """Iterator over the data of an open file, one chunk at a time.
+
+    >>> from io import BytesIO
+    >>> list(FileStreamIterator(BytesIO(b'Foobar'))) == [b'Foobar']
+    True
+    >>> list(FileStreamIterator(BytesIO(b'Foobar'), 1, 4)) == [b'ooba']
+    True
+
+    The file is closed when the iterator is exhausted or closed.
+    """
+
+    def __init__(self, file, offset=0, size=None):
+        file.seek(offset)
+        self._file = file
+        self._size = size
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        size = MAXCHUNKSIZE
+        if self._size is not None:
+            size = min(size, self._size)
+        data = b''
+        if self._file is not None and size:
+            data = self._file.read(size)
+        if not data:
+            self.close()
+            raise StopIteration
+        if self._size is not None:
+            self._size -= len(data)
+        return data
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class FileReader(io.BufferedIOBase):
+    """Read-only file-like object for the data of a `File`.
+
+    >>> file = File()
+    >>> file.data = FileChunk(b'Foo')
+    >>> file._data.next = FileChunk(b'bar')
+    >>> file._size = 6
+    >>> f = file.open()
+    >>> f.read(2) == b'Fo'
+    True
+    >>> f.read() == b'obar'
+    True
+    >>> f.tell()
+    6
+    >>> f.seek(-2, 2)
+    4
+    >>> f.read() == b'ar'
+    True
+    >>> f.close()
+
+    The data is read with `File.iterData`, so only the chunks that are
+    read are loaded and the reader may be used after the connection of
+    the file has been closed, as long as it is not moved with `seek`.
+    """
+
+    def __init__(self, file):
+        super().__init__()
+        self._file = file
+        self._pos = 0
+        self._iterator = file.iterData()
+        self._iterator_pos = 0
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._file.getSize()
+        if pos < 0:
+            raise ValueError('negative seek position %d' % pos)
+        self._pos = pos
+        return pos
+
+    def read1(self, size=-1):
+        if self._pos != self._iterator_pos:
+            self._iterator.close()
+            self._iterator = self._file.iterData(self._pos)
+            self._iterator_pos = self._pos
+            self._buffer = b''
+        if not self._buffer:
+            self._buffer = memoryview(next(self._iterator, b''))
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = self._buffer[:size].tobytes()
+        self._buffer = self._buffer[size:]
+        self._pos = self._iterator_pos = self._pos + len(data)
+        return data
+
+    def read(self, size=-1):
+        result = []
+        while size is None or size < 0 or size > 0:
+            data = self.read1(size)
+            if not data:
+                break
+            result.append(data)
+            if size is not None and size > 0:
+                size -= len(data)
+        return b''.join(result)
+
+    def close(self):
+        self._iterator.close()
+        super().close()
+
+
 class FileReadFile:
     '''Adapter for file-system style read access.
 
@@ -280,7 +1791,7 @@ class FileReadFile:
         return self.context.data
 
     def size(self):
-        return len(self.context.data)
+        return self.context.getSize()
 
 
 class FileWriteFile:
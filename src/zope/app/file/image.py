@@ -16,33 +16,91 @@
 """
 __docformat__ = 'restructuredtext'
 
+import re
 import struct
-from io import BytesIO
 
+from zope.component import getSiteManager
 from zope.contenttype import guess_content_type
 from zope.interface import implementer
 from zope.size import byteDisplay
 from zope.size.interfaces import ISized
 
 from zope.app.file.file import File
+from zope.app.file.file import FileChunk
+from zope.app.file.file import _deactivate
+from zope.app.file.file import _isSeekable
 from zope.app.file.i18n import ZopeMessageFactory as _
 from zope.app.file.interfaces import IImage
+from zope.app.file.interfaces import IImageFormat
+from zope.app.file.interfaces import IImageHeader
 
 
 @implementer(IImage)
 class Image(File):
 
-    def __init__(self, data=b''):
+    # What `getImageInfo` returned for the data passed to the constructor,
+    # if the caller found it already.
+    _v_imageInfo = None
+
+    # How many bytes of the data were read to find the type and size of
+    # the image; changes after them keep both.  `None` if not known.
+    _headerSize = None
+
+    # Whether the header was read since `write` began
+    _v_headerRead = False
+
+    def __init__(self, data=b'', storage=None, chunkSize=None, info=None):
         '''See interface `IFile`'''
-        contentType, self._width, self._height = getImageInfo(data)
-        super().__init__(data, contentType)
+        self._v_imageInfo = info
+        super().__init__(data, '', storage, chunkSize)
 
     def _setData(self, data):
+        # The header of the image is read once, before the data is stored
+        # if it can be read again, so that the content type decides how it
+        # is stored, or from the stored data otherwise.
+        info, headerSize = self._v_imageInfo, None
+        self._v_imageInfo = None
+        if info is None:
+            info, headerSize = _peekImageInfo(data)
+        if info is not None and info[0]:
+            self.contentType = info[0]
         super()._setData(data)
+        self._updateImageInfo(info, headerSize)
+
+    def append(self, data):
+        '''See interface `IEditableFile`'''
+        super().append(data)
+
+        if self._width < 0 or self._height < 0:
+            # The header of the image may be complete now.
+            self._updateImageInfo()
 
-        contentType, self._width, self._height = getImageInfo(self._data)
+    def write(self, offset, data):
+        '''See interface `IEditableFile`'''
+        headerSize = self._headerSize
+        self._v_headerRead = False
+        super().write(offset, data)
+        # Small data is stored again and data beyond the end is appended,
+        # which may have read the header already.
+        if not self._v_headerRead and (
+                headerSize is None or offset < headerSize):
+            self._updateImageInfo()
+
+    def _updateImageInfo(self, info=None, headerSize=None):
+        if info is None:
+            data = self._data
+            if isinstance(data, (bytes, FileChunk)):
+                # A chain of chunks is read from its start without building
+                # the index of all chunks.
+                info, headerSize = _readImageInfo(data)
+            else:
+                with self.open() as f:
+                    info, headerSize = _readImageInfo(f)
+        contentType, self._width, self._height = info
         if contentType:
             self.contentType = contentType
+        self._headerSize = headerSize
+        self._v_headerRead = True
 
     def getImageSize(self):
         '''See interface `IImage`'''
@@ -81,86 +139,776 @@ class ImageSized:
 
 class FileFactory:
 
+    # How the created files store their data, see `IFileStoragePolicy`;
+    # `None` leaves the choice to the policy of the site.
+    storage = None
+
+    # The size of the chunks of the created files; `None` leaves the
+    # choice to the policy of the site.
+    chunkSize = None
+
     def __init__(self, context):
         self.context = context
 
     def __call__(self, name, content_type, data):
+        info = None
         if not content_type and data:
-            content_type, _width, _height = getImageInfo(data)
+            info, _size = _peekImageInfo(data)
+            if info is not None:
+                content_type = info[0]
         if not content_type:
             content_type, _encoding = guess_content_type(name, data, '')
 
         if content_type.startswith('image/'):
-            return Image(data)
+            return Image(data, self.storage, self.chunkSize, info)
 
-        return File(data, content_type)
+        return File(data, content_type, self.storage, self.chunkSize)
 
 
 def getImageInfo(data):
-    data = bytes(data)
-    size = len(data)
-    height = -1
-    width = -1
-    content_type = ''
-
-    # handle GIFs
-    if (size >= 10) and data[:6] in (b'GIF87a', b'GIF89a'):
-        # Check to see if content_type is correct
-        content_type = 'image/gif'
-        w, h = struct.unpack(b"<HH", data[6:10])
-        width = int(w)
-        height = int(h)
-
-    # See PNG 2. Edition spec (http://www.w3.org/TR/PNG/)
-    # Bytes 0-7 are below, 4-byte chunk length, then 'IHDR'
-    # and finally the 4-byte width, height
-    elif ((size >= 24) and data.startswith(b'\211PNG\r\n\032\n')
-          and (data[12:16] == b'IHDR')):
-        content_type = 'image/png'
-        w, h = struct.unpack(b">LL", data[16:24])
-        width = int(w)
-        height = int(h)
-
-    # Maybe this is for an older PNG version.
-    elif ((size >= 16)
-          and data.startswith(b'\211PNG\r\n\032\n')):  # pragma: no cover
-        # Check to see if we have the right content type
-        content_type = 'image/png'
-        w, h = struct.unpack(">LL", data[8:16])
-        width = int(w)
-        height = int(h)
-
-    # handle JPEGs
-    elif (size >= 2) and data.startswith(b'\xff\xd8'):
-        content_type = 'image/jpeg'
-        jpeg = BytesIO(data)
-        jpeg.read(2)
-        b = jpeg.read(1)
+    """Return the content type, width and height of an image.
+
+    `data` is a byte string, a chain of `FileChunk` objects or a readable
+    stream that can seek.  Only the header of the image is read, chunk by
+    chunk or block by block, so large images are not loaded completely.
+    Streams are read from their current position, which is restored.
+    The width and height are -1 if they can't be found, and the content
+    type is empty for unknown data.
+    """
+    if isinstance(data, bytes):
+        return _getBufferImageInfo(data)
+    return _readImageInfo(data)[0]
+
+
+def _readImageInfo(data):
+    # Return the image info of `data` and the number of bytes read to find
+    # it.  Changes after them don't change the info.
+    if isinstance(data, (bytes, bytearray)):
+        return _getBufferImageInfo(data), len(data)
+    if isinstance(data, FileChunk) and data.next is None:
         try:
-            w = -1
-            h = -1
-            while b and ord(b) != 0xDA:
-                while ord(b) != 0xFF:
-                    b = jpeg.read(1)
-                while ord(b) == 0xFF:
-                    b = jpeg.read(1)
-                if 0xC0 <= ord(b) <= 0xC3:
-                    jpeg.read(3)
-                    h, w = struct.unpack(b">HH", jpeg.read(4))
-                    break
-                else:
-                    jpeg.read(int(struct.unpack(b">H", jpeg.read(2))[0]) - 2)
-                b = jpeg.read(1)
-            width = int(w)
-            height = int(h)
-        except (struct.error, ValueError):  # pragma: no cover
-            pass
+            buffer = data._data
+            return _getBufferImageInfo(buffer), len(buffer)
+        finally:
+            _deactivate(data)
+    header = _ImageHeader(_iterHeader(data))
+    try:
+        return _getImageInfo(header), header.size
+    finally:
+        header.close()
+
+
+def _peekImageInfo(data):
+    # Return the image info of `data` and the size of its header if it can
+    # be read again when it is stored, `None` for both otherwise.
+    if isinstance(data, (bytes, bytearray, memoryview, FileChunk)) or (
+            hasattr(data, 'read') and _isSeekable(data)):
+        return _readImageInfo(data)
+    return None, None
+
+
+def _getBufferImageInfo(data):
+    # All the data is at hand, so no pieces need to be read.  JPEGs, the
+    # most common images, are scanned without setting up a header.
+    table, _size = _getFormatTable()
+    for signature, format in table.get(data[:2], ()):
+        if data.startswith(signature):
+            if format is _JPEG:
+                return ('image/jpeg',) + _scanJPEG(data, 2, True)
+            info = format.getImageInfo(_BufferHeader(data))
+            if info is not None:
+                return info
+    return '', -1, -1
+
+
+def _getImageInfo(header):
+    table, size = _getFormatTable()
+    data = header.peek(size)
+    for signature, format in table.get(data[:2], ()):
+        if data.startswith(signature):
+            info = format.getImageInfo(header)
+            if info is not None:
+                return info
+    return '', -1, -1
+
+
+# The table of the image formats built last, with the registered formats
+# it was built from, see `_getFormatTable`
+_formatTable = None
+
+
+def _getFormatTable():
+    """Return a table of the image formats by the first two bytes of their
+    signatures, and the length of the longest signature.
+
+    The formats registered as utilities come before the built-in ones.
+    They are looked up every time, which the registry answers from its
+    own cache until its utilities change, also when a persistent local
+    registry is changed by another transaction or its changes are
+    aborted.  The table is only built again for other formats, so finding
+    the format of an image takes the same time however many formats
+    there are.
+    """
+    global _formatTable
+    formats = getSiteManager().utilities.lookupAll((), IImageFormat)
+    cached = _formatTable
+    if cached is None or (cached[0] is not formats
+                          and cached[0] != formats):
+        table = {}
+        size = 2
+        for format in tuple(format for _name, format in formats) + _FORMATS:
+            for signature in format.signatures:
+                table.setdefault(signature[:2], []).append(
+                    (signature, format))
+                size = max(size, len(signature))
+        cached = _formatTable = formats, (table, size)
+    return cached[1]
+
+
+@implementer(IImageFormat)
+class GIFFormat:
+
+    signatures = (b'GIF87a', b'GIF89a')
+
+    def getImageInfo(self, header):
+        data = header.peek(10)
+        if len(data) < 10:
+            return None
+        width, height = struct.unpack(b"<HH", data[6:10])
+        return 'image/gif', width, height
+
+
+@implementer(IImageFormat)
+class PNGFormat:
+
+    signatures = (b'\211PNG\r\n\032\n',)
+
+    def getImageInfo(self, header):
+        data = header.peek(24)
+        # See PNG 2. Edition spec (http://www.w3.org/TR/PNG/)
+        # Bytes 0-7 are above, 4-byte chunk length, then 'IHDR'
+        # and finally the 4-byte width, height
+        if len(data) >= 24 and data[12:16] == b'IHDR':
+            width, height = struct.unpack(b">LL", data[16:24])
+        # Maybe this is for an older PNG version.
+        elif len(data) >= 16:  # pragma: no cover
+            width, height = struct.unpack(b">LL", data[8:16])
+        else:
+            return None
+        return 'image/png', width, height
+
 
-    # handle BMPs
-    elif (size >= 30) and data.startswith(b'BM'):
+@implementer(IImageFormat)
+class JPEGFormat:
+
+    signatures = (b'\xff\xd8',)
+
+    def getImageInfo(self, header):
+        header.skip(2)
+        width, height = _getJPEGSize(header)
+        return 'image/jpeg', width, height
+
+
+@implementer(IImageFormat)
+class BMPFormat:
+
+    signatures = (b'BM',)
+
+    def getImageInfo(self, header):
+        data = header.peek(30)
+        if len(data) < 30:
+            return None
         kind = struct.unpack(b"<H", data[14:16])[0]
-        if kind == 40:  # Windows 3.x bitmap
-            content_type = 'image/x-ms-bmp'
-            width, height = struct.unpack(b"<LL", data[18:26])
+        if kind != 40:  # Windows 3.x bitmap
+            return None
+        width, height = struct.unpack(b"<LL", data[18:26])
+        return 'image/x-ms-bmp', width, height
+
+
+@implementer(IImageFormat)
+class WebPFormat:
+
+    signatures = (b'RIFF',)
+
+    def getImageInfo(self, header):
+        data = header.peek(30)
+        if data[8:12] != b'WEBP':
+            return None
+        # The first chunk tells whether the image is lossy, lossless or
+        # has extended features.
+        chunk = data[12:16]
+        width = height = -1
+        if len(data) < 30:
+            pass
+        elif chunk == b'VP8 ' and data[23:26] == b'\x9d\x01\x2a':
+            width, height = struct.unpack(b"<HH", data[26:30])
+            width &= 0x3FFF
+            height &= 0x3FFF
+        elif chunk == b'VP8L' and data[20] == 0x2F:
+            bits = struct.unpack(b"<L", data[21:25])[0]
+            width = (bits & 0x3FFF) + 1
+            height = (bits >> 14 & 0x3FFF) + 1
+        elif chunk == b'VP8X':
+            width = int.from_bytes(data[24:27], 'little') + 1
+            height = int.from_bytes(data[27:30], 'little') + 1
+        return 'image/webp', width, height
+
+
+# The largest metadata of an AVIF image that is read to find its size
+_MAXMETASIZE = 1 << 20
+
+
+@implementer(IImageFormat)
+class AVIFFormat:
+
+    # The size of the file type box
+    signatures = (b'\x00\x00',)
+
+    brands = frozenset((b'avif', b'avis'))
+
+    def getImageInfo(self, header):
+        data = header.peek(12)
+        if data[4:8] != b'ftyp':
+            return None
+        size = struct.unpack(b">L", data[:4])[0]
+        if not 16 <= size <= _BLOCKSIZE:
+            return None
+        ftyp = header.peek(size)
+        if len(ftyp) < size or size % 4:
+            return None
+        brands = {ftyp[pos:pos + 4] for pos in range(16, len(ftyp), 4)}
+        brands.add(ftyp[8:12])
+        if not brands & self.brands:
+            return None
+        header.skip(size)
+
+        # The size is a property of the primary item in the meta box.
+        width = height = -1
+        while True:
+            kind, size = _readBoxHeader(header)
+            if kind is None:
+                break
+            if kind == b'meta':
+                if size <= _MAXMETASIZE:
+                    width, height = _getAVIFSize(header.read(size))
+                break
+            header.skip(size)
+        return 'image/avif', width, height
+
+
+def _readBoxHeader(header):
+    # Return the kind and the size of the data of the next box in an ISO
+    # base media file, or `None` and 0 at its end.
+    data = header.read(8)
+    if len(data) < 8:
+        return None, 0
+    size, kind = struct.unpack(b">L4s", data)
+    headerSize = 8
+    if size == 1:
+        data = header.read(8)
+        if len(data) < 8:
+            return None, 0
+        size = struct.unpack(b">Q", data)[0]
+        headerSize = 16
+    if size < headerSize:
+        # 0 means that the box extends to the end of the file.
+        return None, 0
+    return kind, size - headerSize
+
+
+def _iterBoxes(data, start=0, end=None):
+    # Iterate over the kinds and data ranges of the boxes in `data`.
+    if end is None:
+        end = len(data)
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(b">L4s", data, pos)
+        if size < 8 or pos + size > end:
+            return
+        yield kind, pos + 8, pos + size
+        pos += size
+
+
+def _getAVIFSize(meta):
+    # `meta` is a full box, it starts with its version and flags.
+    boxes = {}
+    for kind, start, end in _iterBoxes(meta, 4):
+        boxes.setdefault(kind, (start, end))
+    if b'iprp' not in boxes:
+        return -1, -1
+    properties = {}
+    for kind, start, end in _iterBoxes(meta, *boxes[b'iprp']):
+        properties.setdefault(kind, (start, end))
+    if b'ipco' not in properties:
+        return -1, -1
+
+    # The image spatial extents by their (1-based) index in the container
+    sizes = {}
+    for index, (kind, start, end) in enumerate(
+            _iterBoxes(meta, *properties[b'ipco']), 1):
+        if kind == b'ispe' and end - start >= 12:
+            sizes[index] = struct.unpack_from(b">LL", meta, start + 4)
+    if not sizes:
+        return -1, -1
+
+    try:
+        primary = _getPrimaryItem(meta, *boxes[b'pitm'])
+        for item, index in _iterAssociations(meta, *properties[b'ipma']):
+            if item == primary and index in sizes:
+                return sizes[index]
+    except (KeyError, struct.error, IndexError):
+        pass
+    # Use the first size if the associations can't be read.
+    return sizes[min(sizes)]
+
+
+def _getPrimaryItem(meta, start, end):
+    if meta[start] == 0:
+        return struct.unpack_from(b">H", meta, start + 4)[0]
+    return struct.unpack_from(b">L", meta, start + 4)[0]
+
+
+def _iterAssociations(meta, start, end):
+    # Iterate over pairs of item ids and the indexes of their properties.
+    version = meta[start]
+    flags = int.from_bytes(meta[start + 1:start + 4], 'big')
+    count = struct.unpack_from(b">L", meta, start + 4)[0]
+    pos = start + 8
+    for _i in range(count):
+        if version < 1:
+            item = struct.unpack_from(b">H", meta, pos)[0]
+            pos += 2
+        else:
+            item = struct.unpack_from(b">L", meta, pos)[0]
+            pos += 4
+        associations = meta[pos]
+        pos += 1
+        for _j in range(associations):
+            if flags & 1:
+                index = struct.unpack_from(b">H", meta, pos)[0] & 0x7FFF
+                pos += 2
+            else:
+                index = meta[pos] & 0x7F
+                pos += 1
+            yield item, index
+
+
+@implementer(IImageFormat)
+class TIFFFormat:
+
+    signatures = (b'II*\x00', b'MM\x00*')
+
+    def getImageInfo(self, header):
+        data = header.read(8)
+        order = '<' if data.startswith(b'II') else '>'
+        width = height = -1
+        if len(data) < 8:
+            return 'image/tiff', width, height
+        # The width and height are tags of the first image file directory.
+        offset = struct.unpack(order + 'L', data[4:])[0]
+        if offset < 8:
+            return 'image/tiff', width, height
+        header.skip(offset - 8)
+        data = header.read(2)
+        if len(data) < 2:
+            return 'image/tiff', width, height
+        count = struct.unpack(order + 'H', data)[0]
+        entries = header.read(12 * count)
+        for pos in range(0, len(entries) - 11, 12):
+            tag, kind = struct.unpack_from(order + 'HH', entries, pos)
+            if tag not in (256, 257) or kind not in (3, 4):
+                continue
+            # SHORT or LONG values are stored in the entry itself.
+            value = struct.unpack_from(
+                order + ('H' if kind == 3 else 'L'), entries, pos + 8)[0]
+            if tag == 256:
+                width = value
+            else:
+                height = value
+        return 'image/tiff', width, height
+
+
+@implementer(IImageFormat)
+class ICOFormat:
+
+    signatures = (b'\x00\x00\x01\x00',)
+
+    def getImageInfo(self, header):
+        data = header.peek(6)
+        if len(data) < 6:
+            return None
+        count = struct.unpack(b"<H", data[4:6])[0]
+        if not count:
+            return None
+        # An icon holds images of several sizes, the largest is reported.
+        data = header.peek(6 + 16 * count)
+        if len(data) < 22:
+            return None
+        width = height = -1
+        for pos in range(6, len(data) - 15, 16):
+            # The entries of other data have no reserved byte of 0 and no
+            # planes of 0 or 1.
+            if data[pos + 3] or data[pos + 4:pos + 6] not in (
+                    b'\x00\x00', b'\x01\x00'):
+                return None
+            # 0 stands for 256 pixels.
+            w = data[pos] or 256
+            h = data[pos + 1] or 256
+            if w * h > width * height:
+                width, height = w, h
+        return 'image/vnd.microsoft.icon', width, height
+
+
+# The root element of an SVG image, after the prolog of the document
+_SVG_ROOT = re.compile(r'<(?:[\w.-]+:)?svg(\s[^>]*)?>')
+
+# The attributes of the root element, with their values in either quotes
+_SVG_ATTRIBUTE = r'(?:^|\s)%s\s*=\s*(?:"([^"]*)"|\'([^\']*)\')'
+_SVG_WIDTH = re.compile(_SVG_ATTRIBUTE % 'width')
+_SVG_HEIGHT = re.compile(_SVG_ATTRIBUTE % 'height')
+_SVG_VIEWBOX = re.compile(_SVG_ATTRIBUTE % 'viewBox')
+
+# Lengths in pixels, relative units can't be converted
+_SVG_LENGTH = re.compile(
+    r'((?:\d+(?:\.\d+)?|\.\d+)(?:[eE][-+]?\d+)?)(?:px)?$')
+
+_SVG_SPACE = re.compile(r'\s*')
+
+
+def _skipSVGProlog(text):
+    """Return the position of the root element of an SVG document.
+
+    The XML declaration, processing instructions, comments and the
+    doctype before it are skipped by looking for their ends, so that the
+    time this takes grows only with the length of the text.  `None` is
+    returned if the prolog doesn't end in `text`.
+    """
+    pos = 1 if text.startswith('\ufeff') else 0
+    while True:
+        pos = _SVG_SPACE.match(text, pos).end()
+        if text.startswith('<?', pos):
+            end = text.find('?>', pos + 2)
+            size = 2
+        elif text.startswith('<!--', pos):
+            end = text.find('-->', pos + 4)
+            size = 3
+        elif text.startswith('<!DOCTYPE', pos):
+            end = _findDoctypeEnd(text, pos + 9)
+            size = 1
+        else:
+            return pos
+        if end < 0:
+            return None
+        pos = end + size
+
+
+def _findDoctypeEnd(text, pos):
+    # Return the position of the ">" ending a doctype, which may have an
+    # internal subset in brackets, or -1.
+    end = text.find('>', pos)
+    subset = text.find('[', pos, end if end >= 0 else len(text))
+    if subset < 0:
+        return end
+    pos = subset + 1
+    while True:
+        pos = text.find(']', pos)
+        if pos < 0:
+            return -1
+        pos = _SVG_SPACE.match(text, pos + 1).end()
+        if text.startswith('>', pos):
+            return pos
+
+
+@implementer(IImageFormat)
+class SVGFormat:
+
+    # XML declarations, comments or doctypes, the root element and the
+    # byte order mark
+    signatures = (b'<?', b'<!', b'<s', b'\xef\xbb\xbf')
+
+    def getImageInfo(self, header):
+        text = header.peek(_BLOCKSIZE).decode('utf-8', 'replace')
+        pos = _skipSVGProlog(text)
+        match = None if pos is None else _SVG_ROOT.match(text, pos)
+        if match is None:
+            return None
+        attributes = match.group(1) or ''
+        width = _getSVGLength(_SVG_WIDTH, attributes)
+        height = _getSVGLength(_SVG_HEIGHT, attributes)
+        if width is None or height is None:
+            # Fall back to the view box, keeping its aspect ratio.
+            box = _SVG_VIEWBOX.search(attributes)
+            try:
+                _x, _y, w, h = map(
+                    float, _getSVGValue(box).replace(',', ' ').split())
+            except (AttributeError, ValueError):
+                w = h = 0
+            if w > 0 and h > 0:
+                if width is not None:
+                    height = width * h / w
+                elif height is not None:
+                    width = height * w / h
+                else:
+                    width, height = w, h
+        width = -1 if width is None else int(round(width))
+        height = -1 if height is None else int(round(height))
+        return 'image/svg+xml', width, height
+
+
+def _getSVGLength(attribute, attributes):
+    match = attribute.search(attributes)
+    if match is not None:
+        length = _SVG_LENGTH.match(_getSVGValue(match))
+        if length is not None:
+            return float(length.group(1))
+    return None
+
+
+def _getSVGValue(match):
+    # The value of an attribute in the quotes it used
+    value = match.group(1)
+    if value is None:
+        value = match.group(2)
+    return value.strip()
+
+
+# The built-in formats, AVIF comes before ICO as both can start with
+# b'\x00\x00\x01\x00'.
+_JPEG = JPEGFormat()
+_FORMATS = (
+    GIFFormat(),
+    PNGFormat(),
+    _JPEG,
+    BMPFormat(),
+    WebPFormat(),
+    AVIFFormat(),
+    TIFFFormat(),
+    ICOFormat(),
+    SVGFormat(),
+)
+
+
+# The start of frame markers of JPEGs: baseline, extended, progressive and
+# lossless frames with Huffman or arithmetic coding.  0xC4 (DHT), 0xC8
+# (JPG) and 0xCC (DAC) are no frames.
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Markers without a segment: TEM, RST0-7 and SOI
+_JPEG_STANDALONE = frozenset([0x01] + list(range(0xD0, 0xD9)))
+
+# Markers of the segments to skip, EOI and SOS end the header.
+_JPEG_SEGMENTS = (frozenset(range(0x02, 0xFF)) - _JPEG_SOF - _JPEG_STANDALONE
+                  - {0xD9, 0xDA})
+
+
+# What follows the markers, by marker: a segment with its length, a frame
+# header, nothing or the marker again as a fill byte.  Other markers end
+# the header.
+_JPEG_SEGMENT, _JPEG_FRAME, _JPEG_MARKER, _JPEG_FILL = 1, 2, 3, 4
+_JPEG_KINDS = bytes(
+    _JPEG_SEGMENT if marker in _JPEG_SEGMENTS
+    else _JPEG_FRAME if marker in _JPEG_SOF
+    else _JPEG_MARKER if marker in _JPEG_STANDALONE or marker == 0x00
+    else _JPEG_FILL if marker == 0xFF
+    else 0
+    for marker in range(256))
+
+_unpackLength = struct.Struct('>H').unpack_from
+_unpackSize = struct.Struct('>HH').unpack_from
+
+
+def _getJPEGSize(header):
+    """Return the width and height of a JPEG from its frame header.
+
+    `header` is positioned after the start of image marker.  The other
+    segments are skipped as a whole using their length, without looking
+    at their data, so large EXIF or ICC segments cost nothing.  -1 is
+    returned for both if there is no frame header before the scan.
+    """
+    # The markers are scanned in the buffered data of the header, which
+    # is only asked for more at the end of what it has.
+    buffer, start = header.view(9)
+    while True:
+        # Less than asked for means that the data ends in the buffer.
+        found = _scanJPEG(buffer, start, len(buffer) - start < 9)
+        if isinstance(found, tuple):
+            return found
+        header.skip(found - start)
+        buffer, start = header.view(9)
+
+
+def _scanJPEG(buffer, pos, final):
+    # Scan the markers of a JPEG in `buffer` from `pos` on.  Returns the
+    # width and height, or the position to go on from once more data is
+    # buffered if the data doesn't end with `buffer` (`final`).
+    end = len(buffer)
+    while True:
+        if end - pos < 9:
+            if not final:
+                return pos
+            if end - pos < 2:
+                return -1, -1
+        if buffer[pos] != 0xFF:
+            # Skip garbage up to the next marker.
+            pos = buffer.find(b'\xff', pos)
+            if pos < 0:
+                return (-1, -1) if final else end
+            continue
+        kind = _JPEG_KINDS[buffer[pos + 1]]
+        if kind == _JPEG_SEGMENT:
+            if end - pos < 4:
+                return -1, -1
+            pos += 2 + _unpackLength(buffer, pos + 2)[0]
+            if pos > end:
+                # The segment ends in data that isn't buffered yet.
+                return (-1, -1) if final else pos
+        elif kind == _JPEG_FRAME:
+            # Length, precision, height and width
+            if end - pos < 9:
+                return -1, -1
+            height, width = _unpackSize(buffer, pos + 5)
+            return width, height
+        elif kind == _JPEG_FILL:
+            pos += 1
+        elif kind == _JPEG_MARKER:
+            pos += 2
+        else:
+            # End of image or start of scan
+            return -1, -1
+
+
+# the size of the blocks the header of an image is read in
+_BLOCKSIZE = 1 << 13
+
+
+def _iterHeader(data):
+    # Iterate over the data of an image in pieces, as far as it is read.
+    if isinstance(data, (bytes, bytearray)):
+        yield data
+    elif isinstance(data, memoryview):
+        yield data.tobytes()
+    elif isinstance(data, FileChunk):
+        while data is not None:
+            yield data._data
+            next = data.next
+            _deactivate(data)
+            data = next
+    elif hasattr(data, 'read') and _isSeekable(data):
+        pos = data.tell()
+        try:
+            yield from iter(lambda: data.read(_BLOCKSIZE), b'')
+        finally:
+            data.seek(pos)
+
+
+@implementer(IImageHeader)
+class _ImageHeader:
+    """The header of an image, read as far as it is needed.
+
+    The pieces are only joined when data is peeked at across their
+    boundaries, skipping over data never copies it.
+    """
+
+    def __init__(self, pieces):
+        self._pieces = pieces
+        self._buffer = b''
+        self._pos = 0
+        # The number of bytes taken from the pieces
+        self.size = 0
+
+    def _next(self):
+        piece = next(self._pieces, None)
+        if piece is not None:
+            self.size += len(piece)
+        return piece
+
+    def _fill(self, size):
+        available = len(self._buffer) - self._pos
+        if available >= size:
+            return
+        parts = [self._buffer[self._pos:]] if available else []
+        while available < size:
+            piece = self._next()
+            if piece is None:
+                break
+            parts.append(piece)
+            available += len(piece)
+        self._buffer = parts[0] if len(parts) == 1 else b''.join(parts)
+        self._pos = 0
+
+    def peek(self, size):
+        """Return the next `size` bytes without consuming them."""
+        self._fill(size)
+        return self._buffer[self._pos:self._pos + size]
+
+    def view(self, size):
+        """Return the buffered data and the offset of the next byte in it.
+
+        At least `size` bytes follow the offset, unless the data ends.
+        """
+        self._fill(size)
+        return self._buffer, self._pos
+
+    def read(self, size):
+        """Return the next `size` bytes, fewer at the end of the data."""
+        data = self.peek(size)
+        self._pos += len(data)
+        return data
+
+    def skip(self, size):
+        """Skip `size` bytes without keeping them in memory."""
+        self._pos += size
+        while self._pos > len(self._buffer):
+            self._pos -= len(self._buffer)
+            piece = self._next()
+            if piece is None:
+                self._buffer = b''
+                self._pos = 0
+                return
+            self._buffer = piece
+
+    def skipTo(self, byte):
+        """Skip the data before the next `byte`.
+
+        Returns whether it was found.
+        """
+        while True:
+            pos = self._buffer.find(byte, self._pos)
+            if pos >= 0:
+                self._pos = pos
+                return True
+            piece = self._next()
+            if piece is None:
+                self._buffer = b''
+                self._pos = 0
+                return False
+            self._buffer = piece
+            self._pos = 0
+
+    def close(self):
+        self._pieces.close()
+
+
+class _BufferHeader(_ImageHeader):
+    """The header of an image whose data is a single byte string.
+
+    All the data is buffered from the start, so finding the size of
+    small images doesn't need to set up the iteration over pieces.
+    """
+
+    def __init__(self, data):
+        self._buffer = data
+        self._pos = 0
+        self.size = len(data)
+
+    def _next(self):
+        return None
+
+    def peek(self, size):
+        return self._buffer[self._pos:self._pos + size]
+
+    def view(self, size):
+        return self._buffer, self._pos
 
-    return content_type, width, height
+    def close(self):
+        pass
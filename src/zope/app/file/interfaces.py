@@ -17,8 +17,13 @@
 __docformat__ = 'restructuredtext'
 
 from zope.interface import Interface
+from zope.schema import Bool
 from zope.schema import Bytes
+from zope.schema import Choice
+from zope.schema import Int
 from zope.schema import NativeStringLine
+from zope.schema import TextLine
+from zope.schema import Tuple
 
 from zope.app.file.i18n import ZopeMessageFactory as _
 
@@ -45,6 +50,295 @@ class IFile(Interface):
         """Return the byte-size of the data of the object."""
 
 
+class IStreamableFile(IFile):
+    """A file whose data can be read without loading all of it at once.
+    """
+
+    def iterData(start=0, stop=None):
+        """Return an iterator over the data of the object.
+
+        The data is returned in pieces of at most the size of a chunk
+        and only the piece handed out last is kept in memory.  The
+        iterator has a `close()` method that releases the resources it
+        holds if it is not exhausted.
+
+        If `start` or `stop` are given, only the data in that range of
+        bytes is returned (like the slice ``data[start:stop]``) and only
+        the chunks overlapping that range are loaded.  The offsets of the
+        chunks of a chain are only known after loading all of them, which
+        happens the first time a range is read after the object is loaded
+        into the object cache.
+        """
+
+    def open():
+        """Return a read-only file-like object for the data of the object.
+
+        For data stored in a committed blob, this is a real file that
+        can be sent to the client without copying it into Python.  The
+        file must be closed after use.
+        """
+
+    def iterGzipData():
+        """Return an iterator over the data of the object as a gzip stream.
+
+        This is only possible if the data is stored compressed (see
+        `IFileStoragePolicy.compressedTypes`), so that it doesn't need to
+        be compressed again; `None` is returned otherwise.
+        """
+
+    def hasGzipData():
+        """Tell whether `iterGzipData` returns an iterator.
+
+        No data is read for this.
+        """
+
+    def getDigest():
+        """Return the SHA-256 digest of the data as a hex string.
+
+        The digest is computed while the data is stored, so it is known
+        without reading the data.  `None` is returned for data stored
+        before digests were computed, and for data larger than a chunk
+        that was changed in place with `IEditableFile`, which would have
+        to be read completely to compute the digest again.
+        """
+
+    def getEncodings():
+        """Return the encoded variants of the data of the object.
+
+        This is a mapping of content-codings (like ``gzip`` or ``br``) to
+        files with the data encoded with them, each smaller than the data
+        itself.  The variants are made when the data is stored and
+        modified (see `IFileStoragePolicy.encodedTypes`), so that they
+        don't need to be encoded for a request.
+        """
+
+    def getFilename():
+        """Return the name of a file in the file system holding the data.
+
+        This is only possible for data stored in a committed blob, `None`
+        is returned otherwise.  The file must not be modified.
+        """
+
+
+class IEditableFile(Interface):
+    """A file whose data can be changed without replacing all of it.
+
+    These methods change the data in place, so they are protected like
+    setting the data, not like reading it.
+    """
+
+    def append(data):
+        """Add `data` to the end of the data of the object.
+
+        `data` may be anything that can be assigned to ``data``.  Only the
+        last chunk of the data is stored again, the other chunks are
+        neither loaded nor copied.  The data of a chain of chunks is
+        stored again in a tree of chunks the first time, which loads and
+        copies each chunk once.  Data in a blob
+        is copied to a new blob, since the blob may be shared with copies
+        of the file.
+        """
+
+    def write(offset, data):
+        """Replace the data of the object from `offset` on by `data`.
+
+        `data` is a byte string or a readable stream, which is read from
+        its current position to its end, a chunk at a time.  Data beyond
+        the current end is added like by `append`, and `offset` must not
+        be beyond the end.  Only the chunks overlapping the range written
+        are loaded and stored again, in new chunks, like for `append`.
+        """
+
+
+class IFileStoragePolicy(Interface):
+    """Policy deciding how the data of files is stored.
+
+    The policy is looked up as a utility, so that a site can configure
+    its own policy by registering a local utility.
+    """
+
+    storage = Choice(
+        title=_('Storage'),
+        description=_('Where the data of files is stored: in a chain of'
+                      ' chunks in the object database, in a tree of chunks'
+                      ' keyed by their offsets or in a ZODB blob.'),
+        values=('chunks', 'tree', 'blob'),
+        default='chunks',
+    )
+
+    chunkSize = Int(
+        title=_('Chunk Size'),
+        description=_('The size in bytes of the chunks the data of files'
+                      ' is split into. The default is 64 KiB.'),
+        required=False,
+        min=1,
+    )
+
+    maxChunkSize = Int(
+        title=_('Maximum Chunk Size'),
+        description=_('If set, larger files use larger chunks, up to this'
+                      ' size in bytes, to keep the number of chunks low.'),
+        required=False,
+        min=1,
+    )
+
+    chunkCount = Int(
+        title=_('Chunk Count'),
+        description=_('The number of chunks a file may have before the'
+                      ' chunk size is increased.'),
+        default=256,
+        min=1,
+    )
+
+    inline = Bool(
+        title=_('Inline Data'),
+        description=_('Whether data smaller than a chunk may be kept in'
+                      ' the record of the file itself. Otherwise the data'
+                      ' is always stored in an object of its own, so that'
+                      ' reading the metadata of files does not load their'
+                      ' data.'),
+        default=True,
+    )
+
+    savepointChunks = Int(
+        title=_('Savepoint Chunks'),
+        description=_('While the data of large files is stored, make a'
+                      ' savepoint every time this many chunks have been'
+                      ' added.'),
+        required=False,
+        min=0,
+    )
+
+    savepointSize = Int(
+        title=_('Savepoint Size'),
+        description=_('While the data of large files is stored, make a'
+                      ' savepoint every time this many bytes have been'
+                      ' added. Larger values need fewer savepoints but'
+                      ' keep more data in memory.'),
+        required=False,
+        default=1 << 20,
+        min=0,
+    )
+
+    compressedTypes = Tuple(
+        title=_('Compressed Content Types'),
+        description=_('The content types of files whose chunks store their'
+                      ' data compressed, e.g. "text/*" or "application/json".'
+                      ' Compressed data is sent to clients accepting gzip'
+                      ' without compressing it again.'),
+        value_type=NativeStringLine(),
+        required=False,
+        default=(),
+    )
+
+    encodedTypes = Tuple(
+        title=_('Encoded Content Types'),
+        description=_('The content types of files that keep variants of'
+                      ' their data encoded with gzip, and brotli if it is'
+                      ' installed. The smallest variant a client accepts'
+                      ' is sent instead of the data.'),
+        value_type=NativeStringLine(),
+        required=False,
+        default=(),
+    )
+
+    def getChunkSize(size=None):
+        """Return the chunk size for data of `size` bytes.
+
+        `size` is `None` if the size of the data is not known in advance.
+        """
+
+    def needsSavepoint(chunks, size):
+        """Tell whether to save the chunks added since the last savepoint.
+
+        `chunks` is the number of these chunks, `size` their size in
+        bytes.  If neither `savepointChunks` nor `savepointSize` is set,
+        every chunk is saved at once.
+        """
+
+    def compresses(contentType):
+        """Tell whether the data of files of `contentType` is compressed.
+
+        Only chunks compress their data, not blobs.
+        """
+
+    def encodes(contentType):
+        """Tell whether files of `contentType` keep encoded variants."""
+
+
+class IChunkStore(Interface):
+    """Store sharing the chunks of files with the same data.
+
+    If a utility providing this interface is registered, the files that
+    store their data in the ``tree`` layout share chunks with equal data
+    instead of each keeping a copy.  The store counts the references to
+    each chunk and forgets a chunk once it isn't used anymore.
+    """
+
+    def __len__():
+        """Return the number of chunks in the store."""
+
+    def add(data, compress=False):
+        """Return a chunk holding the bytes `data`.
+
+        If the store has such a chunk already, it is returned instead of
+        a new one.  Either way, a reference to the chunk is counted.  If
+        `compress` is true, the chunk stores the data compressed.
+        """
+
+    def retain(chunk):
+        """Count another reference to `chunk`, which is shared by a copy.
+
+        Chunks that don't belong to the store are ignored.
+        """
+
+    def release(chunk):
+        """Drop a reference to `chunk`.
+
+        The chunk is removed from the store when its last reference is
+        dropped.  Chunks that don't belong to the store are ignored.
+        """
+
+
+class IDownloadOffload(Interface):
+    """Settings for letting the front-end web server send file data.
+
+    If a utility providing this interface is registered, the data of
+    files that is stored in a committed blob is not streamed through
+    Python.  Instead, the response carries a header that tells the web
+    server in front of the application (e.g. Apache with mod_xsendfile
+    or nginx) to send the file itself.
+    """
+
+    header = Choice(
+        title=_('Header'),
+        description=_('The header telling the web server which file to'
+                      ' send.'),
+        values=('X-Sendfile', 'X-Accel-Redirect'),
+        default='X-Sendfile',
+    )
+
+    root = TextLine(
+        title=_('Root'),
+        description=_('The directory of the blobs as seen by the'
+                      ' application. Files outside it are not offloaded.'),
+        required=False,
+    )
+
+    location = TextLine(
+        title=_('Location'),
+        description=_('The path that replaces the root in the header,'
+                      ' e.g. an internal location of nginx.'),
+        required=False,
+    )
+
+    def getLocation(filename):
+        """Return the value of the header for the file `filename`.
+
+        `None` is returned if the file cannot be offloaded.
+        """
+
+
 class IImage(IFile):
     """This interface defines an Image that can be displayed.
     """
@@ -53,3 +347,110 @@ class IImage(IFile):
         """Return a tuple (x, y) that describes the dimensions of
         the object.
         """
+
+
+class IImageHeader(Interface):
+    """The start of the data of an image, read as far as it is needed."""
+
+    def peek(size):
+        """Return the next `size` bytes without consuming them.
+
+        Fewer bytes are returned at the end of the data.
+        """
+
+    def view(size):
+        """Return a byte string and the offset of the next byte in it.
+
+        At least `size` bytes follow the offset in the string, fewer only
+        at the end of the data.  The string may hold more data before and
+        after them.  Unlike `peek`, the data isn't copied, so formats can
+        scan a header in larger steps.  Nothing is consumed, use `skip`
+        to move on.
+        """
+
+    def read(size):
+        """Return and consume the next `size` bytes.
+
+        Fewer bytes are returned at the end of the data.
+        """
+
+    def skip(size):
+        """Skip the next `size` bytes without reading them."""
+
+    def skipTo(byte):
+        """Skip the data before the next occurrence of `byte`.
+
+        Returns whether it was found.
+        """
+
+
+class IImageFormat(Interface):
+    """A format of images whose type and size are found in their header.
+
+    Named utilities providing this interface add formats to the ones
+    `zope.app.file.image.getImageInfo` knows.  They are asked before the
+    built-in formats, but only for data starting with one of their
+    signatures.
+    """
+
+    signatures = Tuple(
+        title=_('Signatures'),
+        description=_('The bytes the data of the images starts with.'),
+        value_type=Bytes(min_length=2),
+    )
+
+    def getImageInfo(header):
+        """Return the content type, width and height of an image.
+
+        `header` is an `IImageHeader` at the start of the data, which
+        begins with one of the signatures.  The width and height are -1
+        if they can't be found.  `None` is returned if the data is not in
+        this format after all; the header must only have been peeked at
+        then.
+        """
+
+
+class IImageScale(Interface):
+    """A size images are scaled to.
+
+    Scales are registered as named utilities, usually with the
+    ``imageScale`` ZCML directive.  The image scaled to the scale
+    ``thumbnail`` is published as ``@@images/thumbnail``.
+    """
+
+    width = Int(
+        title=_('Width'),
+        description=_('The width of the scaled images, if it is limited.'),
+        min=1,
+        required=False,
+    )
+
+    height = Int(
+        title=_('Height'),
+        description=_('The height of the scaled images, if it is limited.'),
+        min=1,
+        required=False,
+    )
+
+    crop = Bool(
+        title=_('Crop'),
+        description=_('Whether images are cropped to fill the whole size'
+                      ' instead of fitting into it.'),
+        default=False,
+    )
+
+
+class IImageScaler(Interface):
+    """Makes scaled versions of images.
+
+    Images are only scaled if a utility providing this interface is
+    registered.
+    """
+
+    def scale(image, width, height):
+        """Return the data of `image` scaled to `width` and `height`.
+
+        The image is cropped around its center to the aspect ratio of the
+        new size first, if needed.  The scaled data is in the format of
+        the image.  `None` is returned if the image can't be scaled.
+        """
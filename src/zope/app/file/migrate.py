@@ -0,0 +1,224 @@
+##############################################################################
+#
+# Copyright (c) 2026 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Migrate the data of existing files to another storage layout.
+
+Files created before the ``tree`` and ``blob`` storage modes existed keep
+their data inline or in a chain of chunks.  This module rewrites them in
+one of the new layouts, or moves inline data into a chunk of its own
+(``--storage chunks``)::
+
+  python -m zope.app.file.migrate --storage tree zodb.conf
+
+The records of the database are scanned in the order of their oids, so
+the migration can run against a live site: every batch of files is
+committed in a transaction of its own and retried on conflicts.  If the
+migration is interrupted, it can be resumed from the oid it logged last
+with ``--start``.
+"""
+__docformat__ = 'restructuredtext'
+
+import argparse
+import logging
+import time
+
+import transaction
+import ZODB.config
+from BTrees.LOBTree import LOBTree
+from ZODB.POSException import ConflictError
+from ZODB.utils import get_pickle_metadata
+from ZODB.utils import oid_repr
+from ZODB.utils import p64
+
+from zope.app.file.file import File
+from zope.app.file.file import FileChunk
+from zope.app.file.file import _isBlob
+
+
+logger = logging.getLogger('zope.app.file.migrate')
+
+_fileClasses = {}
+
+
+def _isFileClass(module, name):
+    key = module, name
+    isFile = _fileClasses.get(key)
+    if isFile is None:
+        try:
+            cls = getattr(__import__(module, fromlist=[name]), name)
+            isFile = isinstance(cls, type) and issubclass(cls, File)
+        except Exception:
+            isFile = False
+        _fileClasses[key] = isFile
+    return isFile
+
+
+def getLayout(file):
+    """Return the storage layout of the data of `file`."""
+    data = file._data
+    if isinstance(data, LOBTree):
+        return 'tree'
+    if _isBlob(data):
+        return 'blob'
+    if isinstance(data, FileChunk):
+        return 'chunks'
+    return 'inline'
+
+
+def migrateFile(file, storage):
+    """Rewrite the data of `file` in the `storage` layout.
+
+    The storage mode of the file itself is left alone, so that new data
+    is stored as before.  Returns the size of the data rewritten, or
+    `None` if it already is in that layout.
+    """
+    if getLayout(file) == storage:
+        return None
+    pinned = '_storage' in file.__dict__
+    old = file._storage
+    file._storage = storage
+    # The encoded variants stay valid, they are files of their own which
+    # are migrated separately.
+    encodings = file._encodings
+    file._encodings = None
+    try:
+        # Don't let subclasses react to the data, it didn't change.
+        File._setData(file, file._data)
+    finally:
+        if pinned:
+            file._storage = old
+        else:
+            del file._storage
+        file._encodings = encodings
+    return file.getSize()
+
+
+def iterFileOids(storage, start=None):
+    """Iterate over the oids of the files in `storage`.
+
+    Yields pairs of the oid of a file (or `None` for other records) and
+    the oid of the record after it, which is `None` at the end.  Only
+    the class names in the records are looked at, the objects are not
+    loaded.
+    """
+    next = start
+    while True:
+        oid, _tid, data, next = storage.record_iternext(next)
+        if not _isFileClass(*get_pickle_metadata(data)):
+            oid = None
+        yield oid, next
+        if next is None:
+            break
+
+
+def migrate(db, storage='tree', batchSize=100, start=None, retries=5,
+            retryDelay=1.0):
+    """Migrate all files in the database `db` to the `storage` layout.
+
+    The files are committed in batches of `batchSize`, and a batch is
+    tried again up to `retries` times if it conflicts with a concurrent
+    transaction.  `start` is the oid to continue an earlier migration
+    from.  Returns the number of files migrated.
+    """
+    if not hasattr(db.storage, 'record_iternext'):
+        raise ValueError(
+            'The storage does not support iterating over its records.')
+
+    tm = transaction.TransactionManager()
+    conn = db.open(transaction_manager=tm)
+    scanned = migrated = size = 0
+    began = time.time()
+    try:
+        records = iterFileOids(db.storage, start)
+        next = start
+        while True:
+            cursor = next
+            batch = []
+            for oid, next in records:
+                scanned += 1
+                if oid is not None:
+                    batch.append(oid)
+                    if len(batch) >= batchSize:
+                        break
+
+            for attempt in range(retries + 1):
+                tm.begin()
+                try:
+                    batchMigrated = batchBytes = 0
+                    for oid in batch:
+                        rewritten = migrateFile(conn.get(oid), storage)
+                        if rewritten is not None:
+                            batchMigrated += 1
+                            batchBytes += rewritten
+                    tm.commit()
+                except ConflictError:
+                    tm.abort()
+                    if attempt == retries:
+                        logger.error(
+                            'Giving up after %d conflicts, resume from %s',
+                            retries + 1, _repr(cursor))
+                        raise
+                    logger.info('Conflict, retrying batch')
+                    time.sleep(retryDelay * (attempt + 1))
+                else:
+                    break
+            conn.cacheMinimize()
+
+            migrated += batchMigrated
+            size += batchBytes
+            elapsed = max(time.time() - began, 1e-6)
+            logger.info(
+                '%d records scanned, %d files migrated, %.1f files/s,'
+                ' %.1f MiB/s, next %s',
+                scanned, migrated, migrated / elapsed,
+                size / elapsed / (1 << 20), _repr(next))
+            if next is None:
+                break
+    finally:
+        tm.abort()
+        conn.close()
+    return migrated
+
+
+def _repr(oid):
+    return 'end' if oid is None else oid_repr(oid)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Migrate the data of files to another storage layout.')
+    parser.add_argument('config', help='ZODB configuration file')
+    parser.add_argument('-s', '--storage', choices=('tree', 'blob', 'chunks'),
+                        default='tree', help='layout to migrate to')
+    parser.add_argument('-b', '--batch-size', type=int, default=100,
+                        help='number of files per transaction')
+    parser.add_argument('--start', help='oid to resume from, e.g. 0x1a2b')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='how often to retry a batch on conflicts')
+    options = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    db = ZODB.config.databaseFromURL(options.config)
+    start = None
+    if options.start:
+        start = p64(int(options.start, 16))
+    try:
+        migrate(db, options.storage, options.batch_size, start,
+                options.retries)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
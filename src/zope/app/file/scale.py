@@ -0,0 +1,173 @@
+##############################################################################
+#
+# Copyright (c) 2026 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Scaled versions of images.
+
+The sizes images are scaled to are named `IImageScale` utilities, which
+are registered with the ``imageScale`` ZCML directive::
+
+  <imageScale name="thumbnail" width="128" height="128" />
+
+An image is scaled by the `IImageScaler` utility the first time it is
+asked for in a scale.  The scaled image is kept in an annotation of the
+image until the data of the image changes.
+"""
+__docformat__ = 'restructuredtext'
+
+from io import BytesIO
+
+import zope.component
+from persistent.mapping import PersistentMapping
+from zope.annotation.interfaces import IAnnotations
+from zope.interface import implementer
+from zope.lifecycleevent.interfaces import IObjectModifiedEvent
+from zope.lifecycleevent.interfaces import IObjectRemovedEvent
+
+from zope.app.file.file import _modifiesData
+from zope.app.file.file import _releaseChunks
+from zope.app.file.image import Image
+from zope.app.file.interfaces import IImage
+from zope.app.file.interfaces import IImageScale
+from zope.app.file.interfaces import IImageScaler
+
+
+try:
+    import PIL.Image
+    import PIL.ImageOps
+except ImportError:
+    PIL = None
+
+
+# The key of the annotation keeping the scaled versions of an image
+ANNOTATION_KEY = 'zope.app.file.scales'
+
+
+@implementer(IImageScale)
+class ImageScale:
+
+    def __init__(self, width=None, height=None, crop=False):
+        self.width = width
+        self.height = height
+        self.crop = crop
+
+
+def getScaledImage(image, name):
+    """Return `image` scaled to the scale `name`.
+
+    The scaled image is made when it is asked for the first time, and
+    again when the data of the image or the scale changed.  The image
+    itself is returned if it is not larger than the scale or can't be
+    scaled.  A `ComponentLookupError` is raised for unknown scales.
+    """
+    scale = zope.component.getUtility(IImageScale, name)
+    size = getScaledSize(image.getImageSize(), scale)
+    if size is None:
+        return image
+
+    # The scaled image is kept for the data it was made from.  Data
+    # changed in place has no digest and is told apart by its changes.
+    key = (image.getDigest() or image._edits,) + size
+    annotations = IAnnotations(image)
+    scales = annotations.get(ANNOTATION_KEY)
+    old = scales.get(name) if scales is not None else None
+    if old is not None and old[0] == key:
+        return old[1]
+
+    scaler = zope.component.queryUtility(IImageScaler)
+    if scaler is None:
+        return image
+    data = scaler.scale(image, *size)
+    if data is None:
+        return image
+    if scales is None:
+        scales = annotations[ANNOTATION_KEY] = PersistentMapping()
+    scaled = Image(data)
+    if old is not None:
+        _releaseChunks(old[1]._data)
+    scales[name] = key, scaled
+    return scaled
+
+
+def getScaledSize(size, scale):
+    """Return the size an image of `size` has in `scale`.
+
+    Images are never enlarged: `None` is returned if the image is not
+    larger than the scale, or if its size is not known.
+    """
+    width, height = size
+    if width <= 0 or height <= 0:
+        return None
+    factors = [factor for factor in (
+        scale.width and scale.width / width,
+        scale.height and scale.height / height) if factor]
+    if not factors:
+        return None
+    if scale.crop and len(factors) == 2:
+        # The image fills the scale and is cropped to it.
+        if max(factors) >= 1:
+            return None
+        return scale.width, scale.height
+    factor = min(factors)
+    if factor >= 1:
+        return None
+    return (max(1, int(round(width * factor))),
+            max(1, int(round(height * factor))))
+
+
+def _getScaledImages(image):
+    annotations = IAnnotations(image, None)
+    if annotations is None:
+        return None
+    return annotations.get(ANNOTATION_KEY)
+
+
+@zope.component.adapter(IImage, IObjectModifiedEvent)
+def dropScaledImages(image, event):
+    """Drop the scaled versions of an image whose data changed."""
+    scales = _getScaledImages(image)
+    if not scales or not _modifiesData(event):
+        return
+    for _key, scaled in scales.values():
+        _releaseChunks(scaled._data)
+    del IAnnotations(image)[ANNOTATION_KEY]
+
+
+@zope.component.adapter(IImage, IObjectRemovedEvent)
+def releaseScaledImages(image, event):
+    """Release the shared chunks of the scaled versions of a removed image.
+    """
+    for _key, scaled in (_getScaledImages(image) or {}).values():
+        _releaseChunks(scaled._data)
+
+
+@implementer(IImageScaler)
+class PillowScaler:
+    """Scale images with Pillow.
+
+    It is registered if Pillow is installed.
+    """
+
+    def scale(self, image, width, height):
+        '''See `IImageScaler`'''
+        with image.open() as f:
+            try:
+                original = PIL.Image.open(f)
+                format = original.format
+                scaled = PIL.ImageOps.fit(
+                    original, (width, height), PIL.Image.LANCZOS)
+                data = BytesIO()
+                scaled.save(data, format)
+            except (OSError, ValueError, KeyError,
+                    PIL.Image.DecompressionBombError):
+                return None
+        return data.getvalue()
@@ -0,0 +1,122 @@
+##############################################################################
+#
+# Copyright (c) 2026 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmarks for storing and reading file data.
+
+This is not part of the test suite.  Run it with::
+
+  python -m zope.app.file.tests.benchmark [size in MiB]
+
+For several chunk sizes, a file is stored in a FileStorage and read
+again from a cold cache.  The number of objects loaded from the storage
+and the throughput of writing and reading are printed.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import transaction
+import zope.component
+from ZODB.DB import DB
+from ZODB.FileStorage import FileStorage
+
+from zope.app.file.file import File
+from zope.app.file.file import FileStoragePolicy
+from zope.app.file.interfaces import IFileStoragePolicy
+
+
+CHUNK_SIZES = (1 << 16, 1 << 18, 1 << 20, 1 << 22)
+
+
+class TransferMonitor:
+    """Activity monitor counting the loads and stores of connections."""
+
+    def __init__(self):
+        self.loads = self.stores = 0
+
+    def closedConnection(self, conn):
+        loads, stores = conn.getTransferCounts(True)
+        self.loads += loads
+        self.stores += stores
+
+
+def bench(path, data, chunkSize=None, policy=None):
+    """Store `data` in a new database at `path` and read it back.
+
+    Returns the number of chunks, the number of loads needed to read the
+    data and the write and read times in seconds.
+    """
+    db = DB(FileStorage(path))
+    gsm = zope.component.getGlobalSiteManager()
+    if policy is not None:
+        gsm.registerUtility(policy, IFileStoragePolicy)
+    try:
+        conn = db.open()
+        start = time.perf_counter()
+        f = File(chunkSize=chunkSize)
+        conn.root()['file'] = f
+        f.data = BytesIO(data)
+        transaction.commit()
+        written = time.perf_counter() - start
+        chunks = len(f._getChunkIndex()[0])
+        conn.close()
+
+        db.cacheMinimize()
+        monitor = TransferMonitor()
+        db.setActivityMonitor(monitor)
+        conn = db.open()
+        conn.getTransferCounts(True)
+        start = time.perf_counter()
+        f = conn.root()['file']
+        size = 0
+        for piece in f.iterData():
+            size += len(piece)
+        read = time.perf_counter() - start
+        conn.close()
+        assert size == len(data)
+        return chunks, monitor.loads, written, read
+    finally:
+        if policy is not None:
+            gsm.unregisterUtility(policy, IFileStoragePolicy)
+        db.close()
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    mib = int(args[0]) if args else 64
+    data = os.urandom(1 << 20) * mib
+    tmp = tempfile.mkdtemp()
+    try:
+        print('%d MiB' % mib)
+        print('%-22s %8s %8s %12s %12s' % (
+            'chunk size', 'chunks', 'loads', 'write MiB/s', 'read MiB/s'))
+        runs = [('%d KiB' % (size >> 10), size, None)
+                for size in CHUNK_SIZES]
+        runs.append(('adaptive (64K-4M)', None,
+                     FileStoragePolicy(maxChunkSize=1 << 22)))
+        for i, (label, chunkSize, policy) in enumerate(runs):
+            path = os.path.join(tmp, '%d.fs' % i)
+            chunks, loads, written, read = bench(
+                path, data, chunkSize, policy)
+            print('%-22s %8d %8d %12.1f %12.1f' % (
+                label, chunks, loads, mib / written, mib / read))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
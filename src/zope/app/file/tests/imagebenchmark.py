@@ -0,0 +1,121 @@
+##############################################################################
+#
+# Copyright (c) 2026 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmarks for finding the size of JPEG images.
+
+This is not part of the test suite.  Run it with::
+
+  python -m zope.app.file.tests.imagebenchmark [repetitions]
+
+The headers of JPEGs come in a few typical layouts: a plain JFIF header,
+the EXIF data of cameras with an embedded thumbnail, ICC profiles split
+over several segments and the progressive frames of web images.  For
+each of them, the time `getImageInfo` needs is compared with the loop
+reading the markers one byte at a time and copying every segment it
+skipped.
+"""
+import os
+import struct
+import sys
+import time
+from io import BytesIO
+
+from zope.app.file.image import getImageInfo
+
+
+def segment(marker, payload):
+    return struct.pack('>BBH', 0xFF, marker, len(payload) + 2) + payload
+
+
+# Huffman tables, quantization tables and a frame of 4000x3000 pixels
+DHT = segment(0xC4, os.urandom(418))
+DQT = segment(0xDB, os.urandom(130))
+FRAME = b'\x08\x0b\xb8\x0f\xa0\x03\x01\x22\x00\x02\x11\x01\x03\x11\x01'
+SCAN = segment(0xDA, b'\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00')
+SCAN += os.urandom(1 << 16) + b'\xff\xd9'
+
+LAYOUTS = [
+    ('JFIF', segment(0xE0, b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00')
+     + DQT + segment(0xC0, FRAME)),
+    ('EXIF with thumbnail', segment(0xE1, b'Exif\x00\x00' + os.urandom(
+        0xFFF0)) + segment(0xE1, b'http://ns.adobe.com/xap/1.0/\x00'
+                           + b'<x:xmpmeta/>' * 1000)
+     + DQT + DHT + segment(0xC0, FRAME)),
+    ('ICC profile', segment(0xE0, b'JFIF\x00' + b'\x00' * 9) + b''.join(
+        segment(0xE2, b'ICC_PROFILE\x00' + bytes([i, 9]) + os.urandom(0xFF00))
+        for i in range(1, 10)) + DQT + segment(0xC0, FRAME)),
+    ('progressive', segment(0xE0, b'JFIF\x00' + b'\x00' * 9) + DQT
+     + segment(0xC2, FRAME) + DHT),
+]
+
+
+def previousImageInfo(data):
+    """The JPEG path of `getImageInfo` before the marker scanner."""
+    size = len(data)
+    if data[:6] in (b'GIF87a', b'GIF89a') or data.startswith(
+            b'\211PNG\r\n\032\n') or size < 2:
+        raise ValueError('not a JPEG')
+    jpeg = BytesIO(data)
+    jpeg.read(2)
+    b = jpeg.read(1)
+    w = -1
+    h = -1
+    while b and ord(b) != 0xDA:
+        while ord(b) != 0xFF:
+            b = jpeg.read(1)
+        while ord(b) == 0xFF:
+            b = jpeg.read(1)
+        if 0xC0 <= ord(b) <= 0xC3:
+            jpeg.read(3)
+            h, w = struct.unpack(b">HH", jpeg.read(4))
+            break
+        else:
+            jpeg.read(int(struct.unpack(b">H", jpeg.read(2))[0]) - 2)
+        b = jpeg.read(1)
+    return 'image/jpeg', w, h
+
+
+def bench(funcs, data, repetitions, rounds=7):
+    # The best of several rounds, the others were disturbed by whatever
+    # else the machine did.  The functions take turns in each round, so
+    # they are disturbed alike.
+    best = [None] * len(funcs)
+    for func in funcs:
+        assert func(data) == ('image/jpeg', 4000, 3000)
+    for round in range(rounds):
+        for i, func in enumerate(funcs):
+            start = time.perf_counter()
+            for j in range(repetitions):
+                func(data)
+            elapsed = time.perf_counter() - start
+            if best[i] is None or elapsed < best[i]:
+                best[i] = elapsed
+    return [elapsed / repetitions for elapsed in best]
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    repetitions = int(args[0]) if args else 1000
+    print('%-22s %10s %12s %12s %8s' % (
+        'layout', 'header', 'before us', 'now us', 'speedup'))
+    for label, header in LAYOUTS:
+        data = b'\xff\xd8' + header + SCAN
+        before, now = bench((previousImageInfo, getImageInfo), data,
+                            repetitions)
+        print('%-22s %10d %12.1f %12.1f %7.1fx' % (
+            label, len(header), before * 1e6, now * 1e6, before / now))
+
+
+if __name__ == '__main__':
+    main()
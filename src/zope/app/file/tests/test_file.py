@@ -15,10 +15,42 @@
 
 """
 import doctest
+import gzip
+import hashlib
 import unittest
 from io import BytesIO
 
+import transaction
+import ZEO
+from BTrees.LOBTree import LOBTree
+from ZODB.blob import Blob
+from ZODB.DB import DB
+from ZODB.DemoStorage import DemoStorage
+from ZODB.MappingStorage import MappingStorage
+from zope.component import provideAdapter
+from zope.component import provideHandler
+from zope.component import provideUtility
+from zope.component.event import objectEventNotify
+from zope.component.testing import setUp
+from zope.component.testing import tearDown
+from zope.container.contained import ObjectRemovedEvent
+from zope.copy import copy
+from zope.dublincore.interfaces import IZopeDublinCore
+from zope.lifecycleevent import Attributes
+from zope.lifecycleevent import ObjectCreatedEvent
+from zope.lifecycleevent import ObjectModifiedEvent
+from zope.lifecycleevent import notify
+from zope.lifecycleevent.interfaces import IObjectCreatedEvent
+
 from zope.app.file import file as zfile
+from zope.app.file.image import FileFactory
+from zope.app.file.image import Image
+from zope.app.file.interfaces import IChunkStore
+from zope.app.file.interfaces import IFile
+from zope.app.file.interfaces import IFileStoragePolicy
+from zope.app.file.migrate import getLayout
+from zope.app.file.migrate import migrateFile
+from zope.app.file.tests.test_image import zptlogo
 
 
 class TestFile(unittest.TestCase):
@@ -63,6 +95,1308 @@ class TestFile(unittest.TestCase):
             zfile.MAXCHUNKSIZE = old_size
 
 
+class DatabaseTestCase(unittest.TestCase):
+    """Base class of the tests storing files in a database.
+
+    The keyword arguments of the `IFileStoragePolicy` registered for the
+    tests are taken from `policy`, the defaults of the files stored by
+    `_storeFile` from `storage`, `chunkSize` and `contentType`.
+    """
+
+    policy = None
+    storage = None
+    chunkSize = 10
+    contentType = ''
+
+    def setUp(self):
+        setUp()
+        self.addCleanup(tearDown)
+        if self.policy is not None:
+            provideUtility(zfile.FileStoragePolicy(**self.policy),
+                           IFileStoragePolicy)
+        self.db = DB(DemoStorage())
+        self.addCleanup(self.db.close)
+        self.conn = self.db.open()
+        self.addCleanup(self.conn.close)
+        self.addCleanup(transaction.abort)
+        self.root = self.conn.root()
+
+    def _storeFile(self, data, name='file', **kw):
+        """Store a file with `data` as `name` and commit it."""
+        kw.setdefault('storage', self.storage)
+        kw.setdefault('chunkSize', self.chunkSize)
+        kw.setdefault('contentType', self.contentType)
+        self.root[name] = f = zfile.File(**kw)
+        f.data = data
+        # Like the views adding files
+        notify(ObjectCreatedEvent(f))
+        transaction.commit()
+        return f
+
+    def _provideCopyHooks(self):
+        provideAdapter(zfile.chunkCopyHook)
+        provideAdapter(zfile.chunkTreeCopyHook)
+        provideAdapter(zfile.FileCopyHook)
+
+    def _countLoads(self):
+        """Return the list of the oids loaded from now on.
+
+        The connections of the iterators over the data of files are
+        counted too.
+        """
+        loads = []
+        storage = self.db.storage
+        loadBefore = storage.loadBefore
+
+        def countingLoadBefore(oid, tid):
+            loads.append(oid)
+            return loadBefore(oid, tid)
+
+        storage.loadBefore = countingLoadBefore
+        self.addCleanup(delattr, storage, 'loadBefore')
+        return loads
+
+
+class UnseekableStream:
+    # A stream like ``wsgi.input`` which may return short reads
+
+    def __init__(self, data, size=7):
+        self._data = BytesIO(data)
+        self._size = size
+
+    def read(self, size=-1):
+        return self._data.read(min(size, self._size))
+
+
+class TestStreamIngestion(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        old_size = zfile.MAXCHUNKSIZE
+        zfile.MAXCHUNKSIZE = 10
+        self.addCleanup(setattr, zfile, 'MAXCHUNKSIZE', old_size)
+
+    def _chunks(self, f):
+        chunk, chunks = f._data, []
+        while chunk is not None:
+            chunks.append(chunk)
+            chunk = chunk.next
+        return chunks
+
+    def test_small_stream(self):
+        f = zfile.File(UnseekableStream(b'abc'))
+        self.assertEqual(b'abc', f._data)
+        self.assertEqual(3, f.getSize())
+
+    def test_empty_iterable(self):
+        f = zfile.File(iter([]))
+        self.assertEqual(b'', f.data)
+        self.assertEqual(0, f.getSize())
+
+    def test_iterable(self):
+        f = zfile.File(piece for piece in [b'a' * 4, u'b' * 13, b'', b'c'])
+        self.assertEqual(b'a' * 4 + b'b' * 13 + b'c', f.data)
+        self.assertEqual(18, f.getSize())
+        self.assertEqual([10, 8], [len(c._data) for c in self._chunks(f)])
+
+    def test_unseekable_stream(self):
+        f = zfile.File(UnseekableStream(b'x' * 25))
+        self.assertEqual(b'x' * 25, f.data)
+        self.assertEqual(25, f.getSize())
+        self.assertEqual([10, 10, 5], [len(c._data) for c in self._chunks(f)])
+
+    def test_unseekable_file_object(self):
+        class Stream(BytesIO):
+            def seekable(self):
+                return False
+        f = zfile.File(Stream(b'y' * 21))
+        self.assertEqual(b'y' * 21, f.data)
+        self.assertEqual([10, 10, 1], [len(c._data) for c in self._chunks(f)])
+
+    def test_chunks_are_saved_front_to_back(self):
+        f = zfile.File()
+        self.root['file'] = f
+        f.data = UnseekableStream(b'z' * 45)
+        chunks = self._chunks(f)
+        self.assertEqual(5, len(chunks))
+        self.assertTrue(all(c._p_jar is self.conn for c in chunks))
+        transaction.commit()
+        self.assertEqual(b'z' * 45, f.data)
+        self.assertEqual(45, f.getSize())
+
+    def _states(self, f):
+        # Record the state of each chunk before loading it to get the next
+        states = []
+        chunk = f._data
+        while chunk is not None:
+            states.append(chunk._p_changed)
+            chunk = chunk.next
+        return states
+
+    def _countSavepoints(self, data, **policy):
+        # Set the data of a file that isn't committed yet and return the
+        # file and the number of savepoints made.
+        provideUtility(zfile.FileStoragePolicy(**policy), IFileStoragePolicy)
+        self.root['file'] = f = zfile.File()
+        savepoints = []
+        savepoint = zfile._savepoint
+
+        def countingSavepoint(jar):
+            savepoints.append(jar)
+            return savepoint(jar)
+
+        zfile._savepoint = countingSavepoint
+        try:
+            f.data = data
+        finally:
+            zfile._savepoint = savepoint
+        return f, len(savepoints)
+
+    def test_chunks_are_ghosted(self):
+        f, savepoints = self._countSavepoints(UnseekableStream(b'z' * 45),
+                                              savepointSize=0)
+        # Only the last chunk is still in memory
+        self.assertEqual([None, None, None, None, False], self._states(f))
+        self.assertEqual(6, savepoints)
+
+    def test_batched_savepoints(self):
+        f, savepoints = self._countSavepoints(UnseekableStream(b'z' * 55),
+                                              savepointChunks=3,
+                                              savepointSize=0)
+        # The chunks since the last savepoint are still in memory
+        self.assertEqual([None, None, None, None, True, False],
+                         self._states(f))
+        self.assertEqual(3, savepoints)
+        self.assertEqual(b'z' * 55, f.data)
+
+    def test_iterate_before_commit(self):
+        # Chunks that have not been saved yet must stay in memory
+        f, savepoints = self._countSavepoints(UnseekableStream(b'z' * 55))
+        self.assertEqual(b'z' * 55, b''.join(f.iterData()))
+        self.assertEqual(b'z' * 50, b''.join(f.iterData(5)))
+        transaction.commit()
+        f._p_jar.cacheMinimize()
+        self.assertEqual(b'z' * 55, f.data)
+
+    def test_batched_savepoints_by_size(self):
+        f, savepoints = self._countSavepoints(UnseekableStream(b'z' * 55),
+                                              savepointSize=25)
+        self.assertEqual([None, None, None, None, True, False],
+                         self._states(f))
+        self.assertEqual(3, savepoints)
+
+    def test_batched_savepoints_seekable(self):
+        # Seekable files are split from back to front.  All chunks are
+        # saved, the last batch once the first chunk has been added.
+        f, savepoints = self._countSavepoints(BytesIO(b'z' * 55),
+                                              savepointChunks=2,
+                                              savepointSize=0)
+        self.assertEqual([None] * 5, self._states(f))
+        self.assertEqual([15, 10, 10, 10, 10],
+                         [len(c._data) for c in self._chunks(f)])
+        self.assertEqual(4, savepoints)
+        self.assertEqual(b'z' * 55, f.data)
+
+
+class TestChunkSize(DatabaseTestCase):
+
+    chunkSize = None
+
+    def _lengths(self, f):
+        chunk, lengths = f._data, []
+        while chunk is not None:
+            lengths.append(len(chunk._data))
+            chunk = chunk.next
+        return lengths
+
+    def test_per_file(self):
+        f = self._storeFile(BytesIO(b'x' * 45), chunkSize=10)
+        self.assertEqual([15, 10, 10, 10], self._lengths(f))
+        self.assertEqual(b'x' * 45, f.data)
+
+    def test_per_file_stream(self):
+        f = self._storeFile(UnseekableStream(b'x' * 45), chunkSize=10)
+        self.assertEqual([10, 10, 10, 10, 5], self._lengths(f))
+
+    def test_policy(self):
+        provideUtility(zfile.FileStoragePolicy(chunkSize=10),
+                       IFileStoragePolicy)
+        f = self._storeFile(BytesIO(b'x' * 45))
+        self.assertEqual([15, 10, 10, 10], self._lengths(f))
+        f = self._storeFile(BytesIO(b'x' * 45), chunkSize=20)
+        self.assertEqual([25, 20], self._lengths(f))
+
+    def test_adaptive_policy(self):
+        provideUtility(
+            zfile.FileStoragePolicy(chunkSize=10, maxChunkSize=40,
+                                    chunkCount=2),
+            IFileStoragePolicy)
+        f = self._storeFile(BytesIO(b'x' * 100))
+        self.assertEqual([60, 40], self._lengths(f))
+        # The size of a stream isn't known, so the chunks grow as it is
+        # read.
+        f = self._storeFile(UnseekableStream(b'x' * 100))
+        self.assertEqual([10, 10, 10, 20, 40, 10], self._lengths(f))
+        self.assertEqual(b'x' * 100, f.data)
+        self.assertEqual(b'x' * 30, b''.join(f.iterData(35, 65)))
+
+    def test_factory(self):
+        factory = FileFactory(None)
+        factory.chunkSize = 10
+        f = factory('foo.txt', 'text/plain', BytesIO(b'x' * 45))
+        self.assertEqual(10, f._chunkSize)
+
+
+class TestSeparatePayload(DatabaseTestCase):
+
+    policy = {'inline': False}
+
+    def test_metadata_without_data(self):
+        self.root['file'] = zfile.File(BytesIO(b'abc'), 'text/plain')
+        self.root['image'] = Image()
+        self.root['image'].data = BytesIO(zptlogo)
+        transaction.commit()
+        self.conn.cacheMinimize()
+
+        for name, size in [('file', 3), ('image', len(zptlogo))]:
+            f = self.root[name]
+            self.assertEqual(size, zfile.FileReadFile(f).size())
+            f.contentType
+            self.assertIsNone(f._data._p_changed, name)
+        self.assertEqual((16, 16), self.root['image'].getImageSize())
+        self.assertIsNone(self.root['image']._data._p_changed)
+
+
+class TestChunkStore(DatabaseTestCase):
+
+    storage = 'tree'
+
+    def setUp(self):
+        super().setUp()
+        self.root['store'] = self.store = zfile.ChunkStore()
+        provideUtility(self.store, IChunkStore)
+        provideHandler(objectEventNotify)
+        provideHandler(zfile.releaseChunks)
+
+    def test_shared_chunks(self):
+        data = bytes(range(95))
+        f1 = self._storeFile(BytesIO(data), 'f1')
+        f2 = self._storeFile(BytesIO(b'new' + data[3:]), 'f2')
+        self.assertEqual(11, len(self.store))
+        self.assertIsNot(f1._data[0], f2._data[0])
+        for offset in range(10, 100, 10):
+            self.assertIs(f1._data[offset], f2._data[offset])
+        self.conn.cacheMinimize()
+        self.assertEqual(data, f1.data)
+        self.assertEqual(b'new' + data[3:], f2.data)
+
+    def test_repeated_chunks(self):
+        f = self._storeFile(BytesIO(b'x' * 100))
+        self.assertEqual(1, len(self.store))
+        self.assertEqual(b'x' * 100, f.data)
+
+    def test_release_on_change(self):
+        f1 = self._storeFile(BytesIO(b'x' * 20 + b'y' * 10), 'f1')
+        f2 = self._storeFile(BytesIO(b'x' * 10), 'f2')
+        self.assertEqual(2, len(self.store))
+        f1.data = BytesIO(b'z' * 20)
+        self.assertEqual(2, len(self.store))
+        self.assertEqual([b'x' * 10], [bytes(c) for c in f2._data.values()])
+        f2.data = b''
+        self.assertEqual(1, len(self.store))
+        self.assertEqual(b'z' * 20, f1.data)
+
+    def test_release_on_removal(self):
+        f1 = self._storeFile(BytesIO(b'x' * 30), 'f1')
+        f2 = self._storeFile(BytesIO(b'x' * 10 + b'y' * 5), 'f2')
+        notify(ObjectRemovedEvent(f1, self.root, 'f1'))
+        self.assertEqual(2, len(self.store))
+        notify(ObjectRemovedEvent(f2, self.root, 'f2'))
+        self.assertEqual(0, len(self.store))
+
+    def test_chains_not_shared(self):
+        self._storeFile(BytesIO(b'x' * 30), storage='chunks')
+        self.assertEqual(0, len(self.store))
+
+    def test_release_without_loading_chunks(self):
+        data = b''.join(b'%10d' % i for i in range(1024))
+        f = self._storeFile(BytesIO(data))
+        self.assertEqual(1024, len(self.store))
+        self.conn.cacheMinimize()
+        loads = self._countLoads()
+        f.data = b'new'
+        self.assertEqual(1, len(self.store))
+        # Only the file, the store and the buckets of the trees are loaded
+        self.assertFalse(any(isinstance(self.conn.get(oid), zfile.FileChunk)
+                             for oid in loads))
+        self.assertLess(len(loads), 200)
+
+    def test_chunks_added_before_store_is_saved(self):
+        store = zfile.ChunkStore()
+        provideUtility(store, IChunkStore)
+        f = zfile.File(BytesIO(b'x' * 20 + b'y' * 10), storage='tree',
+                       chunkSize=10)
+        self.root['unsaved-store'] = store
+        self.root['file'] = f
+        transaction.commit()
+        self.assertEqual(2, len(store))
+        f.data = b''
+        self.assertEqual(0, len(store))
+
+
+class TestCopy(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._provideCopyHooks()
+
+    def _copy(self, name, f, data):
+        f.data = BytesIO(data)
+        self.root[name] = f
+        transaction.commit()
+        self.root[name + '-copy'] = c = copy(f)
+        transaction.commit()
+        self.conn.cacheMinimize()
+        self.assertEqual(data, c.data)
+        self.assertEqual(len(data), c.getSize())
+        self.assertEqual(f.contentType, c.contentType)
+        return c
+
+    def test_copy_chunks(self):
+        f = zfile.File(b'', 'text/plain', chunkSize=10)
+        c = self._copy('f', f, b'x' * 95)
+        self.assertIs(f._data, c._data)
+        c.data = b'abc'
+        self.assertEqual(b'x' * 95, f.data)
+
+    def test_copy_tree(self):
+        f = zfile.File(storage='tree', chunkSize=10)
+        c = self._copy('f', f, bytes(range(95)))
+        self.assertIsNot(f._data, c._data)
+        self.assertEqual(list(f._data.keys()), list(c._data.keys()))
+        for old, new in zip(f._data.values(), c._data.values()):
+            self.assertIs(old, new)
+        c.data = b'abc'
+        self.assertEqual(bytes(range(95)), f.data)
+
+    def test_copy_tree_without_loading_chunks(self):
+        data = b''.join(b'%10d' % i for i in range(1024))
+        f = self._storeFile(BytesIO(data), storage='tree')
+        self.conn.cacheMinimize()
+        loads = self._countLoads()
+        self.root['copy'] = c = copy(f)
+        # Only the file and the buckets of the tree are loaded
+        self.assertFalse(any(isinstance(self.conn.get(oid), zfile.FileChunk)
+                             for oid in loads))
+        self.assertLess(len(loads), 50)
+        transaction.commit()
+        self.assertEqual(list(f._data.items()), list(c._data.items()))
+        self.assertEqual(data, c.data)
+
+    def test_copy_other_trees(self):
+        tree = LOBTree({1: b'abc'})
+        self.assertIsNone(zfile.chunkTreeCopyHook(tree))
+        self.assertIsNone(zfile.chunkTreeCopyHook(LOBTree()))
+        c = copy(tree)
+        self.assertEqual({1: b'abc'}, dict(c))
+
+    def test_copy_tree_retains_shared_chunks(self):
+        self.root['store'] = store = zfile.ChunkStore()
+        provideUtility(store, IChunkStore)
+        provideHandler(objectEventNotify)
+        provideHandler(zfile.releaseChunks)
+        f = zfile.File(storage='tree', chunkSize=10)
+        c = self._copy('f', f, b'x' * 20 + b'y' * 10)
+        self.assertEqual(2, len(store))
+        notify(ObjectRemovedEvent(f, self.root, 'f'))
+        self.assertEqual(2, len(store))
+        notify(ObjectRemovedEvent(c, self.root, 'f-copy'))
+        self.assertEqual(0, len(store))
+
+    def test_copy_blob(self):
+        f = zfile.File(storage='blob')
+        c = self._copy('f', f, b'abc' * 1000)
+        self.assertIs(f._data, c._data)
+        c.data = b'abc'
+        self.assertEqual(b'abc' * 1000, f.data)
+
+    def test_copy_inline(self):
+        f = zfile.File()
+        c = self._copy('f', f, b'abc')
+        self.assertEqual(b'abc', c._data)
+
+    def test_copy_image(self):
+        f = Image()
+        f._chunkSize = 100
+        c = self._copy('image', f, zptlogo)
+        self.assertIsInstance(f._data, zfile.FileChunk)
+        self.assertIs(f._data, c._data)
+        self.assertEqual((16, 16), c.getImageSize())
+
+
+class TestAppend(DatabaseTestCase):
+
+    def test_append_inline(self):
+        f = zfile.File(BytesIO(b'abc'))
+        f.append(b'def')
+        f.append('gh')
+        self.assertEqual(b'abcdefgh', f._data)
+        self.assertEqual(8, f.getSize())
+
+    def test_append_empty(self):
+        f = zfile.File()
+        f.append(b'')
+        self.assertEqual(b'', f.data)
+        f.append(BytesIO(b'abc'))
+        self.assertEqual(b'abc', f.data)
+        self.assertEqual(3, f.getSize())
+
+    def test_append_none(self):
+        f = zfile.File(b'abc')
+        with self.assertRaises(TypeError):
+            f.append(None)
+
+    def test_append_small_chunk(self):
+        f = zfile.File(b'abc', chunkSize=10)
+        f.append(b'x' * 20)
+        self.assertIsInstance(f._data, zfile.FileChunk)
+        self.assertEqual(b'abc' + b'x' * 20, f.data)
+        self.assertEqual(23, f.getSize())
+
+    def test_append_chain(self):
+        f = self._storeFile(BytesIO(b'x' * 95))
+        chain = f._data
+        f.append(b'y' * 30)
+        self.assertEqual(b'x' * 95 + b'y' * 30, f.data)
+        self.assertEqual(125, f.getSize())
+        self.assertEqual([0] + list(range(15, 125, 10)),
+                         list(f._data.keys()))
+        # The data of the chain is stored in new chunks, the chain is
+        # left alone.
+        self.assertNotIn(chain, list(f._data.values()))
+        self.assertEqual(b'x' * 95, bytes(chain))
+        self.assertEqual(b'y' * 10, f._data[95]._data)
+        self.assertEqual(b'x' * 5 + b'y' * 30, b''.join(f.iterData(90)))
+        transaction.commit()
+        self.conn.cacheMinimize()
+        self.assertEqual(b'x' * 95 + b'y' * 30, f.data)
+
+    def test_append_tree(self):
+        f = self._storeFile(BytesIO(b'x' * 95), storage='tree')
+        chunks = list(f._data.values())
+        self.conn.cacheMinimize()
+        f.append(BytesIO(b'y' * 10))
+        self.assertEqual(105, f.getSize())
+        self.assertEqual(list(range(0, 110, 10)), list(f._data.keys()))
+        # The complete chunks are neither loaded nor changed
+        for old, new in zip(chunks[:-1], f._data.values()):
+            self.assertIs(old, new)
+            self.assertIsNone(new._p_changed)
+        self.assertIsNot(chunks[-1], f._data[90])
+        transaction.commit()
+        self.assertEqual(b'x' * 95 + b'y' * 10, f.data)
+
+    def test_append_tree_loads(self):
+        data = b''.join(b'%10d' % i for i in range(1024))
+        f = self._storeFile(BytesIO(data + b'x' * 5), storage='tree')
+        self.conn.cacheMinimize()
+        loads = self._countLoads()
+        f.append(b'y' * 50)
+        # The file, the buckets of the tree on the way to the last chunk
+        # and that chunk
+        self.assertLess(len(loads), 10)
+        transaction.commit()
+        self.assertEqual(data + b'x' * 5 + b'y' * 50, f.data)
+
+    def test_append_tree_full_chunk(self):
+        f = self._storeFile(BytesIO(b'x' * 100), storage='tree')
+        last = f._data[90]
+        f.append(b'y')
+        self.assertIs(last, f._data[90])
+        self.assertEqual(b'y', f._data[100]._data)
+
+    def test_append_tree_chunk_store(self):
+        self.root['store'] = store = zfile.ChunkStore()
+        provideUtility(store, IChunkStore)
+        f = self._storeFile(BytesIO(b'x' * 15), storage='tree')
+        self.assertEqual(2, len(store))
+        f.append(b'y' * 5)
+        self.assertEqual(2, len(store))
+        self.assertEqual(b'x' * 15 + b'y' * 5, f.data)
+
+    def test_append_copy(self):
+        self._provideCopyHooks()
+        for storage in ('chunks', 'tree', 'blob'):
+            f = self._storeFile(BytesIO(b'x' * 95), storage=storage)
+            self.root['copy'] = c = copy(f)
+            transaction.commit()
+            f.append(b'y' * 10)
+            transaction.commit()
+            self.assertEqual(b'x' * 95 + b'y' * 10, f.data, storage)
+            self.assertEqual(b'x' * 95, c.data, storage)
+
+    def test_append_blob(self):
+        f = self._storeFile(BytesIO(b'x' * 95), storage='blob')
+        blob = f._data
+        f.append(b'y' * 10)
+        self.assertIsNot(blob, f._data)
+        self.assertEqual(105, f.getSize())
+        self.assertEqual(b'x' * 95 + b'y' * 10, f.data)
+
+    def test_append_image(self):
+        image = Image()
+        image.append(zptlogo[:5])
+        self.assertEqual((-1, -1), image.getImageSize())
+        image.append(zptlogo[5:])
+        self.assertEqual((16, 16), image.getImageSize())
+        self.assertEqual('image/gif', image.contentType)
+        self.assertEqual(zptlogo, image.data)
+
+
+class TestWrite(DatabaseTestCase):
+
+    def test_write_small(self):
+        f = zfile.File(b'abcdef')
+        f.write(2, b'XY')
+        self.assertEqual(b'abXYef', f.data)
+        f.write(5, 'gh')
+        self.assertEqual(b'abXYegh', f.data)
+        self.assertEqual(7, f.getSize())
+        f.write(7, b'')
+        self.assertEqual(b'abXYegh', f.data)
+
+    def test_write_errors(self):
+        f = zfile.File(b'abcdef')
+        with self.assertRaises(ValueError):
+            f.write(7, b'x')
+        with self.assertRaises(ValueError):
+            f.write(-1, b'x')
+        with self.assertRaises(TypeError):
+            f.write(0, [b'x'])
+        self.assertEqual(b'abcdef', f.data)
+
+    def test_write_tree(self):
+        data = bytes(range(95))
+        f = self._storeFile(BytesIO(data), storage='tree')
+        chunks = list(f._data.values())
+        self.conn.cacheMinimize()
+        f.write(25, b'Z' * 10)
+        expected = data[:25] + b'Z' * 10 + data[35:]
+        self.assertEqual(95, f.getSize())
+        self.assertEqual(list(range(0, 100, 10)), list(f._data.keys()))
+        for i, chunk in enumerate(f._data.values()):
+            if i in (2, 3):
+                self.assertIsNot(chunks[i], chunk)
+            else:
+                # Neither loaded nor changed
+                self.assertIs(chunks[i], chunk)
+                self.assertIsNone(chunk._p_changed)
+        self.assertEqual(expected, f.data)
+        transaction.commit()
+        self.conn.cacheMinimize()
+        self.assertEqual(expected, f.data)
+
+    def test_write_tree_loads(self):
+        data = b''.join(b'%10d' % i for i in range(1024))
+        f = self._storeFile(BytesIO(data), storage='tree')
+        self.conn.cacheMinimize()
+        loads = self._countLoads()
+        f.write(5000, b'ab')
+        self.assertLess(len(loads), 10)
+        transaction.commit()
+        self.assertEqual(data[:5000] + b'ab' + data[5002:], f.data)
+
+    def test_write_unchanged(self):
+        f = self._storeFile(BytesIO(b'x' * 95), storage='tree')
+        chunks = list(f._data.values())
+        f.write(30, b'x' * 10)
+        self.assertEqual(chunks, list(f._data.values()))
+
+    def test_write_beyond_end(self):
+        f = self._storeFile(BytesIO(b'x' * 95), storage='tree')
+        f.write(90, b'y' * 20)
+        self.assertEqual(b'x' * 90 + b'y' * 20, f.data)
+        self.assertEqual(110, f.getSize())
+        self.assertEqual(list(range(0, 110, 10)), list(f._data.keys()))
+
+    def test_write_stream(self):
+        data = bytes(range(95))
+        for storage in ('chunks', 'tree', 'blob'):
+            f = self._storeFile(BytesIO(data), storage=storage)
+            stream = BytesIO(b'--' + b'Z' * 30)
+            # The stream is read from where it is.
+            stream.seek(2)
+            f.write(25, stream)
+            self.assertEqual(data[:25] + b'Z' * 30 + data[55:], f.data,
+                             storage)
+            f.write(90, BytesIO(b'y' * 20))
+            self.assertEqual(data[:25] + b'Z' * 30 + data[55:90] + b'y' * 20,
+                             f.data, storage)
+            self.assertEqual(110, f.getSize(), storage)
+        f = zfile.File(b'abcdef')
+        f.write(2, BytesIO(b'XYZWV'))
+        self.assertEqual(b'abXYZWV', f.data)
+
+    def test_write_stream_reads(self):
+        data = b''.join(b'%10d' % i for i in range(100))
+        f = self._storeFile(BytesIO(data), storage='tree')
+        stream = BytesIO(b'y' * 500)
+        reads = []
+        read = stream.read
+        stream.read = lambda size=-1: reads.append(size) or read(size)
+        f.write(950, stream)
+        # A chunk at a time, the rest is appended
+        self.assertEqual([10] * 5, reads[:5])
+        self.assertNotIn(-1, reads)
+        self.assertEqual(data[:950] + b'y' * 500, f.data)
+
+    def test_write_chain(self):
+        f = self._storeFile(BytesIO(b'x' * 95))
+        f.write(0, b'y')
+        self.assertEqual(b'y' + b'x' * 94, f.data)
+        self.assertEqual([0] + list(range(15, 95, 10)), list(f._data.keys()))
+        transaction.commit()
+        self.assertEqual(b'y' + b'x' * 94, f.data)
+
+    def test_write_chain_unlinked(self):
+        data = b''.join(b'%10d' % i for i in range(100))
+        f = self._storeFile(BytesIO(data), chunkSize=100)
+        chain = f._getChunkIndex()[1]
+        self.assertEqual(10, len(chain))
+        f.write(450, b'ab')
+        transaction.commit()
+        self.assertEqual(data[:450] + b'ab' + data[452:], f.data)
+        # No chunk of the tree refers to the old chain, which can be
+        # collected.
+        for chunk in f._data.values():
+            self.assertIsNone(chunk.next)
+            self.assertNotIn(chunk, chain)
+
+    def test_write_blob(self):
+        f = self._storeFile(BytesIO(b'x' * 95), storage='blob')
+        blob = f._data
+        f.write(90, b'y' * 10)
+        self.assertIsNot(blob, f._data)
+        self.assertEqual(100, f.getSize())
+        self.assertEqual(b'x' * 90 + b'y' * 10, f.data)
+        f.write(0, b'z')
+        self.assertEqual(100, f.getSize())
+        self.assertEqual(b'z' + b'x' * 89 + b'y' * 10, f.data)
+
+    def test_write_copy(self):
+        self._provideCopyHooks()
+        for storage in ('chunks', 'tree', 'blob'):
+            f = self._storeFile(BytesIO(b'x' * 95), storage=storage)
+            self.root['copy'] = c = copy(f)
+            transaction.commit()
+            f.write(40, b'y' * 10)
+            transaction.commit()
+            self.assertEqual(b'x' * 40 + b'y' * 10 + b'x' * 45, f.data,
+                             storage)
+            self.assertEqual(b'x' * 95, c.data, storage)
+
+    def test_write_chunk_store(self):
+        self.root['store'] = store = zfile.ChunkStore()
+        provideUtility(store, IChunkStore)
+        f1 = self._storeFile(BytesIO(b'x' * 30), 'f1', storage='tree')
+        f2 = self._storeFile(BytesIO(b'x' * 30), 'f2', storage='tree')
+        self.assertEqual(1, len(store))
+        f1.write(10, b'y' * 10)
+        self.assertEqual(2, len(store))
+        self.assertEqual(b'x' * 10 + b'y' * 10 + b'x' * 10, f1.data)
+        self.assertEqual(b'x' * 30, f2.data)
+        f1.write(10, b'x' * 10)
+        self.assertEqual(1, len(store))
+
+    def test_write_image(self):
+        image = Image(zptlogo)
+        # Change the width in the header
+        image.write(6, b'\x20\x00')
+        self.assertEqual((32, 16), image.getImageSize())
+
+
+class TestCompression(DatabaseTestCase):
+
+    text = b''.join(b'line %d of a text file\n' % i for i in range(100))
+
+    policy = {'compressedTypes': ('text/*',)}
+    chunkSize = 1000
+    contentType = 'text/plain'
+
+    def _gunzip(self, body):
+        try:
+            return gzip.decompress(b''.join(body))
+        finally:
+            body.close()
+
+    def _chunks(self, f):
+        if isinstance(f._data, LOBTree):
+            return list(f._data.values())
+        return f._getChunkIndex()[1]
+
+    def test_compressed_chunks(self):
+        for source in (bytes, BytesIO, lambda text: iter([text])):
+            for storage in ('chunks', 'tree'):
+                f = self._storeFile(source(self.text), storage=storage)
+                for chunk in self._chunks(f):
+                    self.assertIsInstance(chunk, zfile.CompressedChunk)
+                    self.assertLess(len(chunk._deflate), chunk._length / 2)
+                self.conn.cacheMinimize()
+                self.assertEqual(self.text, f.data)
+                self.assertEqual(len(self.text), f.getSize())
+                self.assertEqual(self.text[1500:1600],
+                                 b''.join(f.iterData(1500, 1600)))
+
+    def test_other_types(self):
+        f = self._storeFile(self.text,
+                            contentType='application/octet-stream')
+        self.assertNotIsInstance(f._data, zfile.CompressedChunk)
+        self.assertIsNone(f.iterGzipData())
+
+    def test_blob(self):
+        f = self._storeFile(self.text, storage='blob')
+        self.assertIsNone(f.iterGzipData())
+        self.assertEqual(self.text, f.data)
+
+    def test_inline(self):
+        f = zfile.File(BytesIO(b'abc'), 'text/plain')
+        self.assertEqual(b'abc', f._data)
+        self.assertIsNone(f.iterGzipData())
+
+    def test_gzip(self):
+        for storage in ('chunks', 'tree'):
+            f = self._storeFile(BytesIO(self.text), storage=storage)
+            self.assertEqual(self.text, self._gunzip(f.iterGzipData()))
+            # read through a connection of its own
+            self.conn.cacheMinimize()
+            body = f.iterGzipData()
+            self.assertIsNotNone(body._oids)
+            self.assertEqual(self.text, self._gunzip(body))
+
+    def test_gzip_empty(self):
+        f = self._storeFile(b'', storage='tree')
+        self.assertEqual(b'', self._gunzip(f.iterGzipData()))
+
+    def test_append_and_write(self):
+        for storage in ('chunks', 'tree'):
+            f = self._storeFile(self.text, storage=storage)
+            f.append(b'more text')
+            f.write(10, b'written')
+            expected = self.text[:10] + b'written' + self.text[17:]
+            expected += b'more text'
+            for chunk in self._chunks(f):
+                self.assertIsInstance(chunk, zfile.CompressedChunk)
+            self.assertEqual(expected, f.data)
+            self.assertEqual(expected, self._gunzip(f.iterGzipData()))
+
+    def test_chunk_store(self):
+        self.root['store'] = store = zfile.ChunkStore()
+        provideUtility(store, IChunkStore)
+        f1 = self._storeFile(self.text, 'f1', storage='tree')
+        f2 = self._storeFile(self.text, 'f2', storage='tree',
+                             contentType='application/octet-stream')
+        self.assertEqual(6, len(store))
+        self.assertIsInstance(f1._data[0], zfile.CompressedChunk)
+        self.assertNotIsInstance(f2._data[0], zfile.CompressedChunk)
+        self.assertEqual(self.text, self._gunzip(f1.iterGzipData()))
+
+    def test_copy(self):
+        self._provideCopyHooks()
+        f = self._storeFile(self.text)
+        self.root['copy'] = c = copy(f)
+        transaction.commit()
+        self.assertIs(f._data, c._data)
+        self.assertEqual(self.text, self._gunzip(c.iterGzipData()))
+
+
+class FakeBrotli:
+    # Stands in for brotli, which need not be installed.
+
+    def __init__(self):
+        self._data = []
+
+    def compress(self, data):
+        self._data.append(data)
+        return b''
+
+    def flush(self):
+        return b'br:%d' % len(b''.join(self._data))
+
+
+class TestEncodings(DatabaseTestCase):
+
+    text = b''.join(b'line %d of a text file\n' % i for i in range(100))
+
+    policy = {'encodedTypes': ('text/*',)}
+    chunkSize = 1000
+    contentType = 'text/plain'
+
+    def setUp(self):
+        super().setUp()
+        provideHandler(objectEventNotify)
+        provideHandler(zfile.updateEncodings)
+        provideHandler(zfile.updateEncodings, (IFile, IObjectCreatedEvent))
+        provideHandler(zfile.releaseChunks)
+        encoders = zfile.ENCODERS.copy()
+        self.addCleanup(zfile.ENCODERS.update, encoders)
+        self.addCleanup(zfile.ENCODERS.clear)
+        zfile.ENCODERS['br'] = FakeBrotli
+
+    def _modified(self, f, *descriptions):
+        notify(ObjectModifiedEvent(f, *descriptions))
+
+    def test_encodings(self):
+        for storage in ('chunks', 'tree', 'blob'):
+            f = self._storeFile(BytesIO(self.text), storage=storage)
+            encodings = f.getEncodings()
+            self.assertEqual(['br', 'gzip'], sorted(encodings))
+            self.assertEqual(b'br:%d' % len(self.text),
+                             encodings['br'].data)
+            self.conn.cacheMinimize()
+            self.assertEqual(self.text, gzip.decompress(
+                b''.join(encodings['gzip'].iterData())))
+            # Variants are stored like the data, small ones inline
+            self.assertEqual(storage.replace('chunks', 'inline'),
+                             getLayout(encodings['gzip']))
+
+    def test_other_types(self):
+        f = self._storeFile(self.text,
+                            contentType='application/octet-stream')
+        self.assertEqual({}, f.getEncodings())
+
+    def test_other_types_unchanged(self):
+        f = self._storeFile(self.text,
+                            contentType='application/octet-stream')
+        self._modified(f)
+        self.assertIsNone(f._encodings)
+        self.assertFalse(f._p_changed)
+
+    def test_not_smaller(self):
+        f = self._storeFile(b'abcdefghij')
+        self.assertEqual(['br'], sorted(f.getEncodings()))
+
+    def test_invalidated(self):
+        f = self._storeFile(self.text)
+        variant = f.getEncodings()['br']
+        for change in (lambda: setattr(f, 'data', b'new data'),
+                       lambda: f.append(b'more'),
+                       lambda: f.write(0, b'x')):
+            change()
+            self.assertEqual({}, f.getEncodings())
+            self._modified(f)
+            self.assertIsNot(variant, f.getEncodings()['br'])
+            self.assertEqual(b'br:%d' % f.getSize(),
+                             f.getEncodings()['br'].data)
+            variant = f.getEncodings()['br']
+
+    def test_other_modifications(self):
+        f = self._storeFile(self.text)
+        variant = f.getEncodings()['br']
+        self._modified(f, Attributes(IZopeDublinCore, 'title'))
+        self.assertIs(variant, f.getEncodings()['br'])
+        f.contentType = 'application/octet-stream'
+        self._modified(f, Attributes(IFile, 'contentType'))
+        self.assertEqual({}, f.getEncodings())
+
+    def test_chunk_store(self):
+        self.root['store'] = store = zfile.ChunkStore()
+        provideUtility(store, IChunkStore)
+        f = self._storeFile(self.text, storage='tree')
+        # 3 chunks of data, 1 of each variant
+        self.assertEqual(5, len(store))
+        f.data = self.text
+        self.assertEqual(3, len(store))
+        self._modified(f)
+        self.assertEqual(5, len(store))
+        notify(ObjectRemovedEvent(f, self.root, 'file'))
+        self.assertEqual(0, len(store))
+
+    def test_copy(self):
+        self._provideCopyHooks()
+        for storage in ('chunks', 'blob'):
+            f = self._storeFile(self.text, storage=storage)
+            self.root['copy'] = c = copy(f)
+            transaction.commit()
+            self.assertEqual(b'br:%d' % len(self.text),
+                             c.getEncodings()['br'].data)
+            self.assertEqual(f.getEncodings()['gzip'].data,
+                             c.getEncodings()['gzip'].data)
+        # The blob of the variant is shared
+        self.assertIs(f.getEncodings()['gzip']._data,
+                      c.getEncodings()['gzip']._data)
+
+    def test_migrate(self):
+        f = self._storeFile(self.text)
+        encodings = f.getEncodings()
+        migrateFile(f, 'tree')
+        self.assertEqual(encodings, f.getEncodings())
+
+
+class TestDigest(DatabaseTestCase):
+
+    data = bytes(range(256)) * 4
+
+    chunkSize = 100
+
+    def _digest(self, data):
+        return hashlib.sha256(data).hexdigest()
+
+    def test_digest(self):
+        sources = (bytes, BytesIO, lambda data: iter([data[:10], data[10:]]),
+                   zfile.FileChunk, lambda data: data.decode('latin-1'))
+        for storage in ('chunks', 'tree', 'blob'):
+            for source in sources:
+                data = self.data
+                if source is not bytes and source is not BytesIO:
+                    data = data[:128]
+                f = self._storeFile(source(data), storage=storage)
+                self.assertEqual(self._digest(f.data), f.getDigest(),
+                                 (storage, source))
+
+    def test_empty(self):
+        self.assertEqual(self._digest(b''), zfile.File().getDigest())
+
+    def test_append_and_write(self):
+        # The data of a blob is copied anyway, the digest is computed on
+        # the way.
+        f = self._storeFile(BytesIO(self.data), storage='blob')
+        f.append(b'more')
+        self.assertEqual(self._digest(self.data + b'more'), f.getDigest())
+        f.write(10, b'written')
+        self.assertEqual(self._digest(f.data), f.getDigest())
+        f.write(f.getSize() - 2, b'beyond')
+        self.assertEqual(self._digest(f.data), f.getDigest())
+
+    def test_append_and_write_small(self):
+        f = self._storeFile(b'abc')
+        f.append(b'def')
+        self.assertEqual(self._digest(b'abcdef'), f.getDigest())
+        f.write(1, b'B')
+        self.assertEqual(self._digest(b'aBcdef'), f.getDigest())
+
+    def test_append_and_write_chunks(self):
+        # Only the chunks that changed are read, so the digest of all the
+        # data is not known anymore.
+        for storage in ('chunks', 'tree'):
+            for change in (lambda f: f.append(b'more'),
+                           lambda f: f.write(10, b'written')):
+                f = self._storeFile(BytesIO(self.data), storage=storage)
+                change(f)
+                self.assertIsNone(f.getDigest(), storage)
+                migrateFile(f, 'blob')
+                self.assertEqual(self._digest(f.data), f.getDigest())
+
+    def test_not_stored(self):
+        f = self._storeFile(self.data)
+        del f._digest
+        self.assertIsNone(f.getDigest())
+
+    def test_migrate(self):
+        f = self._storeFile(BytesIO(self.data))
+        del f._digest
+        migrateFile(f, 'tree')
+        self.assertEqual(self._digest(self.data), f.getDigest())
+
+
+class TestFileChunkIterator(unittest.TestCase):
+
+    def _makeDB(self):
+        db = DB(MappingStorage())
+        self.addCleanup(db.close)
+        return db
+
+    def _storeChain(self, db, *pieces):
+        tm = transaction.TransactionManager()
+        conn = db.open(transaction_manager=tm)
+        f = zfile.File()
+        conn.root()['file'] = f
+        chunk = None
+        for piece in reversed(pieces):
+            new = zfile.FileChunk(piece)
+            new.next = chunk
+            chunk = new
+        f.data = chunk
+        tm.commit()
+        return conn, f
+
+    def test_iterates_chunks(self):
+        conn, f = self._storeChain(self._makeDB(), b'abc', b'def', b'g')
+        self.addCleanup(conn.close)
+        self.assertEqual([b'abc', b'def', b'g'], list(f.iterData()))
+
+    def test_survives_closed_connection(self):
+        db = self._makeDB()
+        conn, f = self._storeChain(db, b'abc', b'def')
+        it = f.iterData()
+        conn.close()
+        # all connections are back in the pool
+        self.assertEqual([b'abc', b'def'], list(it))
+        self.assertIsNone(it._connection)
+
+    def test_close(self):
+        conn, f = self._storeChain(self._makeDB(), b'abc', b'def')
+        self.addCleanup(conn.close)
+        it = f.iterData()
+        self.assertEqual(b'abc', next(it))
+        self.assertIsNotNone(it._connection)
+        it.close()
+        self.assertIsNone(it._connection)
+        self.assertEqual([], list(it))
+
+    def test_open(self):
+        conn, f = self._storeChain(self._makeDB(), b'abc', b'def', b'g')
+        self.assertIsNone(f.getFilename())
+        fp = f.open()
+        conn.close()
+        # Sequential reads work after the connection has been closed
+        self.assertEqual(b'abcd', fp.read(4))
+        self.assertEqual(b'efg', fp.read())
+        self.assertEqual(b'', fp.read())
+        fp.close()
+        self.assertTrue(fp.closed)
+
+    def test_uncommitted_chain(self):
+        conn, f = self._storeChain(self._makeDB(), b'abc')
+        self.addCleanup(conn.close)
+        self.addCleanup(conn.transaction_manager.abort)
+        f.data = zfile.FileChunk(b'new')
+        it = f.iterData()
+        self.assertEqual([b'new'], list(it))
+        self.assertIsNone(it._connection)
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+
+        class PrefetchingStorage(MappingStorage):
+
+            def prefetch(self, oids, tid):
+                self.prefetched.append(list(oids))
+
+        old_size = zfile.PREFETCHCHUNKS
+        zfile.PREFETCHCHUNKS = 2
+        self.addCleanup(setattr, zfile, 'PREFETCHCHUNKS', old_size)
+        self.storage = PrefetchingStorage()
+        self.storage.prefetched = []
+
+    def _storeFile(self, storage, size=10, chunks=7, layout=None):
+        db = DB(storage)
+        self.addCleanup(db.close)
+        tm = transaction.TransactionManager()
+        conn = db.open(transaction_manager=tm)
+        self.addCleanup(conn.close)
+        conn.root()['file'] = f = zfile.File(chunkSize=size, storage=layout)
+        f.data = iter([b'x' * size * chunks])
+        tm.commit()
+        return f
+
+    def test_no_index(self):
+        # The oids of the chunks of a chain are only known once the
+        # chain has been walked.
+        f = self._storeFile(self.storage)
+        self.assertEqual(b'x' * 70, b''.join(f.iterData()))
+        self.assertEqual([], self.storage.prefetched)
+
+    def test_prefetch(self):
+        f = self._storeFile(self.storage)
+        oids = [chunk._p_oid for chunk in f._getChunkIndex()[1]]
+        it = f.iterData()
+        self.assertEqual(b'x' * 10, next(it))
+        self.assertEqual([oids[1:3]], self.storage.prefetched)
+        self.assertEqual(b'x' * 10, next(it))
+        self.assertEqual([oids[1:3], oids[3:5]], self.storage.prefetched)
+        self.assertEqual(b'x' * 50, b''.join(it))
+        self.assertEqual([oids[1:3], oids[3:5], oids[5:7]],
+                         self.storage.prefetched)
+
+    def test_prefetch_range(self):
+        f = self._storeFile(self.storage)
+        oids = [chunk._p_oid for chunk in f._getChunkIndex()[1]]
+        self.assertEqual(b'x' * 25, b''.join(f.iterData(25, 50)))
+        self.assertEqual([oids[3:5]], self.storage.prefetched)
+
+    def test_prefetch_tree(self):
+        # The oids of the chunks in a tree are known without an index.
+        f = self._storeFile(self.storage, layout='tree')
+        oids = [chunk._p_oid for chunk in f._data.values()]
+        self.assertEqual(b'x' * 45, b''.join(f.iterData(25)))
+        self.assertEqual([oids[3:5], oids[5:7]], self.storage.prefetched)
+
+    def test_zeo(self):
+        # With a client-server storage, the prefetched chunks are loaded
+        # in the background instead of one round-trip per chunk.
+        addr, stop = ZEO.server()
+        self.addCleanup(stop)
+        zfile.PREFETCHCHUNKS = 16
+        client = ZEO.client(addr)
+        f = self._storeFile(client, size=1000, chunks=100)
+        f._getChunkIndex()
+        client._cache.clear()
+
+        loads = []
+        load_before = client._server.load_before
+
+        def counting_load_before(*args):
+            loads.append(args)
+            return load_before(*args)
+
+        client._server.load_before = counting_load_before
+        self.assertEqual(100000, sum(len(piece) for piece in f.iterData()))
+        self.assertLess(len(loads), 50)
+
+        del loads[:]
+        f._v_chunkIndex = None
+        client._cache.clear()
+        self.assertEqual(100000, sum(len(piece) for piece in f.iterData()))
+        self.assertEqual(100, len(loads))
+
+
+class TestTreeStorage(DatabaseTestCase):
+
+    storage = 'tree'
+
+    def test_data(self):
+        f = self._storeFile(BytesIO(b'abcdefghij' * 10 + b'xyz'))
+        self.assertIsInstance(f._data, LOBTree)
+        self.assertEqual(list(range(0, 110, 10)), list(f._data.keys()))
+        self.assertEqual(103, f.getSize())
+        self.conn.cacheMinimize()
+        self.assertEqual(b'abcdefghij' * 10 + b'xyz', f.data)
+
+    def test_small_data(self):
+        f = self._storeFile(b'abc')
+        self.assertEqual([0], list(f._data.keys()))
+        self.assertEqual(b'abc', f.data)
+        self.assertEqual([b'bc'], list(f.iterData(1)))
+        f = self._storeFile(b'')
+        self.assertEqual(0, len(f._data))
+        self.assertEqual(b'', f.data)
+        self.assertEqual(0, f.getSize())
+        self.assertEqual(b'', b''.join(f.iterData()))
+
+    def test_data_from_chain(self):
+        chain = zfile.FileChunk(b'abc')
+        chain.next = zfile.FileChunk(b'def')
+        f = self._storeFile(chain, chunkSize=4)
+        self.assertEqual([0, 4], list(f._data.keys()))
+        self.assertEqual(b'abcdef', f.data)
+
+    def test_copy_to_chunks(self):
+        f = self._storeFile(iter([b'x' * 95]))
+        copy = zfile.File(f._data, storage='chunks')
+        self.assertEqual(b'x' * 95, copy.data)
+
+    def test_iterData(self):
+        f = self._storeFile(BytesIO(b'abcdefghij' * 10))
+        self.assertEqual([b'abcdefghij'] * 10, list(f.iterData()))
+
+    def test_iterData_range(self):
+        f = self._storeFile(BytesIO(b'abcdefghij' * 10))
+        self.conn.cacheMinimize()
+        self.assertEqual([b'fghij', b'abc'], list(f.iterData(75, 83)))
+        self.assertEqual([b'j'], list(f.iterData(99, 1000)))
+        # Only the buckets of the tree are loaded to find the chunks
+        self.assertEqual([None] * 10,
+                         [c._p_changed for c in f._data.values()])
+
+    def test_iterData_uncommitted(self):
+        f = self._storeFile(b'abc')
+        f.data = iter([b'x' * 35])
+        it = f.iterData(5)
+        self.assertIsNone(it._oids)
+        self.assertEqual([b'xxxxx', b'x' * 10, b'x' * 10, b'xxxxx'],
+                         list(it))
+        transaction.commit()
+        it = f.iterData(5)
+        self.assertIsNotNone(it._oids)
+        self.assertEqual(b'x' * 30, b''.join(it))
+
+    def test_open(self):
+        f = self._storeFile(iter([b'abcdefghij' * 3]))
+        fp = f.open()
+        fp.seek(12)
+        self.assertEqual(b'cdefghijab', fp.read(10))
+        fp.close()
+
+    def test_policy(self):
+        provideUtility(zfile.FileStoragePolicy('tree'), IFileStoragePolicy)
+        self.assertEqual([0], list(zfile.File(b'abc')._data.keys()))
+
+
+class TestBlobStorage(DatabaseTestCase):
+
+    storage = 'blob'
+
+    def test_data(self):
+        f = self._storeFile(b'abc' * 100000)
+        self.assertIsInstance(f._data, Blob)
+        self.assertEqual(300000, f.getSize())
+        self.conn.cacheMinimize()
+        self.assertEqual(b'abc' * 100000, f.data)
+
+    def test_data_from_file(self):
+        f = self._storeFile(BytesIO(b'abc' * 100000))
+        self.assertEqual(300000, f.getSize())
+        self.assertEqual(b'abc' * 100000, f.data)
+
+    def test_data_from_iterable(self):
+        f = self._storeFile(iter([b'abc'] * 100000))
+        self.assertEqual(300000, f.getSize())
+        self.assertEqual(b'abc' * 100000, f.data)
+
+    def test_data_from_chunks(self):
+        chunk = zfile.FileChunk(b'abc')
+        chunk.next = zfile.FileChunk(b'def')
+        f = self._storeFile(chunk)
+        self.assertEqual(6, f.getSize())
+        self.assertEqual(b'abcdef', f.data)
+
+    def test_iterData(self):
+        f = self._storeFile(b'a' * zfile.MAXCHUNKSIZE + b'b')
+        it = f.iterData()
+        self.conn.close()
+        self.assertEqual([b'a' * zfile.MAXCHUNKSIZE, b'b'], list(it))
+        self.assertIsNone(it._file)
+
+    def test_iterData_range(self):
+        f = self._storeFile(b'0123456789')
+        self.assertEqual([b'345'], list(f.iterData(3, 6)))
+        self.assertEqual([b'789'], list(f.iterData(7)))
+
+    def test_iterData_uncommitted(self):
+        f = self._storeFile(b'0123456789')
+        f.data = b'abc'
+        self.assertEqual([b'abc'], list(f.iterData()))
+
+    def test_open(self):
+        f = self._storeFile(b'0123456789')
+        with f.open() as fp:
+            self.assertEqual(fp.name, f.getFilename())
+            fp.seek(5)
+            self.assertEqual(b'56789', fp.read())
+
+    def test_open_uncommitted(self):
+        f = self._storeFile(b'0123456789')
+        f.data = b'abc'
+        self.assertIsNone(f.getFilename())
+        with f.open() as fp:
+            self.assertEqual(b'abc', fp.read())
+
+    def test_image(self):
+        image = Image(zptlogo, storage='blob')
+        self.assertIsInstance(image._data, Blob)
+        self.assertEqual('image/gif', image.contentType)
+        self.assertEqual((16, 16), image.getImageSize())
+
+    def test_factory(self):
+        factory = FileFactory(None)
+        factory.storage = 'blob'
+        f = factory('hello.txt', 'text/plain', b'Hello')
+        self.assertIsInstance(f._data, Blob)
+        self.assertEqual(b'Hello', f.data)
+
+
 class TestFileChunk(unittest.TestCase):
 
     def test_getitem(self):
@@ -78,5 +1412,7 @@ class TestFileChunk(unittest.TestCase):
 def test_suite():
     return unittest.TestSuite((
         unittest.defaultTestLoader.loadTestsFromName(__name__),
-        doctest.DocTestSuite('zope.app.file.file')
+        doctest.DocTestSuite('zope.app.file.file',
+                             setUp=setUp, tearDown=tearDown,
+                             optionflags=doctest.ELLIPSIS)
     ))
@@ -56,6 +56,86 @@ And now it is modified.""")
 Authorization: Basic globalmgr:globalmgrpw""")
         self.assertEqual(response.getBody(), b"And now it is modified.")
 
+    def test_put_content_range(self):
+        response = http(b"""PUT /testfile.txt HTTP/1.1
+Authorization: Basic globalmgr:globalmgrpw
+Content-Length: 20
+Content-Type: text/plain
+
+This is just a test.""")
+        self.assertEqual(response.getStatus(), 201)
+
+        # append to it
+        response = http(b"""PUT /testfile.txt HTTP/1.1
+Authorization: Basic globalmgr:globalmgrpw
+Content-Length: 12
+Content-Range: bytes 20-31/*
+
+ And a test.""")
+        self.assertEqual(response.getStatus(), 200)
+
+        response = http(b"""GET /testfile.txt HTTP/1.1
+Authorization: Basic globalmgr:globalmgrpw""")
+        self.assertEqual(response.getBody(),
+                         b"This is just a test. And a test.")
+
+        # or change a part of it
+        response = http(b"""PUT /testfile.txt HTTP/1.1
+Authorization: Basic globalmgr:globalmgrpw
+Content-Length: 4
+Content-Range: bytes 0-3/32
+
+That""")
+        self.assertEqual(response.getStatus(), 200)
+
+        # ranges starting beyond the end of the data are refused
+        response = http(b"""PUT /testfile.txt HTTP/1.1
+Authorization: Basic globalmgr:globalmgrpw
+Content-Length: 4
+Content-Range: bytes 33-36/*
+
+More""")
+        self.assertEqual(response.getStatus(), 416)
+        self.assertEqual(response.getHeader("Content-Range"), "bytes */32")
+
+        # as are ranges that don't match the body
+        response = http(b"""PUT /testfile.txt HTTP/1.1
+Authorization: Basic globalmgr:globalmgrpw
+Content-Length: 4
+Content-Range: bytes 32-40/*
+
+More""")
+        self.assertEqual(response.getStatus(), 400)
+
+        response = http(b"""PUT /testfile.txt HTTP/1.1
+Authorization: Basic globalmgr:globalmgrpw
+Content-Length: 4
+Content-Range: bytes 32-/*
+
+More""")
+        self.assertEqual(response.getStatus(), 400)
+
+        response = http(b"""GET /testfile.txt HTTP/1.1
+Authorization: Basic globalmgr:globalmgrpw""")
+        self.assertEqual(response.getBody(),
+                         b"That is just a test. And a test.")
+
+    def test_put_content_range_unauthorized(self):
+        response = http(b"""PUT /testfile.txt HTTP/1.1
+Authorization: Basic globalmgr:globalmgrpw
+Content-Length: 4
+Content-Type: text/plain
+
+Test""")
+        self.assertEqual(response.getStatus(), 201)
+
+        response = http(b"""PUT /testfile.txt HTTP/1.1
+Content-Length: 4
+Content-Range: bytes 4-7/*
+
+More""", handle_errors=True)
+        self.assertEqual(response.getStatus(), 401)
+
 
 def test_suite():
     return unittest.defaultTestLoader.loadTestsFromName(__name__)
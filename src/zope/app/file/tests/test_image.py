@@ -14,8 +14,11 @@
 """Test Image content component
 
 """
+import struct
+import time
 import unittest
 
+from zope.interface import implementer
 from zope.interface.verify import verifyClass
 
 from zope.app.file.file import File
@@ -25,6 +28,7 @@ from zope.app.file.image import FileFactory
 from zope.app.file.image import Image
 from zope.app.file.image import ImageSized
 from zope.app.file.interfaces import IImage
+from zope.app.file.interfaces import IImageFormat
 
 
 zptlogo = (
@@ -48,6 +52,27 @@ zptlogo = (
 )
 
 
+def countHeaderReads(test):
+    # Count how often the header of an image is read during `test`.
+    # Byte strings are read without a header.
+    from zope.app.file import image
+    reads = []
+
+    def count(name):
+        getImageInfo = getattr(image, name)
+
+        def countingGetImageInfo(header):
+            reads.append(header)
+            return getImageInfo(header)
+
+        setattr(image, name, countingGetImageInfo)
+        test.addCleanup(setattr, image, name, getImageInfo)
+
+    count('_getImageInfo')
+    count('_getBufferImageInfo')
+    return reads
+
+
 class TestImage(unittest.TestCase):
 
     def _makeImage(self, *args, **kw):
@@ -74,6 +99,80 @@ class TestImage(unittest.TestCase):
         self.assertEqual(image.contentType, 'image/gif')
         self.assertEqual(image.getImageSize(), (16, 16))
 
+    def testHeaderReadOnce(self):
+        from io import BytesIO
+        reads = countHeaderReads(self)
+        for data in (zptlogo, BytesIO(zptlogo), iter([zptlogo[:20],
+                                                      zptlogo[20:]])):
+            del reads[:]
+            image = self._makeImage(data)
+            self.assertEqual(1, len(reads))
+            self.assertEqual('image/gif', image.contentType)
+            self.assertEqual((16, 16), image.getImageSize())
+            del reads[:]
+            image.data = data if isinstance(data, bytes) else BytesIO(
+                zptlogo)
+            self.assertEqual(1, len(reads))
+            self.assertEqual((16, 16), image.getImageSize())
+
+    def testWriteReadsHeaderOnce(self):
+        reads = countHeaderReads(self)
+        image = self._makeImage(zptlogo)
+        for offset, data in [(0, b'GIF87a'), (6, b'\x20\x00'),
+                             (len(zptlogo) - 1, b';;')]:
+            del reads[:]
+            image.write(offset, data)
+            self.assertEqual(1, len(reads), offset)
+        self.assertEqual((32, 16), image.getImageSize())
+
+    def testWriteAfterHeader(self):
+        reads = countHeaderReads(self)
+        data = zptlogo + b'\x00' * 20000
+        for storage in ('chunks', 'tree', 'blob'):
+            image = self._makeImage(
+                iter([data[i:i + 1000] for i in range(0, len(data), 1000)]),
+                storage=storage, chunkSize=1000)
+            # The header is read in chunks or blocks of the stored data
+            self.assertLess(image._headerSize, 10000, storage)
+            del reads[:]
+            image.write(10000, b'\x01' * 10)
+            self.assertEqual([], reads, storage)
+            image.write(4, b'9a\x20\x00')
+            self.assertEqual(1, len(reads), storage)
+            # Writing into the header and beyond the end
+            image.write(6, b'\x20\x00\x10\x00' + b'\x00' * len(data))
+            self.assertEqual(2, len(reads), storage)
+            self.assertEqual((32, 16), image.getImageSize())
+
+    def testInfo(self):
+        reads = countHeaderReads(self)
+        image = self._makeImage(zptlogo, info=('image/x-logo', 1, 2))
+        self.assertEqual([], reads)
+        self.assertEqual('image/x-logo', image.contentType)
+        self.assertEqual((1, 2), image.getImageSize())
+        # It is only used for the data passed to the constructor.
+        image.data = zptlogo
+        self.assertEqual((16, 16), image.getImageSize())
+
+    def testStoredByType(self):
+        # The type of the image is known before its data is stored.
+        from zope.component import provideUtility
+        from zope.component.testing import setUp
+        from zope.component.testing import tearDown
+
+        from zope.app.file.file import CompressedChunk
+        from zope.app.file.file import FileStoragePolicy
+        from zope.app.file.interfaces import IFileStoragePolicy
+        setUp()
+        self.addCleanup(tearDown)
+        provideUtility(FileStoragePolicy(compressedTypes=('*+xml',)),
+                       IFileStoragePolicy)
+        svg = b'<svg width="10" height="10">' + b'<rect/>' * 100 + b'</svg>'
+        image = self._makeImage(svg)
+        self.assertEqual('image/svg+xml', image.contentType)
+        self.assertIsInstance(image._data, CompressedChunk)
+        self.assertEqual(svg, image.data)
+
     def testInterface(self):
         self.assertTrue(IImage.implementedBy(Image))
         self.assertTrue(verifyClass(IImage, Image))
@@ -122,6 +221,13 @@ class TestFileFactory(unittest.TestCase):
         f = factory("spam.txt", "", zptlogo)
         self.assertIsInstance(f, Image)
 
+    def test_header_read_once(self):
+        reads = countHeaderReads(self)
+        f = FileFactory(None)("spam.txt", "", zptlogo)
+        self.assertEqual(1, len(reads))
+        self.assertEqual('image/gif', f.contentType)
+        self.assertEqual((16, 16), f.getImageSize())
+
     def test_text(self):
         factory = FileFactory(None)
         f = factory("spam.txt", "", b"hello world")
@@ -214,6 +320,409 @@ class TestGetImageInfo(unittest.TestCase):
         self.assertEqual(w, 1308)
         self.assertEqual(h, 368)
 
+    def test_getImageInfo_stream(self):
+        from io import BytesIO
+        f = BytesIO(b'xx' + zptlogo)
+        f.seek(2)
+        self.assertEqual(('image/gif', 16, 16), self._info(f))
+        self.assertEqual(2, f.tell())
+
+    def test_getImageInfo_other(self):
+        self.assertEqual(('', -1, -1), self._info(iter([zptlogo])))
+        self.assertEqual(('', -1, -1), self._info(b''))
+
+    def test_getImageInfo_truncated_jpeg(self):
+        self.assertEqual(('image/jpeg', -1, -1),
+                         self._info(b'\xff\xd8\xff\xe0\x10\x00JFIF'))
+
+    def _jpeg(self, *segments):
+        import struct
+        data = b'\xff\xd8'
+        for marker, payload in segments:
+            data += struct.pack('>BBH', 0xFF, marker, len(payload) + 2)
+            data += payload
+        return data
+
+    # Precision, height 600, width 800 and one component
+    frame = b'\x08\x02\x58\x03\x20\x01\x01\x11\x00'
+
+    def test_getImageInfo_jpeg_frames(self):
+        for marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                       0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            self.assertEqual(('image/jpeg', 800, 600),
+                             self._info(self._jpeg((marker, self.frame))),
+                             hex(marker))
+
+    def test_getImageInfo_jpeg_no_frames(self):
+        # DHT, JPG and DAC segments are skipped
+        data = self._jpeg((0xC4, b'\x00' * 20), (0xC8, b''),
+                          (0xCC, b'\x10\x05'), (0xC2, self.frame))
+        self.assertEqual(('image/jpeg', 800, 600), self._info(data))
+
+    def test_getImageInfo_jpeg_markers(self):
+        # Fill bytes, markers without a segment and large segments
+        data = self._jpeg((0xE1, b'E' * 0xFFF0), (0xE2, b'I' * 0xFFF0))
+        data += b'\xff\xff\xff\x01\xff\xd0' + self._jpeg(
+            (0xC0, self.frame))[2:]
+        self.assertEqual(('image/jpeg', 800, 600), self._info(data))
+
+    def test_getImageInfo_jpeg_garbage(self):
+        # Bytes which are no marker are skipped, across blocks, too
+        data = self._jpeg((0xE0, b'JFIF\x00')) + b'\x00' * 20000
+        data += self._jpeg((0xC0, self.frame))[2:]
+        self.assertEqual(('image/jpeg', 800, 600), self._info(data))
+        self.assertEqual(('image/jpeg', -1, -1),
+                         self._info(b'\xff\xd8' + b'\x00' * 20000))
+
+    def test_getImageInfo_jpeg_scan_before_frame(self):
+        data = self._jpeg((0xDA, b'\x00' * 10), (0xC0, self.frame))
+        self.assertEqual(('image/jpeg', -1, -1), self._info(data))
+        data = self._jpeg((0xC0, self.frame))[:-5]
+        self.assertEqual(('image/jpeg', -1, -1), self._info(data))
+
+    def test_getImageInfo_jpeg_pieces(self):
+        # Byte strings are scanned at once, the pieces of other data as
+        # they come.  Both find the same.
+        from zope.app.file.file import FileChunk
+        jpegs = [
+            self._jpeg((0xE0, b'JFIF\x00'), (0xC4, b'\x00' * 20),
+                       (0xC2, self.frame)),
+            self._jpeg((0xE1, b'E' * 300)) + b'\xff\xff\xff\x01\xff\xd0'
+            + b'\x00' * 30 + self._jpeg((0xC0, self.frame))[2:],
+            self._jpeg((0xE0, b'JFIF\x00'), (0xC0, self.frame))[:-3],
+            self._jpeg((0xE1, b'E' * 300))[:-30],
+        ]
+        for data in jpegs:
+            expected = self._info(data)
+            for size in (1, 3, 7, 64):
+                chain = None
+                for pos in reversed(range(0, len(data), size)):
+                    chunk = FileChunk(data[pos:pos + size])
+                    chunk.next = chain
+                    chain = chunk
+                self.assertEqual(expected, self._info(chain), size)
+
+    def test_readImageInfo_chunk(self):
+        from zope.app.file.file import FileChunk
+        from zope.app.file.image import _BufferHeader
+        from zope.app.file.image import _readImageInfo
+        from zope.app.file.interfaces import IImageHeader
+        self.assertTrue(verifyClass(IImageHeader, _BufferHeader))
+        data = self._jpeg((0xC0, self.frame)) + b'x' * 100
+        self.assertEqual((('image/jpeg', 800, 600), len(data)),
+                         _readImageInfo(FileChunk(data)))
+        self.assertEqual((('image/gif', 16, 16), len(zptlogo)),
+                         _readImageInfo(FileChunk(zptlogo)))
+
+
+def box(kind, payload, version=None, flags=0):
+    # A box of an ISO base media file, a full box if it has a version.
+    if version is not None:
+        payload = bytes([version]) + flags.to_bytes(3, 'big') + payload
+    return struct.pack('>L4s', len(payload) + 8, kind) + payload
+
+
+@implementer(IImageFormat)
+class QOIFormat:
+    """A format registered in the tests"""
+
+    signatures = (b'qoif',)
+
+    def getImageInfo(self, header):
+        data = header.read(12)
+        if len(data) < 12:
+            return None
+        width, height = struct.unpack('>LL', data[4:])
+        return 'image/qoi', width, height
+
+
+class TestImageFormats(unittest.TestCase):
+
+    def _info(self, data):
+        from zope.app.file.image import getImageInfo
+        return getImageInfo(data)
+
+    def test_webp(self):
+        riff = b'RIFF\x00\x10\x00\x00WEBP'
+        lossy = riff + b'VP8 \x00\x10\x00\x00\x10\x02\x00\x9d\x01\x2a' \
+            + struct.pack('<HH', 0x4000 | 640, 480)
+        self.assertEqual(('image/webp', 640, 480), self._info(lossy))
+        bits = (640 - 1) | (480 - 1) << 14
+        lossless = riff + b'VP8L\x00\x10\x00\x00\x2f' \
+            + struct.pack('<L', bits) + b'\x00' * 5
+        self.assertEqual(('image/webp', 640, 480), self._info(lossless))
+        extended = riff + b'VP8X\x0a\x00\x00\x00\x10\x00\x00\x00' \
+            + (640 - 1).to_bytes(3, 'little') + (480 - 1).to_bytes(3, 'little')
+        self.assertEqual(('image/webp', 640, 480), self._info(extended))
+        self.assertEqual(('image/webp', -1, -1), self._info(riff))
+        self.assertEqual(('', -1, -1),
+                         self._info(b'RIFF\x00\x10\x00\x00WAVEfmt '))
+
+    def _avif(self, primary=True, brand=b'avif'):
+        ipco = box(b'ipco', box(b'ispe', struct.pack('>LL', 160, 120), 0)
+                   + box(b'pixi', b'\x00\x03\x08\x08\x08', 0)
+                   + box(b'ispe', struct.pack('>LL', 1920, 1080), 0))
+        # The thumbnail (1) has the first size, the image (2) the second.
+        ipma = box(b'ipma', struct.pack('>LHBBHBBB', 2, 1, 1, 0x81,
+                                        2, 2, 0x82, 0x83), 0)
+        meta = box(b'hdlr', b'\x00' * 4 + b'pict' + b'\x00' * 13, 0)
+        if primary:
+            meta += box(b'pitm', struct.pack('>H', 2), 0)
+        meta += box(b'iprp', ipco + ipma)
+        return (box(b'ftyp', brand + b'\x00\x00\x00\x00mif1miaf')
+                + box(b'meta', meta, 0) + box(b'mdat', b'x' * 100))
+
+    def test_avif(self):
+        self.assertEqual(('image/avif', 1920, 1080), self._info(self._avif()))
+        self.assertEqual(('image/avif', 160, 120),
+                         self._info(self._avif(primary=False)))
+        self.assertEqual(('', -1, -1), self._info(self._avif(brand=b'heic')))
+        # Other data with the signature has no complete file type box.
+        self.assertEqual(('', -1, -1), self._info(self._avif()[:20]))
+        self.assertEqual(('', -1, -1), self._info(
+            b'\x00\x00\x00\x12ftypavif' + b'\x00' * 60))
+        # The meta box may come after other boxes
+        data = self._avif()
+        data = data[:24] + box(b'free', b'\x00' * 100) + data[24:]
+        self.assertEqual(('image/avif', 1920, 1080), self._info(data))
+        self.assertEqual(('image/avif', -1, -1), self._info(data[:24]))
+
+    def test_tiff(self):
+        for order, signature in (('<', b'II*\x00'), ('>', b'MM\x00*')):
+            entries = [(254, 4, 1, 0), (256, 3, 1, 800), (257, 4, 1, 600)]
+            ifd = struct.pack(order + 'H', len(entries))
+            for tag, kind, count, value in entries:
+                ifd += struct.pack(order + 'HHL', tag, kind, count)
+                ifd += struct.pack(order + ('H2x' if kind == 3 else 'L'),
+                                   value)
+            # The directory comes after the image data
+            data = signature + struct.pack(order + 'L', 108)
+            data += b'\x00' * 100 + ifd
+            self.assertEqual(('image/tiff', 800, 600), self._info(data))
+            self.assertEqual(('image/tiff', -1, -1), self._info(data[:50]))
+
+    def test_ico(self):
+        data = b'\x00\x00\x01\x00\x03\x00'
+        for size in (16, 0, 32):
+            data += bytes([size, size]) + b'\x00' * 14
+        self.assertEqual(('image/vnd.microsoft.icon', 256, 256),
+                         self._info(data))
+        self.assertEqual(('', -1, -1),
+                         self._info(b'\x00\x00\x01\x00\x00\x00'))
+        # Other data with the signature has no valid icon directory.
+        self.assertEqual(('', -1, -1), self._info(data[:12]))
+        self.assertEqual(('', -1, -1),
+                         self._info(data[:9] + b'\x01' + data[10:]))
+        self.assertEqual(('', -1, -1),
+                         self._info(data[:10] + b'\x02' + data[11:]))
+        self.assertEqual(('', -1, -1),
+                         self._info(b'\x00\x00\x01\x00\x01\x00' + bytes(
+                             range(16))))
+
+    def test_svg(self):
+        svg = ('<svg xmlns="http://www.w3.org/2000/svg" stroke-width="2"'
+               ' width="120" height="80.4px">')
+        self.assertEqual(('image/svg+xml', 120, 80),
+                         self._info(svg.encode()))
+        prolog = (
+            '\ufeff<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!-- Created with an editor -->\n'
+            '<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN"'
+            ' "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd" [\n'
+            '  <!ENTITY ns "http://www.w3.org/2000/svg">\n]>\n')
+        self.assertEqual(('image/svg+xml', 120, 80),
+                         self._info((prolog + svg).encode()))
+        self.assertEqual(
+            ('image/svg+xml', 300, 150),
+            self._info(b'<svg viewBox="0 0 300,150"><rect/></svg>'))
+        self.assertEqual(
+            ('image/svg+xml', 600, 300),
+            self._info(b'<svg height="300" viewBox="0 0 300 150"></svg>'))
+        self.assertEqual(
+            ('image/svg+xml', -1, -1),
+            self._info(b'<svg:svg width="100%" height="2em"></svg:svg>'))
+        self.assertEqual(('', -1, -1),
+                         self._info(b'<?xml version="1.0"?><rss></rss>'))
+        self.assertEqual(('', -1, -1), self._info(b'<!DOCTYPE html><html>'))
+        self.assertEqual(
+            ('image/svg+xml', 12, 34),
+            self._info(b"<!DOCTYPE svg><svg width=' 12 ' height='3.4e1'>"))
+        self.assertEqual(('', -1, -1), self._info(b'<?xml version="1.0"'))
+
+    def test_svg_pathological(self):
+        # The time to find the size grows only with the length of the data
+        # looked at, however the prolog and the attributes are nested.
+        start = time.perf_counter()
+        for data in [b'<!--' + b'<!---->' * 1000 + b'x',
+                     b'<?a?>' * 1600 + b'<x',
+                     b'<!DOCTYPE svg [' + b'] ' * 4000,
+                     b'<svg width="' + b' ' * 8000 + b'>',
+                     b'<svg width="1' + b' ' * 8000 + b'1">',
+                     b'<svg width="' + b'1' * 8000 + b'x">']:
+            self._info(data)
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_registered(self):
+        from zope.component import getGlobalSiteManager
+        from zope.component.testing import setUp
+        from zope.component.testing import tearDown
+
+        @implementer(IImageFormat)
+        class BetterGIFFormat:
+            signatures = (b'GIF8',)
+
+            def getImageInfo(self, header):
+                return None
+
+        data = b'qoif\x00\x00\x00\x20\x00\x00\x00\x10\x04\x00'
+        setUp()
+        self.addCleanup(tearDown)
+        self.assertEqual(('', -1, -1), self._info(data))
+        registry = getGlobalSiteManager()
+        registry.registerUtility(QOIFormat(), IImageFormat, 'qoi')
+        registry.registerUtility(BetterGIFFormat(), IImageFormat, 'gif')
+        self.assertEqual(('image/qoi', 32, 16), self._info(data))
+        self.assertEqual(('', -1, -1), self._info(data[:8]))
+        # Formats which don't recognize the data leave it to the others.
+        self.assertEqual(('image/gif', 16, 16), self._info(zptlogo))
+        registry.unregisterUtility(provided=IImageFormat, name='qoi')
+        self.assertEqual(('', -1, -1), self._info(data))
+        registry.registerUtility(QOIFormat(), IImageFormat, 'qoi')
+        self.assertEqual(('image/qoi', 32, 16), self._info(data))
+        tearDown()
+        self.assertEqual(('', -1, -1), self._info(data))
+
+    def test_registered_table_cached(self):
+        from zope.component.testing import setUp
+        from zope.component.testing import tearDown
+
+        from zope.app.file import image
+        setUp()
+        self.addCleanup(tearDown)
+        self.assertEqual(('image/gif', 16, 16), self._info(zptlogo))
+        table = image._formatTable
+        for i in range(3):
+            self.assertEqual(('image/gif', 16, 16), self._info(zptlogo))
+        self.assertIs(table, image._formatTable)
+
+    def test_registered_persistent(self):
+        import transaction
+        from ZODB.DB import DB
+        from ZODB.DemoStorage import DemoStorage
+        from zope.component import getGlobalSiteManager
+        from zope.component import getSiteManager
+        from zope.component.persistentregistry import PersistentComponents
+        from zope.component.testing import setUp
+        from zope.component.testing import tearDown
+
+        setUp()
+        self.addCleanup(tearDown)
+        db = DB(DemoStorage())
+        self.addCleanup(db.close)
+        conn = db.open()
+        self.addCleanup(conn.close)
+        self.addCleanup(transaction.abort)
+        conn.root()['registry'] = registry = PersistentComponents(
+            bases=(getGlobalSiteManager(),))
+        transaction.commit()
+        getSiteManager.sethook(lambda context=None: registry)
+        self.addCleanup(getSiteManager.reset)
+
+        data = b'qoif\x00\x00\x00\x20\x00\x00\x00\x10\x04\x00'
+        self.assertEqual(('', -1, -1), self._info(data))
+        # The table doesn't outlive aborted registrations.
+        registry.registerUtility(QOIFormat(), IImageFormat, 'qoi')
+        self.assertEqual(('image/qoi', 32, 16), self._info(data))
+        transaction.abort()
+        self.assertEqual(('', -1, -1), self._info(data))
+
+        # Nor registrations committed by another connection.
+        tm = transaction.TransactionManager()
+        other = db.open(transaction_manager=tm)
+        self.addCleanup(other.close)
+        other.root()['registry'].registerUtility(
+            QOIFormat(), IImageFormat, 'qoi')
+        tm.commit()
+        transaction.abort()
+        self.assertEqual(('image/qoi', 32, 16), self._info(data))
+        other.root()['registry'].unregisterUtility(
+            provided=IImageFormat, name='qoi')
+        tm.commit()
+        transaction.abort()
+        self.assertEqual(('', -1, -1), self._info(data))
+
+    def test_factory(self):
+        factory = FileFactory(None)
+        f = factory('photo', '', self._avif())
+        self.assertIsInstance(f, Image)
+        self.assertEqual('image/avif', f.contentType)
+        self.assertEqual((1920, 1080), f.getImageSize())
+
+
+class TestImageHeader(unittest.TestCase):
+    """Only the chunks with the header of an image are loaded."""
+
+    # A JPEG with a large application segment before the frame header
+    jpeg = (b'\xff\xd8\xff\xe1\xff\xff' + b'x' * 0xfffd
+            + b'\xff\xc0\x00\x11\x08\x04\x80\x08\x00' + b'y' * 200000)
+
+    def setUp(self):
+        import transaction
+        from ZODB.DB import DB
+        from ZODB.DemoStorage import DemoStorage
+        db = DB(DemoStorage())
+        self.addCleanup(db.close)
+        self.conn = db.open()
+        self.addCleanup(self.conn.close)
+        self.addCleanup(transaction.abort)
+
+    def _storeImage(self, storage):
+        from io import BytesIO
+
+        import transaction
+        self.conn.root()['image'] = image = Image(storage=storage,
+                                                  chunkSize=1 << 14)
+        image.data = BytesIO(self.jpeg)
+        transaction.commit()
+        self.conn.cacheMinimize()
+        return image
+
+    def _loaded(self, chunks):
+        return [i for i, chunk in enumerate(chunks)
+                if chunk._p_changed is not None]
+
+    def test_chain(self):
+        image = self._storeImage('chunks')
+        chunks = image._getChunkIndex()[1]
+        self.conn.cacheMinimize()
+        image._updateImageInfo()
+        self.assertEqual((2048, 1152), image.getImageSize())
+        self.assertEqual('image/jpeg', image.contentType)
+        self.assertEqual([], self._loaded(chunks[6:]))
+
+    def test_tree(self):
+        image = self._storeImage('tree')
+        chunks = list(image._data.values())
+        image._updateImageInfo()
+        self.assertEqual((2048, 1152), image.getImageSize())
+        self.assertEqual([], self._loaded(chunks[6:]))
+
+    def test_view(self):
+        from zope.app.file.image import _ImageHeader
+        from zope.app.file.interfaces import IImageHeader
+        self.assertTrue(verifyClass(IImageHeader, _ImageHeader))
+        header = _ImageHeader(iter([b'abcd', b'efgh', b'ij']))
+        # The data within a piece isn't copied.
+        header.skip(1)
+        buffer, pos = header.view(2)
+        self.assertEqual((b'abcd', 1), (buffer, pos))
+        buffer, pos = header.view(5)
+        self.assertEqual(b'bcdefgh', buffer[pos:])
+        header.skip(6)
+        buffer, pos = header.view(4)
+        self.assertEqual(b'hij', buffer[pos:])
+        self.assertEqual(b'h', header.read(1))
+
 
 def test_suite():
     return unittest.defaultTestLoader.loadTestsFromName(__name__)
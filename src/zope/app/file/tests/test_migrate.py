@@ -0,0 +1,190 @@
+##############################################################################
+#
+# Copyright (c) 2026 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Test the migration of file data to other storage layouts.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+
+import transaction
+from BTrees.LOBTree import LOBTree
+from persistent.mapping import PersistentMapping
+from ZODB.DB import DB
+from ZODB.FileStorage import FileStorage
+from ZODB.POSException import ConflictError
+
+from zope.app.file import file as zfile
+from zope.app.file import migrate
+from zope.app.file.image import Image
+from zope.app.file.tests.test_image import zptlogo
+
+
+class TestMigrate(unittest.TestCase):
+
+    def setUp(self):
+        old_size = zfile.MAXCHUNKSIZE
+        zfile.MAXCHUNKSIZE = 10
+        self.addCleanup(setattr, zfile, 'MAXCHUNKSIZE', old_size)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.db = self._openDB()
+        self.addCleanup(self.db.close)
+
+    def _openDB(self, name='Data'):
+        return DB(FileStorage(os.path.join(self.tmp, name + '.fs'),
+                              blob_dir=os.path.join(self.tmp, name)))
+
+    def _populate(self, db=None):
+        conn = (db or self.db).open()
+        root = conn.root()
+        root['small'] = zfile.File(b'abc', 'text/plain')
+        root['inline'] = zfile.File(BytesIO(b'def'), 'text/plain')
+        root['other'] = PersistentMapping()
+        root['chain'] = chain = zfile.File(contentType='text/plain')
+        chain.data = BytesIO(b'x' * 95)
+        root['image'] = image = Image(zptlogo)
+        image.contentType = 'image/x-custom'
+        root['tree'] = zfile.File(b'y' * 25, storage='tree')
+        transaction.commit()
+        conn.close()
+
+    def _check(self, conn, layout='tree'):
+        root = conn.root()
+        for name, data in [('small', b'abc'), ('inline', b'def'),
+                           ('chain', b'x' * 95),
+                           ('image', zptlogo), ('tree', b'y' * 25)]:
+            f = root[name]
+            self.assertEqual(layout, migrate.getLayout(f), name)
+            self.assertEqual(data, f.data)
+            self.assertEqual(len(data), f.getSize())
+
+    def test_migrate_tree(self):
+        self._populate()
+        self.assertEqual(4, migrate.migrate(self.db, 'tree', batchSize=2))
+        conn = self.db.open()
+        self.addCleanup(conn.close)
+        self._check(conn)
+        root = conn.root()
+        self.assertIsInstance(root['chain']._data, LOBTree)
+        self.assertEqual(list(range(0, 95, 10)),
+                         list(root['chain']._data.keys()))
+        self.assertEqual('text/plain', root['chain'].contentType)
+        # The layout of a file is migrated, not its storage mode
+        self.assertNotIn('_storage', root['chain'].__dict__)
+        self.assertEqual('tree', root['tree']._storage)
+        # The image is left alone otherwise
+        self.assertEqual('image/x-custom', root['image'].contentType)
+        self.assertEqual((16, 16), root['image'].getImageSize())
+        self.assertEqual(b'x' * 10, b''.join(root['chain'].iterData(40, 50)))
+
+    def test_migrate_blob(self):
+        self._populate()
+        self.assertEqual(5, migrate.migrate(self.db, 'blob'))
+        conn = self.db.open()
+        self.addCleanup(conn.close)
+        self._check(conn, 'blob')
+        self.assertIsNotNone(conn.root()['chain'].getFilename())
+
+    def test_migrate_inline(self):
+        self._populate()
+        self.assertEqual(2, migrate.migrate(self.db, 'chunks'))
+        conn = self.db.open()
+        self.addCleanup(conn.close)
+        self._check(conn, 'chunks')
+        self.assertIsInstance(conn.root()['inline']._data, zfile.FileChunk)
+
+    def test_nothing_to_migrate(self):
+        self._populate()
+        migrate.migrate(self.db, 'tree')
+        self.assertEqual(0, migrate.migrate(self.db, 'tree'))
+
+    def test_resume(self):
+        self._populate()
+        conn = self.db.open()
+        self.addCleanup(conn.close)
+        root = conn.root()
+        start = root['image']._p_oid
+        self.assertEqual(1, migrate.migrate(self.db, 'tree', start=start))
+        conn.sync()
+        self.assertEqual('chunks', migrate.getLayout(root['chain']))
+        self.assertEqual('tree', migrate.getLayout(root['image']))
+
+    def test_retry_on_conflict(self):
+        self._populate()
+        commit = transaction.TransactionManager.commit
+        conflicts = []
+
+        def conflictingCommit(tm):
+            if len(conflicts) < 2:
+                conflicts.append(tm)
+                raise ConflictError()
+            return commit(tm)
+
+        transaction.TransactionManager.commit = conflictingCommit
+        try:
+            self.assertEqual(4, migrate.migrate(self.db, 'tree',
+                                                retryDelay=0))
+        finally:
+            transaction.TransactionManager.commit = commit
+        self.assertEqual(2, len(conflicts))
+        conn = self.db.open()
+        self.addCleanup(conn.close)
+        self._check(conn)
+
+    def test_give_up_on_conflicts(self):
+        self._populate()
+        commit = transaction.TransactionManager.commit
+
+        def conflictingCommit(tm):
+            raise ConflictError()
+
+        transaction.TransactionManager.commit = conflictingCommit
+        try:
+            with self.assertRaises(ConflictError):
+                migrate.migrate(self.db, 'tree', retries=1, retryDelay=0)
+        finally:
+            transaction.TransactionManager.commit = commit
+        conn = self.db.open()
+        self.addCleanup(conn.close)
+        self.assertEqual('chunks', migrate.getLayout(conn.root()['chain']))
+
+    def test_unsupported_storage(self):
+        from ZODB.MappingStorage import MappingStorage
+        db = DB(MappingStorage())
+        self.addCleanup(db.close)
+        with self.assertRaises(ValueError):
+            migrate.migrate(db)
+
+    def test_main(self):
+        db = self._openDB('Main')
+        self._populate(db)
+        db.close()
+        config = os.path.join(self.tmp, 'zodb.conf')
+        with open(config, 'w') as f:
+            f.write('<zodb>\n  <filestorage>\n    path %s\n'
+                    '    blob-dir %s\n  </filestorage>\n</zodb>\n' % (
+                        os.path.join(self.tmp, 'Main.fs'),
+                        os.path.join(self.tmp, 'Main')))
+        migrate.main(['--storage', 'tree', '-b', '1', config])
+        db = self._openDB('Main')
+        self.addCleanup(db.close)
+        conn = db.open()
+        self.addCleanup(conn.close)
+        self._check(conn)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,237 @@
+##############################################################################
+#
+# Copyright (c) 2026 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Test the scaled versions of images.
+"""
+import struct
+import unittest
+
+from zope.annotation.attribute import AttributeAnnotations
+from zope.annotation.interfaces import IAnnotations
+from zope.annotation.interfaces import IAttributeAnnotatable
+from zope.component import provideAdapter
+from zope.component import provideHandler
+from zope.component import provideUtility
+from zope.component.event import objectEventNotify
+from zope.component.testing import setUp
+from zope.component.testing import tearDown
+from zope.event import notify
+from zope.interface import alsoProvides
+from zope.interface import implementer
+from zope.interface.interfaces import ComponentLookupError
+from zope.interface.verify import verifyObject
+from zope.lifecycleevent import Attributes
+from zope.lifecycleevent import ObjectModifiedEvent
+from zope.lifecycleevent import ObjectRemovedEvent
+
+from zope.app.file import scale
+from zope.app.file.image import Image
+from zope.app.file.interfaces import IFile
+from zope.app.file.interfaces import IImage
+from zope.app.file.interfaces import IImageScale
+from zope.app.file.interfaces import IImageScaler
+
+
+def gif(width, height):
+    return b'GIF89a' + struct.pack('<HH', width, height) + b'\x00' * 20
+
+
+@implementer(IImageScaler)
+class FakeScaler:
+    """Pretends to scale images, the data only has the new size."""
+
+    def __init__(self):
+        self.scaled = []
+
+    def scale(self, image, width, height):
+        if image.contentType != 'image/gif':
+            return None
+        self.scaled.append((width, height))
+        return gif(width, height)
+
+
+class TestScaledSize(unittest.TestCase):
+
+    def _size(self, size, *args):
+        return scale.getScaledSize(size, scale.ImageScale(*args))
+
+    def test_fit(self):
+        self.assertEqual((128, 96), self._size((1600, 1200), 128, 128))
+        self.assertEqual((96, 128), self._size((1200, 1600), 128, 128))
+        self.assertEqual((200, 150), self._size((1600, 1200), 200))
+        self.assertEqual((133, 100), self._size((1600, 1200), None, 100))
+        self.assertEqual((1, 10), self._size((10, 1000), 100, 10))
+
+    def test_crop(self):
+        self.assertEqual((128, 128), self._size((1600, 1200), 128, 128, True))
+        # Cropping needs both sides
+        self.assertEqual((128, 96), self._size((1600, 1200), 128, None, True))
+
+    def test_not_larger(self):
+        self.assertIsNone(self._size((100, 50), 128, 128))
+        self.assertIsNone(self._size((200, 50), 128, 128, True))
+        self.assertIsNone(self._size((-1, -1), 128, 128))
+        self.assertIsNone(self._size((1600, 1200)))
+
+
+class TestScaledImage(unittest.TestCase):
+
+    def setUp(self):
+        setUp()
+        self.addCleanup(tearDown)
+        provideAdapter(AttributeAnnotations)
+        provideUtility(scale.ImageScale(128, 128), IImageScale, 'thumbnail')
+        provideHandler(objectEventNotify)
+        provideHandler(scale.dropScaledImages)
+        provideHandler(scale.releaseScaledImages)
+        self.scaler = FakeScaler()
+        provideUtility(self.scaler, IImageScaler)
+
+    def _makeImage(self, data=None):
+        image = Image(gif(1600, 1200) if data is None else data)
+        alsoProvides(image, IAttributeAnnotatable)
+        return image
+
+    def test_scaled(self):
+        image = self._makeImage()
+        scaled = scale.getScaledImage(image, 'thumbnail')
+        self.assertIsInstance(scaled, Image)
+        self.assertEqual((128, 96), scaled.getImageSize())
+        self.assertEqual('image/gif', scaled.contentType)
+        # The scaled image is kept.
+        self.assertIs(scaled, scale.getScaledImage(image, 'thumbnail'))
+        self.assertEqual([(128, 96)], self.scaler.scaled)
+        self.assertIs(scaled, IAnnotations(image)[
+            scale.ANNOTATION_KEY]['thumbnail'][1])
+
+    def test_changed(self):
+        image = self._makeImage()
+        scaled = scale.getScaledImage(image, 'thumbnail')
+        # Data changed without an event
+        image.data = gif(800, 1600)
+        scaled = scale.getScaledImage(image, 'thumbnail')
+        self.assertEqual((64, 128), scaled.getImageSize())
+        # The scale changed
+        provideUtility(scale.ImageScale(32, 32, True), IImageScale,
+                       'thumbnail')
+        scaled = scale.getScaledImage(image, 'thumbnail')
+        self.assertEqual((32, 32), scaled.getImageSize())
+        self.assertEqual([(128, 96), (64, 128), (32, 32)], self.scaler.scaled)
+
+    def test_changed_in_place(self):
+        # Data changed in place has no digest, but isn't the same data.
+        for storage in ('chunks', 'tree'):
+            image = Image(gif(1600, 1200) + b'\x00' * 100, storage=storage,
+                          chunkSize=16)
+            alsoProvides(image, IAttributeAnnotatable)
+            del self.scaler.scaled[:]
+            scaled = scale.getScaledImage(image, 'thumbnail')
+            image.append(b'\x00' * 10)
+            self.assertIsNone(image.getDigest())
+            self.assertIsNot(scaled, scale.getScaledImage(image, 'thumbnail'))
+            scaled = scale.getScaledImage(image, 'thumbnail')
+            image.write(50, b'\x01')
+            self.assertIsNot(scaled, scale.getScaledImage(image, 'thumbnail'))
+            self.assertEqual([(128, 96)] * 3, self.scaler.scaled, storage)
+
+    def test_not_scaled(self):
+        image = self._makeImage(gif(100, 100))
+        self.assertIs(image, scale.getScaledImage(image, 'thumbnail'))
+        image = self._makeImage(b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'
+                                + struct.pack('>LL', 1000, 1000))
+        self.assertIs(image, scale.getScaledImage(image, 'thumbnail'))
+        self.assertNotIn(scale.ANNOTATION_KEY, IAnnotations(image))
+        with self.assertRaises(ComponentLookupError):
+            scale.getScaledImage(image, 'huge')
+
+    def test_no_scaler(self):
+        tearDown()
+        setUp()
+        provideAdapter(AttributeAnnotations)
+        provideUtility(scale.ImageScale(128, 128), IImageScale, 'thumbnail')
+        image = self._makeImage()
+        self.assertIs(image, scale.getScaledImage(image, 'thumbnail'))
+
+    def test_modified(self):
+        image = self._makeImage()
+        scaled = scale.getScaledImage(image, 'thumbnail')
+        notify(ObjectModifiedEvent(image, Attributes(IImage, 'title')))
+        self.assertIs(scaled, scale.getScaledImage(image, 'thumbnail'))
+        notify(ObjectModifiedEvent(image, Attributes(IFile, 'data')))
+        self.assertNotIn(scale.ANNOTATION_KEY, IAnnotations(image))
+        self.assertIsNot(scaled, scale.getScaledImage(image, 'thumbnail'))
+        # Images which were never scaled are left alone.
+        image = self._makeImage()
+        notify(ObjectModifiedEvent(image))
+        self.assertNotIn(scale.ANNOTATION_KEY, IAnnotations(image))
+
+    def test_release_chunks(self):
+        released = []
+        self.addCleanup(setattr, scale, '_releaseChunks', scale._releaseChunks)
+        scale._releaseChunks = released.append
+        image = self._makeImage()
+        scaled = scale.getScaledImage(image, 'thumbnail')
+        notify(ObjectModifiedEvent(image))
+        self.assertEqual([scaled._data], released)
+        scaled = scale.getScaledImage(image, 'thumbnail')
+        notify(ObjectRemovedEvent(image, self, 'image'))
+        self.assertEqual(scaled._data, released[-1])
+        # A scaled image that is made again replaces the old one.
+        image.data = gif(800, 1600)
+        old = scaled
+        scaled = scale.getScaledImage(image, 'thumbnail')
+        self.assertEqual([old._data] * 2, released[-2:])
+
+    def test_directive(self):
+        from zope.configuration import xmlconfig
+        from zope.configuration.exceptions import ConfigurationError
+
+        import zope.app.file
+        context = xmlconfig.file('meta.zcml', zope.app.file)
+        xmlconfig.string('''
+            <configure xmlns="http://namespaces.zope.org/zope">
+              <imageScale name="tile" width="64" height="64" crop="true" />
+              <imageScale name="banner" width="1200" />
+            </configure>''', context)
+        from zope.component import getUtility
+        tile = getUtility(IImageScale, 'tile')
+        self.assertTrue(verifyObject(IImageScale, tile))
+        self.assertEqual((64, 64, True), (tile.width, tile.height, tile.crop))
+        banner = getUtility(IImageScale, 'banner')
+        self.assertEqual((1200, None, False),
+                         (banner.width, banner.height, banner.crop))
+        with self.assertRaises(ConfigurationError):
+            xmlconfig.string('''
+                <configure xmlns="http://namespaces.zope.org/zope">
+                  <imageScale name="none" />
+                </configure>''', context)
+
+
+@unittest.skipIf(scale.PIL is None, 'Pillow is not installed')
+class TestPillowScaler(unittest.TestCase):
+
+    def test_scale(self):
+        from io import BytesIO
+        image = BytesIO()
+        scale.PIL.Image.new('RGB', (400, 200)).save(image, 'PNG')
+        image = Image(image.getvalue())
+        scaler = scale.PillowScaler()
+        self.assertTrue(verifyObject(IImageScaler, scaler))
+        scaled = Image(scaler.scale(image, 100, 100))
+        self.assertEqual('image/png', scaled.contentType)
+        self.assertEqual((100, 100), scaled.getImageSize())
+        self.assertIsNone(scaler.scale(Image(b'GIF89a broken'), 10, 10))
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
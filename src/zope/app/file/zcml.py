@@ -0,0 +1,64 @@
+##############################################################################
+#
+# Copyright (c) 2026 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""ZCML directives for files and images.
+"""
+__docformat__ = 'restructuredtext'
+
+from zope.component.zcml import utility
+from zope.configuration.exceptions import ConfigurationError
+from zope.interface import Interface
+from zope.schema import Bool
+from zope.schema import Int
+from zope.schema import TextLine
+
+from zope.app.file.interfaces import IImageScale
+from zope.app.file.scale import ImageScale
+
+
+class IImageScaleDirective(Interface):
+    """Register a size images are scaled to."""
+
+    name = TextLine(
+        title='Name',
+        description='The name of the scale, e.g. "thumbnail" for scaled'
+                    ' images published as "@@images/thumbnail".',
+    )
+
+    width = Int(
+        title='Width',
+        description='The width of the scaled images.',
+        min=1,
+        required=False,
+    )
+
+    height = Int(
+        title='Height',
+        description='The height of the scaled images.',
+        min=1,
+        required=False,
+    )
+
+    crop = Bool(
+        title='Crop',
+        description='Whether images are cropped to fill the whole size'
+                    ' instead of fitting into it.',
+        required=False,
+        default=False,
+    )
+
+
+def imageScale(_context, name, width=None, height=None, crop=False):
+    if width is None and height is None:
+        raise ConfigurationError('A scale needs a width or a height.')
+    utility(_context, IImageScale, ImageScale(width, height, crop), name=name)